@@ -0,0 +1,67 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from machine import Machine
+from machine.clients.singletons.slack import LowLevelSlackClient
+from machine.utils.recording import read_recording
+from machine.utils.replay import (EventReplayer, StubWebClient, STUB_BOT_ID, STUB_BOT_NAME,
+                                  stub_workspace)
+from machine.utils.text import announce
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay a recording of RTM events against your bot, without connecting to "
+                    "Slack, and report how fast the events were handled")
+    parser.add_argument('recording', help="recording made with RTM_RECORDING_FILE")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="replay speed relative to the recording, 0 to replay as fast as "
+                             "possible (default: 1)")
+    parser.add_argument('--api-latency', type=float, default=0.0,
+                        help="seconds every (stubbed) Slack Web API call takes (default: 0)")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # When running this function as console entry point, the current working dir is not in the
+    # Python path, so we have to add it
+    sys.path.insert(0, os.getcwd())
+    # Don't record the replayed events, and don't require a real token: we never connect to Slack
+    os.environ['SM_RTM_RECORDING_FILE'] = ''
+    os.environ.setdefault('SM_SLACK_API_TOKEN', 'xoxb-replay')
+
+    events = list(read_recording(args.recording))
+    if not events:
+        announce("No events in {}".format(args.recording))
+        sys.exit(1)
+    if not any(event_type == 'open' for _, event_type, _ in events):
+        # The bot has to know who it is to recognize mentions
+        events.insert(0, (events[0][0], 'open',
+                          {'self': {'id': STUB_BOT_ID, 'name': STUB_BOT_NAME}}))
+    users, channels = stub_workspace(events)
+
+    bot = Machine()
+    client = LowLevelSlackClient.get_instance()
+    client.web_client = StubWebClient(users, channels, latency=args.api_latency)
+    client.async_web_client = StubWebClient(users, channels, latency=args.api_latency,
+                                            run_async=True, loop=client.loop)
+    bot._dispatcher.setup()
+
+    announce("\nReplaying {} events from {}".format(len(events), args.recording))
+    replayer = EventReplayer(client.rtm_client, speed=args.speed)
+    results = client.loop.run_until_complete(replayer.replay(events))
+    # Give async plugin functions that are still running a chance to finish
+    client.loop.run_until_complete(asyncio.sleep(args.api_latency))
+    results['api_calls'] = dict(client.web_client.calls + client.async_web_client.calls)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
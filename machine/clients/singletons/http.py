@@ -0,0 +1,154 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from machine.settings import import_settings
+from machine.utils import Singleton
+from machine.utils.metrics import get_metrics, MachineMetrics
+
+
+class PooledSession(requests.Session):
+    """:py:class:`requests.Session` with a connection pool of a fixed size and a default timeout
+
+    Connections are kept alive and reused for subsequent requests to the same host.
+
+    :param pool_size: maximum number of connections kept alive per host
+    :param timeout: default timeout (in seconds) of requests
+    :param proxies: proxies by URL scheme, like ``{'https': 'http://proxy:3128'}``
+    :param metrics: metrics to record the duration of requests in
+    """
+
+    def __init__(self, pool_size: int = 10, timeout: Optional[float] = 30,
+                 proxies: Optional[Dict[str, str]] = None,
+                 metrics: Optional[MachineMetrics] = None):
+        super().__init__()
+        self.timeout = timeout
+        self._metrics = metrics
+        self._adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount('http://', self._adapter)
+        self.mount('https://', self._adapter)
+        if proxies:
+            self.proxies.update(proxies)
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if self._metrics is None:
+            return super().request(method, url, *args, **kwargs)
+        host = urlsplit(url).hostname or ''
+        started = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.RequestException as e:
+            self._metrics.http_errors.inc(host, e.__class__.__name__)
+            raise
+        finally:
+            self._metrics.http_duration.observe(time.perf_counter() - started, host)
+        return response
+
+    def stats(self) -> Dict[str, int]:
+        """Statistics about the connection pools
+
+        :return: dictionary with the number of hosts that have a pool, the number of connections
+            opened, the number of requests made, and the number of connections idle in the pools
+        """
+        pools = self._adapter.poolmanager.pools
+        stats = {'pools': 0, 'connections_opened': 0, 'requests': 0, 'idle_connections': 0}
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats['pools'] += 1
+            stats['connections_opened'] += pool.num_connections
+            stats['requests'] += pool.num_requests
+            if pool.pool is not None:
+                stats['idle_connections'] += sum(1 for conn in list(pool.pool.queue)
+                                                 if conn is not None)
+        return stats
+
+
+class HTTPClient(metaclass=Singleton):
+    """Shared HTTP connection pools, for the Slack Web API and plugins
+
+    Sync requests go through :py:attr:`session`, a :py:class:`requests.Session`. Coroutines can
+    use :py:meth:`aiohttp_session`, which returns an :py:class:`aiohttp.ClientSession` for the
+    running event loop. Both keep connections alive, so subsequent requests to the same host
+    don't pay for a new TCP and TLS handshake.
+    """
+
+    def __init__(self):
+        _settings, _ = import_settings()
+        self._pool_size = int(_settings.get('HTTP_POOL_SIZE', 10))
+        self._timeout = float(_settings.get('HTTP_TIMEOUT', 30))
+        self._keepalive = float(_settings.get('HTTP_KEEPALIVE', 30))
+        proxies = {}
+        if _settings.get('HTTP_PROXY'):
+            proxies['http'] = _settings['HTTP_PROXY']
+        if _settings.get('HTTPS_PROXY'):
+            proxies['https'] = _settings['HTTPS_PROXY']
+        self._metrics = get_metrics()
+        self.session = PooledSession(self._pool_size, self._timeout, proxies, self._metrics)
+        self._aiohttp_sessions = {}
+        if self._metrics is not None:
+            self._metrics.add_stats('machine_http_pool', "HTTP connection pools", self.stats)
+
+    @staticmethod
+    def get_instance() -> 'HTTPClient':
+        return HTTPClient()
+
+    @property
+    def timeout(self) -> float:
+        return self._timeout
+
+    def aiohttp_session(self) -> aiohttp.ClientSession:
+        """Get the session for async requests on the running event loop
+
+        Must be called from a coroutine. Like the sync session, the session keeps at most
+        ``HTTP_POOL_SIZE`` connections per host alive. Requests made with it don't use the
+        proxy settings automatically, pass ``proxy=`` to use a proxy.
+
+        :return: the session for the running event loop
+        """
+        loop = asyncio.get_event_loop()
+        for closed in [other for other in self._aiohttp_sessions if other.is_closed()]:
+            del self._aiohttp_sessions[closed]
+        session = self._aiohttp_sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self._pool_size,
+                                             keepalive_timeout=self._keepalive)
+            session = aiohttp.ClientSession(connector=connector,
+                                            timeout=aiohttp.ClientTimeout(total=self._timeout))
+            self._aiohttp_sessions[loop] = session
+        return session
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistics about the connection pools
+
+        :return: the statistics of the sync session (see :py:meth:`PooledSession.stats`), and
+            the number of connections held by the async sessions
+        """
+        stats = self.session.stats()
+        stats['async_connections'] = 0
+        stats['async_idle_connections'] = 0
+        for session in list(self._aiohttp_sessions.values()):
+            connector = session.connector
+            if session.closed or connector is None:
+                continue
+            idle = sum(len(conns) for conns in getattr(connector, '_conns', {}).values())
+            stats['async_idle_connections'] += idle
+            stats['async_connections'] += idle + len(getattr(connector, '_acquired', ()))
+        return stats
+
+    def close(self):
+        self.session.close()
+        for loop, session in list(self._aiohttp_sessions.items()):
+            if not session.closed and not loop.is_closed():
+                if loop.is_running():
+                    asyncio.run_coroutine_threadsafe(session.close(), loop)
+                else:
+                    loop.run_until_complete(session.close())
+        self._aiohttp_sessions.clear()
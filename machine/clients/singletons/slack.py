@@ -1,17 +1,51 @@
+import dataclasses
 import logging
-from typing import Callable, Dict, List
+import os
+import threading
+import time
+from itertools import count
+from typing import Any, Callable, Dict, Iterable, List, Optional
 import asyncio
 
+from slack.errors import SlackApiError
 from slack.web.client import WebClient
 from slack.rtm.client import RTMClient
 
+from machine.clients.singletons.http import HTTPClient
+from machine.clients.singletons.storage import Storage
 from machine.models import User
 from machine.models import Channel
+from machine.models.user import keep_profile_images
 from machine.settings import import_settings
 from machine.utils import Singleton
+from machine.utils.collections import LoadingCache
+from machine.utils.membership import MembershipIndex
+from machine.utils.metrics import get_metrics, MachineMetrics
+from machine.utils.ratelimit import DEFAULT_METHOD_RATE_LIMITS, RateLimiter
+from machine.utils.recording import EventRecorder
+from machine.utils.snapshot import Snapshot, dump_snapshot, load_snapshot
+from machine.utils.user_index import UserIndex
 
 logger = logging.getLogger(__name__)
 
+# Key of the snapshot of the user and channel caches, when it is kept in the storage backend
+SNAPSHOT_STORAGE_KEY = 'machine.slack:cache_snapshot'
+# Conversation types that are loaded at startup. Each type is fetched concurrently
+CONVERSATION_TYPES = ('public_channel', 'private_channel', 'mpim', 'im')
+# Number of channels whose members are loaded at the same time
+MEMBERSHIP_FETCH_CONCURRENCY = 8
+# Seconds after loading the members of a channel, in which they are not loaded again
+MEMBERSHIP_RELOAD_INTERVAL = 10
+
+# Values of the fields of channels that events leave out, when they differ from None
+_CHANNEL_EVENT_DEFAULTS = {
+    'is_archived': False,
+    'is_org_shared': False,
+    'is_shared': False,
+    'is_general': False,
+    'previous_names': [],
+}
+
 
 def call_paginated_endpoint(endpoint: Callable, field: str, **kwargs) -> List:
     collection = []
@@ -25,55 +59,856 @@ def call_paginated_endpoint(endpoint: Callable, field: str, **kwargs) -> List:
     return collection
 
 
+class PooledWebClient(WebClient):
+    """Web API client that makes its requests through the shared HTTP connection pools
+
+    Without ``http``, it behaves like a regular :py:class:`~slack.web.client.WebClient`, that
+    opens a new connection for every request.
+    """
+
+    def __init__(self, *args, http: Optional[HTTPClient] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._http = http
+
+    async def _request(self, *, http_verb, api_url, req_args):
+        if self._http is not None:
+            self.session = self._http.aiohttp_session()
+        return await super()._request(http_verb=http_verb, api_url=api_url, req_args=req_args)
+
+    def _perform_urllib_http_request(self, *, url: str, args: Dict[str, Dict[str, Any]]):
+        if self._http is None:
+            return super()._perform_urllib_http_request(url=url, args=args)
+        # The body is encoded by requests, which sets the matching content type
+        headers = {k: v for k, v in args['headers'].items() if k.lower() != 'content-type'}
+        kwargs = {}
+        if args['json']:
+            kwargs['json'] = args['json']
+        elif args['data']:
+            kwargs['data'] = {}
+            kwargs['files'] = {}
+            for key, value in args['data'].items():
+                if getattr(value, 'readable', None) and value.readable():
+                    filename = args['data'].get('filename') or getattr(value, 'name', None)
+                    if isinstance(filename, bytes):
+                        filename = filename.decode('utf-8')
+                    kwargs['files'][key] = (filename or 'Uploaded file', value)
+                else:
+                    kwargs['data'][key] = value
+        elif args['params']:
+            kwargs['data'] = args['params']
+        proxies = {'http': self.proxy, 'https': self.proxy} if self.proxy else None
+        # Like the regular client, always POST: the Slack Web API accepts POST for all methods
+        response = self._http.session.post(url, headers=headers, proxies=proxies,
+                                           timeout=self.timeout, verify=self.ssl is not False,
+                                           **kwargs)
+        return {'status': response.status_code, 'headers': response.headers,
+                'body': response.text}
+
+
+class InstrumentedWebClient(PooledWebClient):
+    """Web API client that records the duration and errors of all API calls in the metrics"""
+
+    def __init__(self, metrics: MachineMetrics, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics = metrics
+
+    def _record(self, api_method: str, started: float, error: BaseException = None):
+        self._metrics.slack_api_duration.observe(time.perf_counter() - started, api_method)
+        if error is not None:
+            response = getattr(error, 'response', None)
+            code = response.get('error') if response is not None else None
+            self._metrics.slack_api_errors.inc(api_method, code or error.__class__.__name__)
+
+    def api_call(self, api_method: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = super().api_call(api_method, **kwargs)
+        except Exception as e:
+            self._record(api_method, started, e)
+            raise
+        if isinstance(result, asyncio.Future):
+            result.add_done_callback(
+                lambda f: self._record(api_method, started,
+                                       None if f.cancelled() else f.exception()))
+        else:
+            self._record(api_method, started)
+        return result
+
+
+def _retry_after(error: SlackApiError) -> Optional[float]:
+    response = error.response
+    if getattr(response, 'status_code', None) != 429:
+        return None
+    headers = getattr(response, 'headers', None) or {}
+    # Header names are case-insensitive, but the headers are a plain dict
+    headers = {name.lower(): value for name, value in headers.items()}
+    try:
+        return float(headers.get('retry-after', 1))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def _channel_of(kwargs) -> Optional[str]:
+    for arguments in (kwargs.get('json'), kwargs.get('data'), kwargs.get('params')):
+        if isinstance(arguments, dict) and isinstance(arguments.get('channel'), str):
+            return arguments['channel']
+    return None
+
+
+def _on_event_loop() -> bool:
+    # asyncio.get_running_loop() needs Python 3.7
+    return asyncio._get_running_loop() is not None
+
+
+class RateLimitedWebClient(PooledWebClient):
+    """Web API client that paces calls to stay within Slack's rate limits
+
+    Calls wait until the rate limiter allows them, so sync calls still return the response
+    (eventually). Calls that Slack rate limits anyway are retried after the number of seconds
+    Slack asks for, at most ``max_retries`` times.
+
+    Sync calls made on a thread that runs an event loop never wait, because that would block the
+    loop: they are made right away (but still count towards the rate limits), and calls Slack rate
+    limits raise ``SlackApiError``.
+    """
+
+    def __init__(self, *args, rate_limiter: RateLimiter, max_retries: int = 3, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._rate_limiter = rate_limiter
+        self._max_retries = max_retries
+
+    def _should_retry(self, api_method: str, error: SlackApiError, attempt: int) -> bool:
+        delay = _retry_after(error)
+        if delay is None or attempt >= self._max_retries:
+            return False
+        logger.warning("Slack rate limited %s, retrying in %ss", api_method, delay)
+        self._rate_limiter.retry_after(api_method, delay)
+        return True
+
+    async def _api_call_async(self, api_method: str, channel: Optional[str], **kwargs):
+        for attempt in count():
+            await self._rate_limiter.wait_async(api_method, channel)
+            try:
+                return await super().api_call(api_method, **kwargs)
+            except SlackApiError as e:
+                if not self._should_retry(api_method, e, attempt):
+                    raise
+
+    def api_call(self, api_method: str, **kwargs):
+        channel = _channel_of(kwargs)
+        if self.run_async:
+            return asyncio.ensure_future(self._api_call_async(api_method, channel, **kwargs),
+                                         loop=self._event_loop)
+        if _on_event_loop():
+            # The call counts towards the rate limits, but waiting would block the event loop
+            self._rate_limiter.take(api_method, channel)
+            try:
+                return super().api_call(api_method, **kwargs)
+            except SlackApiError as e:
+                # Fail fast, but hold the calls that can wait
+                delay = _retry_after(e)
+                if delay is not None:
+                    self._rate_limiter.retry_after(api_method, delay)
+                raise
+        for attempt in count():
+            self._rate_limiter.wait(api_method, channel)
+            try:
+                return super().api_call(api_method, **kwargs)
+            except SlackApiError as e:
+                if not self._should_retry(api_method, e, attempt):
+                    raise
+
+
+class InstrumentedRateLimitedWebClient(RateLimitedWebClient, InstrumentedWebClient):
+    """Rate limited Web API client that records every attempt of every call in the metrics"""
+
+
+def _web_client(metrics: Optional[MachineMetrics], rate_limiter: Optional[RateLimiter],
+                max_retries: int, **kwargs) -> WebClient:
+    if rate_limiter is not None:
+        kwargs.update(rate_limiter=rate_limiter, max_retries=max_retries)
+        if metrics is not None:
+            return InstrumentedRateLimitedWebClient(metrics, **kwargs)
+        return RateLimitedWebClient(**kwargs)
+    if metrics is not None:
+        return InstrumentedWebClient(metrics, **kwargs)
+    return PooledWebClient(**kwargs)
+
+
+class RecordingRTMClient(RTMClient):
+    """RTM client that records every event it receives, before dispatching it"""
+
+    def __init__(self, recorder: EventRecorder, **kwargs):
+        super().__init__(**kwargs)
+        self._recorder = recorder
+
+    async def _dispatch_event(self, event, data=None):
+        self._recorder.record(event, data)
+        await super()._dispatch_event(event, data=data)
+
+
 class LowLevelSlackClient(metaclass=Singleton):
     def __init__(self):
         _settings, _ = import_settings()
         slack_api_token = _settings.get('SLACK_API_TOKEN', None)
         http_proxy = _settings.get('HTTP_PROXY', None)
-        self.rtm_client = RTMClient(token=slack_api_token, proxy=http_proxy)
-        self.web_client = WebClient(token=slack_api_token, proxy=http_proxy)
+        client_kwargs = {'token': slack_api_token, 'proxy': http_proxy}
+        if _settings.get('SLACK_API_BASE_URL'):
+            # Talk to another server than Slack, eg. a fake Slack server in end-to-end tests
+            client_kwargs['base_url'] = _settings['SLACK_API_BASE_URL']
+        # The RTM client connects once, the Web API clients share the pooled connections
+        web_client_kwargs = dict(client_kwargs, http=HTTPClient.get_instance())
+        # The RTM client runs its event loop in the main thread. Coroutines of async plugin
+        # functions are run on the same loop, and can use the async Web API client
+        self._loop = asyncio.new_event_loop()
+        self._recorder = None
+        if _settings.get('RTM_RECORDING_FILE'):
+            self._recorder = EventRecorder(_settings['RTM_RECORDING_FILE'],
+                                           scrub=bool(_settings.get('RTM_RECORDING_SCRUB', False)))
+            logger.info("Recording RTM events to %s", _settings['RTM_RECORDING_FILE'])
+            self.rtm_client = RecordingRTMClient(self._recorder, loop=self._loop, **client_kwargs)
+        else:
+            self.rtm_client = RTMClient(loop=self._loop, **client_kwargs)
+        metrics = get_metrics()
+        # The sync and async clients share the rate limiter, they call the same Slack workspace
+        self.rate_limiter = None
+        if _settings.get('RATE_LIMITING', False):
+            method_limits = None
+            if _settings.get('RATE_LIMITS'):
+                method_limits = dict(DEFAULT_METHOD_RATE_LIMITS, **_settings['RATE_LIMITS'])
+            self.rate_limiter = RateLimiter(method_limits=method_limits, metrics=metrics)
+            if metrics is not None:
+                metrics.add_stats('machine_slack_api_queue', "Slack Web API rate limiting",
+                                  self.rate_limiter.stats)
+        max_retries = int(_settings.get('RATE_LIMIT_RETRIES', 3))
+        self.web_client = _web_client(metrics, self.rate_limiter, max_retries,
+                                      **web_client_kwargs)
+        self.async_web_client = _web_client(metrics, self.rate_limiter, max_retries,
+                                            run_async=True, loop=self._loop, **web_client_kwargs)
         self._bot_info = {}
+        self._handlers_registered = False
+        keep_profile_images(bool(_settings.get('USER_PROFILE_IMAGES', True)))
+        # In huge workspaces, users and channels can be loaded when they are first used, instead
+        # of all at once at startup. At most USER_CACHE_SIZE/CHANNEL_CACHE_SIZE of them are kept
+        self._lazy_users = bool(_settings.get('LAZY_USER_CACHE', False))
+        self._lazy_channels = bool(_settings.get('LAZY_CHANNEL_CACHE', False))
         self._users = {}
+        if self._lazy_users:
+            self._users = LoadingCache(self._load_user, int(_settings.get('USER_CACHE_SIZE', 1000)))
+            if metrics is not None:
+                metrics.add_stats('machine_user_cache', "Lazily loaded users", self._users.stats)
         self._channels = {}
+        if self._lazy_channels:
+            self._channels = LoadingCache(self._load_channel,
+                                          int(_settings.get('CHANNEL_CACHE_SIZE', 1000)))
+            if metrics is not None:
+                metrics.add_stats('machine_channel_cache', "Lazily loaded channels",
+                                  self._channels.stats)
+        # DM channel ids by user id, so DMs don't need an im.open call first
+        self._dm_channels = {}
+        self._persist_dm_channels = bool(_settings.get('DM_CHANNEL_CACHE_PERSIST', False))
+        # Channel ids by lowercased (previous) name, for fast lookups by name
+        self._channel_ids_by_name = {}
+        self._channel_ids_by_previous_name = {}
+        self._channel_names = {}
+        # Users by email address and by name, for fast lookups
+        self._user_index = UserIndex()
+        self._channel_handlers = []
+        self._bootstrap_task = None
+        self._bootstrap_timings = {}
+        self.bootstrapped = threading.Event()
+        # Snapshots of the user and channel caches, to start with warm caches after a restart
+        self._snapshot_file = _settings.get('CACHE_SNAPSHOT_FILE')
+        self._snapshot_storage = bool(_settings.get('CACHE_SNAPSHOT_STORAGE', False))
+        self._snapshot_delay = float(_settings.get('CACHE_SNAPSHOT_DELAY', 60))
+        self._snapshot_pending = False
+        # Channels to fetch because an event didn't have enough data to update them. Bursts of
+        # events for the same channel are coalesced into one conversations.info call
+        self._channel_fetch_delay = float(_settings.get('CHANNEL_FETCH_DELAY', 1))
+        self._pending_channel_fetches = set()
+        # Members of channels and channels of users, for the channels the bot is a member of
+        self._membership = None
+        # Channel id -> when its members were last loaded after the bot joined, None while loading
+        self._member_loads = {}
+        if _settings.get('CHANNEL_MEMBERSHIP_INDEX', False):
+            if self._lazy_channels:
+                logger.warning("CHANNEL_MEMBERSHIP_INDEX can't be combined with "
+                               "LAZY_CHANNEL_CACHE, channel memberships are not indexed")
+            else:
+                self._membership = MembershipIndex()
+                if metrics is not None:
+                    metrics.add_stats('machine_channel_membership', "Indexed channel memberships",
+                                      self._membership.stats)
 
     @staticmethod
     def get_instance() -> 'LowLevelSlackClient':
         return LowLevelSlackClient()
 
     def _register_user(self, user_response):
-        user = User.from_api_response(user_response)
+        return self._add_user(User.from_api_response(user_response))
+
+    def _add_user(self, user: User) -> User:
         self._users[user.id] = user
+        self._user_index.add(user)
+        self._snapshot_changed()
         return user
 
+    def _remove_user(self, user_id: str):
+        self._users.pop(user_id, None)
+        self._user_index.remove(user_id)
+        self._snapshot_changed()
+
     def _register_channel(self, channel_response):
-        channel = Channel.from_api_response(channel_response)
+        return self._add_channel(Channel.from_api_response(channel_response))
+
+    def _add_channel(self, channel: Channel) -> Channel:
         self._channels[channel.id] = channel
+        self._channel_added(channel)
+        self._snapshot_changed()
         return channel
 
+    def _channel_added(self, channel: Channel):
+        if channel.is_im and channel.user:
+            self._dm_channels[channel.user] = channel.id
+        self._index_channel_names(channel.id, channel)
+        self._notify_channel_handlers(channel.id, channel)
+
+    def _index_channel_names(self, channel_id: str, channel: Optional[Channel]):
+        # Replace the names the channel was indexed under (if any) with its current names
+        old_name, old_previous_names = self._channel_names.pop(channel_id, (None, ()))
+        if old_name is not None and self._channel_ids_by_name.get(old_name) == channel_id:
+            del self._channel_ids_by_name[old_name]
+        for previous_name in old_previous_names:
+            if self._channel_ids_by_previous_name.get(previous_name) == channel_id:
+                del self._channel_ids_by_previous_name[previous_name]
+        if channel is None:
+            return
+        name = channel.name_normalized or channel.name
+        name = name.lower() if name else None
+        previous_names = tuple(n.lower() for n in channel.previous_names or () if n)
+        if name is None and not previous_names:
+            # DMs and group DMs don't have names
+            return
+        self._channel_names[channel_id] = (name, previous_names)
+        if name is not None:
+            self._channel_ids_by_name[name] = channel_id
+        for previous_name in previous_names:
+            self._channel_ids_by_previous_name[previous_name] = channel_id
+
+    def find_channel_by_name(self, channel_name: str) -> Optional[Channel]:
+        """Find a channel by its name, or a name it had before
+
+        Names are compared case-insensitively, and can start with a ``#``. A channel that has the
+        name now takes precedence over a channel that had it before.
+
+        :param channel_name: the name of the channel
+        :return: the channel, or ``None`` if no channel has (or had) that name
+        """
+        name = channel_name[1:] if channel_name.startswith('#') else channel_name
+        name = name.lower()
+        channel_id = self._channel_ids_by_name.get(name) or \
+            self._channel_ids_by_previous_name.get(name)
+        return self._channels.get(channel_id) if channel_id else None
+
+    def find_user_by_email(self, email: str) -> Optional[User]:
+        """Find a user by email address
+
+        Email addresses are compared case-insensitively. With ``LAZY_USER_CACHE``, users that are
+        not cached are looked up with ``users.lookupByEmail``.
+
+        :param email: the email address of the user
+        :return: the user, or ``None`` if no user has that email address
+        """
+        user_id = self._user_index.by_email(email)
+        if user_id is not None:
+            return self._users.get(user_id)
+        if not self._lazy_users:
+            return None
+        try:
+            response = self.web_client.users_lookupByEmail(email=email)
+        except SlackApiError as e:
+            if e.response.get('error') == 'users_not_found':
+                return None
+            raise
+        user = User.from_api_response(response['user'])
+        self._users[user.id] = user
+        self._user_index.add(user)
+        return user
+
+    def find_users_by_name(self, name: str) -> List[User]:
+        """Find the users with a name
+
+        :param name: the username (which can start with an ``@``), display name or real name of
+            the users, compared case-insensitively
+        :return: the users whose username matches, followed by the users whose display name
+            matches, followed by the users whose real name matches
+        """
+        users = (self._users.get(user_id) for user_id in self._user_index.by_name(name))
+        return [user for user in users if user is not None]
+
+    def find_user_by_name(self, name: str) -> Optional[User]:
+        """Find a user by name
+
+        A user whose username matches takes precedence over a user whose display name matches,
+        which takes precedence over a user whose real name matches. Deactivated users are only
+        returned when no active user matches.
+
+        :param name: the username (which can start with an ``@``), display name or real name of
+            the user, compared case-insensitively
+        :return: the user, or ``None`` if no user has that name
+        """
+        users = self.find_users_by_name(name)
+        return next((user for user in users if not user.deleted), users[0] if users else None)
+
+    def search_users(self, query: str, limit: int = 10) -> List[User]:
+        """Find active users whose names (approximately) match a query
+
+        :param query: (part of) the username, display name or real name of the users
+        :param limit: the maximum number of users to return
+        :return: the matching users, best match first
+        """
+        users = (self._users.get(user_id) for user_id in self._user_index.search(query, limit))
+        return [user for user in users if user is not None]
+
+    def channel_members(self, channel_id: str) -> List[str]:
+        """Get the ids of the members of a channel
+
+        With ``CHANNEL_MEMBERSHIP_INDEX``, the members of channels the bot is a member of come
+        from the membership index. Otherwise, or for other channels, they are fetched with
+        ``conversations.members``.
+
+        :param channel_id: the id of the channel
+        :return: the ids of the members
+        """
+        if self._membership is not None and self._membership.has_channel(channel_id):
+            return self._membership.members(channel_id)
+        return call_paginated_endpoint(self.web_client.conversations_members, 'members',
+                                       channel=channel_id)
+
+    def user_channels(self, user_id: str) -> List[str]:
+        """Get the ids of the channels a user is a member of
+
+        With ``CHANNEL_MEMBERSHIP_INDEX``, the channels come from the membership index, which
+        only has the channels the bot is a member of. Otherwise, they are fetched with
+        ``users.conversations``.
+
+        :param user_id: the id of the user
+        :return: the ids of the channels
+        """
+        if self._membership is not None:
+            return self._membership.channels(user_id)
+        channels = call_paginated_endpoint(self.web_client.users_conversations, 'channels',
+                                           user=user_id, types=','.join(CONVERSATION_TYPES))
+        return [channel['id'] for channel in channels]
+
+    def _load_user(self, user_id: str) -> User:
+        # Loader of the lazy user cache
+        try:
+            response = self.web_client.users_info(user=user_id)
+        except SlackApiError as e:
+            if e.response.get('error') == 'user_not_found':
+                raise KeyError(user_id) from e
+            raise
+        user = User.from_api_response(response['user'])
+        self._user_index.add(user)
+        return user
+
+    def _load_channel(self, channel_id: str) -> Channel:
+        # Loader of the lazy channel cache
+        try:
+            response = self.web_client.conversations_info(channel=channel_id)
+        except SlackApiError as e:
+            if e.response.get('error') == 'channel_not_found':
+                raise KeyError(channel_id) from e
+            raise
+        channel = Channel.from_api_response(response['channel'])
+        self._channel_added(channel)
+        return channel
+
+    @staticmethod
+    def _dm_channel_key(user_id: str) -> str:
+        return "machine.slack:dm_channel:{}".format(user_id)
+
+    def dm_channel_id(self, user_id: str) -> Optional[str]:
+        """Look up the id of the DM channel with a user, without calling the Web API
+
+        :param user_id: the id of the user
+        :return: the id of the DM channel, or ``None`` if it is not known
+        """
+        channel_id = self._dm_channels.get(user_id)
+        if channel_id is None and self._persist_dm_channels:
+            value = Storage.get_instance().get(self._dm_channel_key(user_id))
+            if value:
+                channel_id = self._dm_channels[user_id] = value.decode('utf-8')
+        return channel_id
+
+    async def dm_channel_id_async(self, user_id: str) -> Optional[str]:
+        """Asynchronous version of :py:meth:`dm_channel_id`"""
+        channel_id = self._dm_channels.get(user_id)
+        if channel_id is None and self._persist_dm_channels:
+            value = await Storage.get_instance().get_async(self._dm_channel_key(user_id))
+            if value:
+                channel_id = self._dm_channels[user_id] = value.decode('utf-8')
+        return channel_id
+
+    def register_dm_channel(self, user_id: str, channel_id: str):
+        """Remember the id of the DM channel with a user
+
+        :param user_id: the id of the user
+        :param channel_id: the id of the DM channel
+        """
+        self._dm_channels[user_id] = channel_id
+        if self._persist_dm_channels:
+            Storage.get_instance().set(self._dm_channel_key(user_id), channel_id.encode('utf-8'))
+
+    async def register_dm_channel_async(self, user_id: str, channel_id: str):
+        """Asynchronous version of :py:meth:`register_dm_channel`"""
+        self._dm_channels[user_id] = channel_id
+        if self._persist_dm_channels:
+            await Storage.get_instance().set_async(self._dm_channel_key(user_id),
+                                                   channel_id.encode('utf-8'))
+
+    def add_channel_handler(self, handler: Callable[[str, Optional[Channel]], None]):
+        """Register a function to call when a channel is added, changed or deleted
+
+        :param handler: function that is called with the id of the channel, and the channel or
+            ``None`` if the channel was deleted
+        """
+        self._channel_handlers.append(handler)
+
+    def _notify_channel_handlers(self, channel_id: str, channel: Optional[Channel]):
+        for handler in self._channel_handlers:
+            handler(channel_id, channel)
+
     def ping(self):
-        # Ugly hack because some parts of slackclient > 2.0 are async-only (like the ping function)
-        # and Slack Machine isn't async yet
-        loop = asyncio.new_event_loop()
-        result = self.rtm_client.ping()
-        loop.run_until_complete(result)
+        # Called from the keepalive thread, the ping is sent from the event loop of the RTM client
+        asyncio.run_coroutine_threadsafe(self.rtm_client.ping(), self._loop).result()
 
-    def _on_open(self, **payload):
+    async def _on_open(self, **payload):
         # Set bot info
         self._bot_info = payload['data']['self']
-        # Build user cache
-        all_users = call_paginated_endpoint(self.web_client.users_list, 'members')
-        for u in all_users:
-            self._register_user(u)
-        logger.debug("Number of users found: %s" % len(self._users))
-        logger.debug("Users: %s" % ", ".join([f"{u.profile.display_name}|{u.profile.real_name}"
-                                              for u in self._users.values()]))
-        # Build channel cache
-        all_channels = call_paginated_endpoint(self.web_client.conversations_list, 'channels',
-                                               types='public_channel,private_channel,mpim,im')
-        for c in all_channels:
-            self._register_channel(c)
-        logger.debug("Number of channels found: %s" % len(self._channels))
-        logger.debug("Channels: %s" % ", ".join([c.identifier for c in self._channels.values()]))
+        if not self._users and not self._channels:
+            await self.load_snapshot_async()
+        # Load the user and channel caches in the background, so events are handled meanwhile.
+        # After reconnecting, the caches are loaded again (unless that is still in progress)
+        if self._bootstrap_task is None or self._bootstrap_task.done():
+            self._bootstrap_task = asyncio.ensure_future(self.bootstrap(), loop=self._loop)
+
+    async def _fetch_pages(self, endpoint: Callable, field: str, register: Callable[[Any], Any],
+                           per_page: bool = False, **kwargs) -> int:
+        # Items are registered as pages come in, so they can be used before all pages are loaded.
+        # With per_page, register is called with all items of a page at once
+        fetched = 0
+        response = await endpoint(limit=500, **kwargs)
+        while True:
+            if per_page:
+                register(response[field])
+            else:
+                for item in response[field]:
+                    register(item)
+            fetched += len(response[field])
+            next_cursor = response['response_metadata'].get('next_cursor')
+            if not next_cursor:
+                return fetched
+            response = await endpoint(limit=500, cursor=next_cursor, **kwargs)
+
+    async def _timed_fetch(self, name: str, endpoint: Callable, field: str,
+                           register: Callable[[Dict[str, Any]], Any], **kwargs):
+        started = time.perf_counter()
+        try:
+            fetched = await self._fetch_pages(endpoint, field, register, **kwargs)
+        except Exception:
+            logger.exception("Loading %s failed", name)
+            raise
+        finally:
+            self._bootstrap_timings[name] = round(time.perf_counter() - started, 3)
+        logger.debug("Loaded %d %s in %.2fs", fetched, name, self._bootstrap_timings[name])
+
+    async def bootstrap(self):
+        """Load all users and conversations of the workspace into the caches
+
+        Users and every type of conversation are fetched concurrently, through the async Web API
+        client (so the calls are paced by the rate limiter). :py:attr:`bootstrapped` is set when
+        all of them are loaded.
+        """
+        self.bootstrapped.clear()
+        started = time.perf_counter()
+        client = self.async_web_client
+        # Users and channels that are cached already (eg. from a snapshot) are reconciled: they
+        # are only replaced when they changed, and removed when they no longer exist
+        cached_users = set() if self._lazy_users else set(self._users)
+        cached_channels = set() if self._lazy_channels else set(self._channels)
+        seen_users, seen_channels = set(), set()
+
+        def reconcile_user(user_response):
+            seen_users.add(user_response['id'])
+            cached = self._users.get(user_response['id'])
+            if cached is None or cached.updated != user_response.get('updated'):
+                self._register_user(user_response)
+
+        def reconcile_channel(channel_response):
+            channel = Channel.from_api_response(channel_response)
+            seen_channels.add(channel.id)
+            if self._channels.get(channel.id) != channel:
+                self._add_channel(channel)
+
+        fetches = []
+        if not self._lazy_users:
+            fetches.append(self._timed_fetch('users', client.users_list, 'members',
+                                             reconcile_user))
+        if not self._lazy_channels:
+            for conversation_type in CONVERSATION_TYPES:
+                fetches.append(self._timed_fetch(conversation_type, client.conversations_list,
+                                                 'channels', reconcile_channel,
+                                                 types=conversation_type))
+        results = await asyncio.gather(*fetches, return_exceptions=True)
+        self._bootstrap_timings['total'] = round(time.perf_counter() - started, 3)
+        failed = sum(1 for result in results if isinstance(result, BaseException))
+        if not failed:
+            for user_id in cached_users - seen_users:
+                self._remove_user(user_id)
+            for channel_id in cached_channels - seen_channels:
+                self._remove_channel(channel_id)
+        logger.info("Loaded %d users and %d conversations in %.2fs%s (%s)", len(self._users),
+                    len(self._channels), self._bootstrap_timings['total'],
+                    ", {} of {} fetches failed".format(failed, len(fetches)) if failed else "",
+                    ", ".join("{}: {:.2f}s".format(name, seconds)
+                              for name, seconds in self._bootstrap_timings.items()
+                              if name != 'total'))
+        self.bootstrapped.set()
+        if not failed and self._snapshot_enabled:
+            await self.save_snapshot()
+        if self._membership is not None:
+            await self.load_memberships()
+
+    async def load_memberships(self):
+        """Load the members of the channels the bot is a member of into the membership index
+
+        Members are fetched with ``conversations.members``, a few channels at a time. They are
+        added to the index as pages come in, and members that left a channel are removed from the
+        index once all of its pages are loaded.
+        """
+        started = time.perf_counter()
+        bot_id = self._bot_info.get('id')
+        channel_ids = []
+        for channel in list(self._channels.values()):
+            if channel.is_im:
+                self._membership.add_members(channel.id, [user for user in (bot_id, channel.user)
+                                                          if user])
+            elif channel.is_member and not channel.is_archived:
+                channel_ids.append(channel.id)
+        semaphore = asyncio.Semaphore(MEMBERSHIP_FETCH_CONCURRENCY)
+
+        async def load(channel_id):
+            async with semaphore:
+                return await self._load_channel_members(channel_id)
+
+        results = await asyncio.gather(*(load(channel_id) for channel_id in channel_ids))
+        self._bootstrap_timings['members'] = round(time.perf_counter() - started, 3)
+        logger.info("Loaded %d memberships of %d conversations in %.2fs", sum(results),
+                    len(channel_ids), self._bootstrap_timings['members'])
+
+    async def _load_channel_members(self, channel_id: str) -> int:
+        indexed = set(self._membership.members(channel_id))
+        seen = set()
+
+        def add_members(user_ids):
+            seen.update(user_ids)
+            self._membership.add_members(channel_id, user_ids)
+
+        try:
+            await self._fetch_pages(self.async_web_client.conversations_members, 'members',
+                                    add_members, channel=channel_id, per_page=True)
+        except Exception:
+            logger.exception("Loading the members of channel %s failed", channel_id)
+            return 0
+        for user_id in indexed - seen:
+            self._membership.remove(channel_id, user_id)
+        return len(seen)
+
+    @property
+    def _snapshot_enabled(self) -> bool:
+        return bool(self._snapshot_file or self._snapshot_storage)
+
+    def _read_snapshot(self) -> Optional[bytes]:
+        if self._snapshot_storage:
+            return Storage.get_instance().get(SNAPSHOT_STORAGE_KEY)
+        try:
+            with open(self._snapshot_file, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_snapshot(self, data: bytes):
+        if self._snapshot_storage:
+            Storage.get_instance().set(SNAPSHOT_STORAGE_KEY, data)
+            return
+        # Write to a temporary file first, so a crash never leaves a partial snapshot behind
+        tmp_file = '{}.tmp'.format(self._snapshot_file)
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_file, self._snapshot_file)
+
+    def _parse_snapshot(self) -> Optional[Snapshot]:
+        try:
+            data = self._read_snapshot()
+            if not data:
+                return None
+            return load_snapshot(data)
+        except Exception:
+            logger.exception("Loading the snapshot of the user and channel caches failed")
+            return None
+
+    def _apply_snapshot(self, snapshot: Snapshot, started: float):
+        # Lazily loaded users and channels are not kept in snapshots
+        if not self._lazy_users:
+            for user in snapshot.users:
+                self._add_user(user)
+        if not self._lazy_channels:
+            for channel in snapshot.channels:
+                self._add_channel(channel)
+        self._snapshot_pending = False
+        logger.info("Loaded %d users and %d conversations from a snapshot of %.0fs ago in %.2fs",
+                    len(snapshot.users), len(snapshot.channels), time.time() - snapshot.created,
+                    time.perf_counter() - started)
+
+    def load_snapshot(self) -> bool:
+        """Fill the user and channel caches from the last snapshot, if there is one
+
+        :return: ``True`` if a snapshot was loaded
+        """
+        if not self._snapshot_enabled:
+            return False
+        started = time.perf_counter()
+        snapshot = self._parse_snapshot()
+        if snapshot is None:
+            return False
+        self._apply_snapshot(snapshot, started)
+        return True
+
+    async def load_snapshot_async(self) -> bool:
+        """Fill the user and channel caches from the last snapshot, if there is one
+
+        The snapshot is read and deserialized in the default executor of the event loop.
+
+        :return: ``True`` if a snapshot was loaded
+        """
+        if not self._snapshot_enabled:
+            return False
+        started = time.perf_counter()
+        snapshot = await self._loop.run_in_executor(None, self._parse_snapshot)
+        if snapshot is None:
+            return False
+        self._apply_snapshot(snapshot, started)
+        return True
+
+    async def save_snapshot(self):
+        """Write a snapshot of the user and channel caches
+
+        The snapshot is serialized and written in the default executor of the event loop.
+        """
+        self._snapshot_pending = False
+        # The models are immutable, copying the dictionaries is enough for a consistent snapshot
+        users = [] if self._lazy_users else list(self._users.values())
+        channels = [] if self._lazy_channels else list(self._channels.values())
+
+        def write():
+            self._write_snapshot(dump_snapshot(users, channels))
+
+        try:
+            await self._loop.run_in_executor(None, write)
+        except Exception:
+            logger.exception("Writing the snapshot of the user and channel caches failed")
+        else:
+            logger.debug("Wrote a snapshot of %d users and %d conversations", len(users),
+                         len(channels))
+
+    def _snapshot_changed(self):
+        # Changes are batched: the snapshot is written at most once every CACHE_SNAPSHOT_DELAY
+        # seconds, and not while the caches are being loaded
+        if self._snapshot_enabled and not self._snapshot_pending:
+            self._snapshot_pending = True
+            self._loop.call_soon_threadsafe(self._loop.call_later, self._snapshot_delay,
+                                            self._save_changed_snapshot)
+
+    def _save_changed_snapshot(self):
+        if not self._snapshot_pending:
+            return
+        if self.bootstrapped.is_set():
+            asyncio.ensure_future(self.save_snapshot(), loop=self._loop)
+        else:
+            self._loop.call_later(self._snapshot_delay, self._save_changed_snapshot)
+
+    @property
+    def bootstrap_timings(self) -> Dict[str, float]:
+        """Number of seconds it took to load the users, each type of conversation and in total"""
+        return dict(self._bootstrap_timings)
+
+    def fetch_user(self, user_id: str) -> User:
+        """Get a user, from the Web API if it is not in the cache
+
+        Users that are not in the cache (because it is still being loaded at startup) are
+        fetched with ``users.info``, and added to the cache.
+
+        :param user_id: the id of the user
+        :return: the user
+        """
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._register_user(self.web_client.users_info(user=user_id)['user'])
+        return user
+
+    def fetch_channel(self, channel_id: str) -> Channel:
+        """Get a channel, from the Web API if it is not in the cache
+
+        Channels that are not in the cache (because it is still being loaded at startup) are
+        fetched with ``conversations.info``, and added to the cache.
+
+        :param channel_id: the id of the channel
+        :return: the channel
+        """
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            response = self.web_client.conversations_info(channel=channel_id)
+            channel = self._register_channel(response['channel'])
+        return channel
+
+    @staticmethod
+    def _peek(cache: Dict[str, Any], key: str) -> Any:
+        # Lazy caches would load missing keys with a (blocking) call to the Web API
+        if isinstance(cache, LoadingCache):
+            return cache.peek(key)
+        return cache.get(key)
+
+    async def fetch_user_async(self, user_id: str) -> User:
+        """Get a user, from the Web API if it is not in the cache, asynchronously
+
+        This is the asynchronous version of :py:meth:`fetch_user`, for use on the event loop. It
+        also doesn't block the event loop when the user cache is lazy (``LAZY_USER_CACHE``).
+
+        :param user_id: the id of the user
+        :return: the user
+        """
+        user = self._peek(self._users, user_id)
+        if user is None:
+            response = await self.async_web_client.users_info(user=user_id)
+            user = self._register_user(response['user'])
+        return user
+
+    async def fetch_channel_async(self, channel_id: str) -> Channel:
+        """Get a channel, from the Web API if it is not in the cache, asynchronously
+
+        This is the asynchronous version of :py:meth:`fetch_channel`, for use on the event loop.
+        It also doesn't block the event loop when the channel cache is lazy.
+
+        :param channel_id: the id of the channel
+        :return: the channel
+        """
+        channel = self._peek(self._channels, channel_id)
+        if channel is None:
+            response = await self.async_web_client.conversations_info(channel=channel_id)
+            channel = self._register_channel(response['channel'])
+        return channel
 
     def _on_team_join(self, **payload):
         user = self._register_user(payload['data']['user'])
@@ -84,41 +919,262 @@ class LowLevelSlackClient(metaclass=Singleton):
         logger.debug("User changed: %s" % user)
 
     def _on_channel_created(self, **payload):
-        channel_resp = self.web_client.conversations_info(channel=payload['data']['channel']['id'])
-        channel = self._register_channel(channel_resp['channel'])
+        # The event has the name and creator of the new channel, the rest are defaults
+        data = payload['data']
+        channel = self._channel_from_event(data['channel'], is_channel=True,
+                                           is_member=data['channel'].get('creator') ==
+                                           self._bot_info.get('id'))
         logger.debug("Channel created: %s" % channel)
 
-    def _on_channel_updated(self, **payload):
+    def _on_im_created(self, **payload):
         data = payload['data']
-        if isinstance(data['channel'], dict):
-            channel_id = data['channel']['id']
+        channel = self._channel_from_event(data['channel'], is_im=True, is_member=True,
+                                           user=data['user'])
+        if self._membership is not None:
+            self._membership.add_members(data['channel']['id'], [self._bot_info.get('id'),
+                                                                 data['user']])
+        logger.debug("DM channel created: %s" % channel)
+
+    def _on_channel_joined(self, **payload):
+        # The bot joined a channel, the event has the complete channel
+        data = payload['data']['channel']
+        channel = self._channel_from_event(data, is_member=True)
+        if self._membership is not None:
+            if isinstance(data.get('members'), list):
+                # The event has the complete list of members, there is no need to load them
+                self._membership.set_members(data['id'], data['members'])
+                self._member_loads[data['id']] = time.monotonic()
+            else:
+                self._member_joined(data['id'], self._bot_info.get('id'))
+        logger.debug("Joined channel: %s" % channel)
+
+    def _on_channel_left(self, **payload):
+        if self._membership is not None:
+            self._member_loads.pop(payload['data']['channel'], None)
+            self._membership.remove_channel(payload['data']['channel'])
+        self._update_channel(payload['data']['channel'], is_member=False)
+
+    def _on_channel_rename(self, **payload):
+        data = payload['data']['channel']
+        channel = self._cached_channel(data['id'])
+        if channel is None:
+            return
+        name = data['name']
+        previous_names = channel.previous_names or []
+        if channel.name and channel.name != name and channel.name not in previous_names:
+            previous_names = [channel.name] + previous_names
+        channel = self._add_channel(dataclasses.replace(
+            channel, name=name, name_normalized=data.get('name_normalized', name),
+            previous_names=previous_names))
+        logger.debug("Channel renamed: %s" % channel)
+
+    def _on_channel_archive(self, **payload):
+        self._update_channel(payload['data']['channel'], is_archived=True)
+
+    def _on_channel_unarchive(self, **payload):
+        self._update_channel(payload['data']['channel'], is_archived=False)
+
+    def _on_member_joined_channel(self, **payload):
+        data = payload['data']
+        self._member_joined(data['channel'], data['user'])
+        channel = self._cached_channel(data['channel'])
+        if channel is None:
+            return
+        changes = {}
+        if data['user'] == self._bot_info.get('id'):
+            changes['is_member'] = True
+        if channel.members is not None and data['user'] not in channel.members:
+            changes['members'] = channel.members + [data['user']]
+        if changes:
+            self._add_channel(dataclasses.replace(channel, **changes))
+
+    def _on_member_left_channel(self, **payload):
+        data = payload['data']
+        self._member_left(data['channel'], data['user'])
+        channel = self._cached_channel(data['channel'])
+        if channel is None:
+            return
+        changes = {}
+        if data['user'] == self._bot_info.get('id'):
+            changes['is_member'] = False
+        if channel.members is not None and data['user'] in channel.members:
+            changes['members'] = [member for member in channel.members if member != data['user']]
+        if changes:
+            self._add_channel(dataclasses.replace(channel, **changes))
+
+    def _member_joined(self, channel_id: str, user_id: str):
+        if self._membership is None:
+            return
+        if user_id == self._bot_info.get('id'):
+            # The bot only gets events about the members of channels it is a member of
+            self._reload_channel_members(channel_id)
+        self._membership.add(channel_id, user_id)
+
+    def _reload_channel_members(self, channel_id: str):
+        # Joining a channel results in both a channel_joined and a member_joined_channel event,
+        # the members are only loaded once for both
+        if channel_id in self._member_loads:
+            loaded = self._member_loads[channel_id]
+            if loaded is None or time.monotonic() - loaded < MEMBERSHIP_RELOAD_INTERVAL:
+                return
+        self._member_loads[channel_id] = None
+
+        def loaded(future):
+            # Unless the bot left the channel meanwhile
+            if channel_id in self._member_loads:
+                self._member_loads[channel_id] = time.monotonic()
+
+        asyncio.run_coroutine_threadsafe(self._load_channel_members(channel_id),
+                                         self._loop).add_done_callback(loaded)
+
+    def _member_left(self, channel_id: str, user_id: str):
+        if self._membership is None:
+            return
+        if user_id == self._bot_info.get('id'):
+            self._member_loads.pop(channel_id, None)
+            self._membership.remove_channel(channel_id)
         else:
-            channel_id = data['channel']
-        channel_resp = self.web_client.conversations_info(channel=channel_id)
-        channel = self._register_channel(channel_resp['channel'])
-        logger.debug("Channel updated: %s" % channel)
+            self._membership.remove(channel_id, user_id)
 
     def _on_channel_deleted(self, **payload):
-        channel = self._channels[payload['data']['channel']]
-        del self._channels[payload['data']['channel']]
-        logger.debug("Channel %s deleted" % channel.name)
+        # A closed DM channel keeps its id, and is reopened by sending a message to it, so it
+        # stays in the DM channel cache
+        channel_id = payload['data']['channel']
+        channel = self._remove_channel(channel_id)
+        self._pending_channel_fetches.discard(channel_id)
+        logger.debug("Channel %s deleted" % (channel.name if channel else channel_id))
+
+    def _channel_from_event(self, data: Dict[str, Any], **defaults) -> Optional[Channel]:
+        # Events have (part of) the channel. Fields that are missing get defaults, or the
+        # channel is fetched if a required field is missing
+        response = dict(_CHANNEL_EVENT_DEFAULTS, **defaults)
+        response.update((key, value) for key, value in data.items() if value is not None)
+        response.setdefault('name_normalized', response.get('name'))
+        try:
+            channel = Channel.from_api_response(response)
+        except KeyError:
+            self._fetch_channel_later(data['id'])
+            return None
+        return self._add_channel(channel)
+
+    def _cached_channel(self, channel_id: str) -> Optional[Channel]:
+        # Get a channel to update from an event. Lazily loaded channels that are not cached are
+        # loaded in their current state when they are used, other channels that are not cached
+        # (yet) are fetched
+        if self._lazy_channels:
+            return self._channels.get(channel_id) if self._channels.is_cached(channel_id) else None
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            self._fetch_channel_later(channel_id)
+        return channel
+
+    def _update_channel(self, channel_id: str, **changes) -> Optional[Channel]:
+        channel = self._cached_channel(channel_id)
+        if channel is None:
+            return None
+        channel = self._add_channel(dataclasses.replace(channel, **changes))
+        logger.debug("Channel updated: %s" % channel)
+        return channel
+
+    def _fetch_channel_later(self, channel_id: str):
+        if not self._pending_channel_fetches:
+            self._loop.call_soon_threadsafe(self._loop.call_later, self._channel_fetch_delay,
+                                            self._fetch_pending_channels)
+        self._pending_channel_fetches.add(channel_id)
+
+    def _fetch_pending_channels(self):
+        channel_ids, self._pending_channel_fetches = self._pending_channel_fetches, set()
+        if channel_ids:
+            asyncio.ensure_future(self.fetch_channels(channel_ids), loop=self._loop)
+
+    async def fetch_channels(self, channel_ids: Iterable[str]):
+        """Fetch channels with ``conversations.info``, and update them in the cache
+
+        Channels that no longer exist are removed from the cache.
+
+        :param channel_ids: the ids of the channels
+        """
+        async def fetch(channel_id):
+            try:
+                response = await self.async_web_client.conversations_info(channel=channel_id)
+            except SlackApiError as e:
+                if e.response.get('error') != 'channel_not_found':
+                    logger.warning("Fetching channel %s failed: %s", channel_id, e)
+                    return
+                self._remove_channel(channel_id)
+            except Exception:
+                logger.exception("Fetching channel %s failed", channel_id)
+            else:
+                self._register_channel(response['channel'])
+
+        await asyncio.gather(*(fetch(channel_id) for channel_id in channel_ids))
+
+    def _remove_channel(self, channel_id: str) -> Optional[Channel]:
+        # Lazily loaded channels are not necessarily cached
+        channel = self._channels.pop(channel_id, None)
+        self._index_channel_names(channel_id, None)
+        if self._membership is not None:
+            self._member_loads.pop(channel_id, None)
+            self._membership.remove_channel(channel_id)
+        self._notify_channel_handlers(channel_id, None)
+        self._snapshot_changed()
+        return channel
 
     @property
     def bot_info(self) -> Dict[str, str]:
         return self._bot_info
 
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
     def start(self):
+        self.register_handlers()
+        self.rtm_client.start()
+
+    def register_handlers(self):
+        """Register the handlers that keep the user and channel caches up to date
+
+        The handlers are registered once, calling this again has no effect.
+        """
+        # RTMClient keeps its callbacks in a class-level list, registering twice would run every
+        # handler twice
+        if self._handlers_registered:
+            return
+        self._handlers_registered = True
         RTMClient.on(event='open', callback=self._on_open)
         RTMClient.on(event='team_join', callback=self._on_team_join)
         RTMClient.on(event='channel_created', callback=self._on_channel_created)
-        RTMClient.on(event='im_created', callback=self._on_channel_created)
+        RTMClient.on(event='im_created', callback=self._on_im_created)
         RTMClient.on(event='channel_deleted', callback=self._on_channel_deleted)
+        RTMClient.on(event='group_deleted', callback=self._on_channel_deleted)
         RTMClient.on(event='im_close', callback=self._on_channel_deleted)
-        RTMClient.on(event='channel_rename', callback=self._on_channel_updated)
-        RTMClient.on(event='channel_archive', callback=self._on_channel_updated)
-        RTMClient.on(event='channel_unarchive', callback=self._on_channel_updated)
+        RTMClient.on(event='channel_joined', callback=self._on_channel_joined)
+        RTMClient.on(event='group_joined', callback=self._on_channel_joined)
+        RTMClient.on(event='channel_left', callback=self._on_channel_left)
+        RTMClient.on(event='group_left', callback=self._on_channel_left)
+        RTMClient.on(event='channel_rename', callback=self._on_channel_rename)
+        RTMClient.on(event='group_rename', callback=self._on_channel_rename)
+        RTMClient.on(event='channel_archive', callback=self._on_channel_archive)
+        RTMClient.on(event='group_archive', callback=self._on_channel_archive)
+        RTMClient.on(event='channel_unarchive', callback=self._on_channel_unarchive)
+        RTMClient.on(event='group_unarchive', callback=self._on_channel_unarchive)
+        RTMClient.on(event='member_joined_channel', callback=self._on_member_joined_channel)
+        RTMClient.on(event='member_left_channel', callback=self._on_member_left_channel)
         RTMClient.on(event='user_change', callback=self._on_user_change)
-        self.rtm_client.start()
+        if self._lazy_users or self._lazy_channels:
+            RTMClient.on(event='message', callback=self._prefetch)
+            RTMClient.on(event='reaction_added', callback=self._prefetch)
+
+    def _prefetch(self, **payload):
+        # Load the users and channels of events in the background, plugins are likely to use them
+        data = payload['data']
+        if self._lazy_users:
+            self._users.prefetch([data.get('user'), data.get('item_user')])
+        if self._lazy_channels:
+            item = data.get('item')
+            self._channels.prefetch([data.get('channel'),
+                                     item.get('channel') if isinstance(item, dict) else None])
 
     @property
     def users(self) -> Dict[str, User]:
@@ -1,6 +1,6 @@
 import logging
 from datetime import datetime
-from typing import Dict, Union
+from typing import Dict, List, Optional, Union
 
 from machine.clients.singletons.scheduling import Scheduler
 from machine.models import User
@@ -8,6 +8,7 @@ from machine.models.channel import Channel
 from machine.clients.singletons.slack import LowLevelSlackClient
 
 from slack.web.classes import extract_json
+from slack.web.client import WebClient
 
 logger = logging.getLogger(__name__)
 
@@ -39,7 +40,41 @@ class SlackClient:
     def channels(self) -> Dict[str, Channel]:
         return LowLevelSlackClient.get_instance().channels
 
-    def send(self, channel: Union[Channel, str], text: str, **kwargs):
+    def fetch_user(self, user_id: str) -> User:
+        return LowLevelSlackClient.get_instance().fetch_user(user_id)
+
+    def fetch_channel(self, channel_id: str) -> Channel:
+        return LowLevelSlackClient.get_instance().fetch_channel(channel_id)
+
+    async def fetch_user_async(self, user_id: str) -> User:
+        return await LowLevelSlackClient.get_instance().fetch_user_async(user_id)
+
+    async def fetch_channel_async(self, channel_id: str) -> Channel:
+        return await LowLevelSlackClient.get_instance().fetch_channel_async(channel_id)
+
+    def find_channel_by_name(self, channel_name: str) -> Optional[Channel]:
+        return LowLevelSlackClient.get_instance().find_channel_by_name(channel_name)
+
+    def find_user_by_email(self, email: str) -> Optional[User]:
+        return LowLevelSlackClient.get_instance().find_user_by_email(email)
+
+    def find_user_by_name(self, name: str) -> Optional[User]:
+        return LowLevelSlackClient.get_instance().find_user_by_name(name)
+
+    def find_users_by_name(self, name: str) -> List[User]:
+        return LowLevelSlackClient.get_instance().find_users_by_name(name)
+
+    def search_users(self, query: str, limit: int = 10) -> List[User]:
+        return LowLevelSlackClient.get_instance().search_users(query, limit)
+
+    def channel_members(self, channel: Union[Channel, str]) -> List[str]:
+        return LowLevelSlackClient.get_instance().channel_members(id_for_channel(channel))
+
+    def user_channels(self, user: Union[User, str]) -> List[str]:
+        return LowLevelSlackClient.get_instance().user_channels(id_for_user(user))
+
+    @staticmethod
+    def _send(web_client: WebClient, channel: Union[Channel, str], text: str, **kwargs):
         channel_id = id_for_channel(channel)
         if 'attachments' in kwargs and kwargs['attachments'] is not None:
             kwargs['attachments'] = extract_json(kwargs['attachments'])
@@ -48,19 +83,27 @@ class SlackClient:
         if 'ephemeral_user' in kwargs and kwargs['ephemeral_user'] is not None:
             ephemeral_user_id = id_for_user(kwargs['ephemeral_user'])
             del kwargs['ephemeral_user']
-            return LowLevelSlackClient.get_instance().web_client.chat_postEphemeral(
+            return web_client.chat_postEphemeral(
                 channel=channel_id,
                 user=ephemeral_user_id,
                 text=text,
                 **kwargs
             )
         else:
-            return LowLevelSlackClient.get_instance().web_client.chat_postMessage(
+            return web_client.chat_postMessage(
                 channel=channel_id,
                 text=text,
                 **kwargs
             )
 
+    def send(self, channel: Union[Channel, str], text: str, **kwargs):
+        web_client = LowLevelSlackClient.get_instance().web_client
+        return self._send(web_client, channel, text, **kwargs)
+
+    async def send_async(self, channel: Union[Channel, str], text: str, **kwargs):
+        web_client = LowLevelSlackClient.get_instance().async_web_client
+        return await self._send(web_client, channel, text, **kwargs)
+
     def send_scheduled(self, when: datetime, channel: Union[Channel, str], text: str, **kwargs):
         args = [self, channel, text]
 
@@ -73,10 +116,30 @@ class SlackClient:
                                                                            channel=channel_id,
                                                                            timestamp=ts)
 
+    async def react_async(self, channel: Union[Channel, str], ts: str, emoji: str):
+        channel_id = id_for_channel(channel)
+        web_client = LowLevelSlackClient.get_instance().async_web_client
+        return await web_client.reactions_add(name=emoji, channel=channel_id, timestamp=ts)
+
     def open_im(self, user: Union[User, str]) -> str:
         user_id = id_for_user(user)
-        response = LowLevelSlackClient.get_instance().web_client.im_open(user=user_id)
-        return response['channel']['id']
+        client = LowLevelSlackClient.get_instance()
+        channel_id = client.dm_channel_id(user_id)
+        if channel_id is None:
+            response = client.web_client.im_open(user=user_id)
+            channel_id = response['channel']['id']
+            client.register_dm_channel(user_id, channel_id)
+        return channel_id
+
+    async def open_im_async(self, user: Union[User, str]) -> str:
+        user_id = id_for_user(user)
+        client = LowLevelSlackClient.get_instance()
+        channel_id = await client.dm_channel_id_async(user_id)
+        if channel_id is None:
+            response = await client.async_web_client.im_open(user=user_id)
+            channel_id = response['channel']['id']
+            await client.register_dm_channel_async(user_id, channel_id)
+        return channel_id
 
     def send_dm(self, user: Union[User, str], text: str, **kwargs):
         user_id = id_for_user(user)
@@ -89,6 +152,17 @@ class SlackClient:
             **kwargs
         )
 
+    async def send_dm_async(self, user: Union[User, str], text: str, **kwargs):
+        user_id = id_for_user(user)
+        dm_channel_id = await self.open_im_async(user_id)
+
+        return await LowLevelSlackClient.get_instance().async_web_client.chat_postMessage(
+            channel=dm_channel_id,
+            text=text,
+            as_user=True,
+            **kwargs
+        )
+
     def send_dm_scheduled(self, when: datetime, user, text: str, **kwargs):
         args = [self, user, text]
 
@@ -1,13 +1,13 @@
+import hmac
 import inspect
 import logging
 import sys
 import time
-from typing import Callable
-from threading import Thread
+from threading import Lock, Thread
 
 import dill
+from apscheduler.util import ref_to_obj
 from clint.textui import puts, indent, colored
-from slack import RTMClient
 
 from machine.vendor import bottle
 
@@ -19,16 +19,19 @@ from machine.clients.singletons.storage import Storage
 from machine.clients.slack import SlackClient
 from machine.clients.singletons.slack import LowLevelSlackClient
 from machine.storage import PluginStorage
+from machine.utils.aio import run_coroutine
+from machine.utils.metrics import enable_metrics, get_metrics
 from machine.utils.module_loading import import_string
+from machine.utils.profiling import SamplingProfiler, handler_labels
 from machine.utils.text import show_valid, show_invalid, warn, error, announce
 
 logger = logging.getLogger(__name__)
 
 
-def callable_with_sanitized_event(fn: Callable):
-    def sanitzed_call(**payload):
-        return fn(payload['data'])
-    return sanitzed_call
+def run_coroutine_job(fn_ref: str, *args):
+    # Scheduled jobs run in a thread of the scheduler, async jobs are run on the event loop
+    fn = ref_to_obj(fn_ref)
+    run_coroutine(fn, LowLevelSlackClient.get_instance().loop, *args).result()
 
 
 class Machine:
@@ -56,6 +59,10 @@ class Machine:
             if 'SLACK_API_TOKEN' not in self._settings:
                 error("No SLACK_API_TOKEN found in settings! I need that to work...")
                 sys.exit(1)
+            if self._settings.get('ENABLE_METRICS'):
+                # Metrics have to be enabled before the clients and the dispatcher are created
+                puts("Enabling metrics...")
+                enable_metrics()
             self._client = LowLevelSlackClient()
             puts("Initializing storage using backend: {}".format(self._settings['STORAGE_BACKEND']))
             self._storage = Storage.get_instance()
@@ -63,13 +70,15 @@ class Machine:
 
             self._plugin_actions = {
                 'listen_to': {},
-                'respond_to': {}
+                'respond_to': {},
+                'process': {}
             }
             self._help = {
                 'human': {},
                 'robot': {}
             }
             self._dispatcher = EventDispatcher(self._plugin_actions, self._settings)
+            self._profile_lock = Lock()
             puts("Loading plugins...")
             self.load_plugins()
             logger.debug("The following plugin actions were registered: %s", self._plugin_actions)
@@ -131,24 +140,33 @@ class Machine:
         fq_fn_name = "{}.{}".format(plugin_class, fn_name)
         if fn.__doc__:
             self._help['human'][class_help][fq_fn_name] = self._parse_human_help(fn.__doc__)
-        for action, config in metadata['plugin_actions'].items():
+        for action, config in metadata.get('plugin_actions', {}).items():
             if action == 'process':
                 event_type = config['event_type']
-                RTMClient.on(event=event_type, callback=callable_with_sanitized_event(fn))
+                self._dispatcher.register_process_handler(event_type, fn, plugin_class)
             if action == 'respond_to' or action == 'listen_to':
-                for regex in config['regex']:
+                scopes = config.get('scope', [None] * len(config['regex']))
+                for regex, scope in zip(config['regex'], scopes):
                     event_handler = {
                         'class': cls_instance,
                         'class_name': plugin_class,
                         'function': fn,
-                        'regex': regex
+                        'regex': regex,
+                        'scope': scope
                     }
                     key = "{}-{}".format(fq_fn_name, regex.pattern)
-                    self._plugin_actions[action][key] = event_handler
+                    self._dispatcher.register_listener(action, key, event_handler)
                     self._help['robot'][class_help].append(self._parse_robot_help(regex, action))
             if action == 'schedule':
-                Scheduler.get_instance().add_job(fq_fn_name, trigger='cron', args=[cls_instance],
-                                                 id=fq_fn_name, replace_existing=True, **config)
+                if inspect.iscoroutinefunction(fn):
+                    Scheduler.get_instance().add_job(run_coroutine_job, trigger='cron',
+                                                     args=[fq_fn_name, cls_instance],
+                                                     id=fq_fn_name, replace_existing=True,
+                                                     **config)
+                else:
+                    Scheduler.get_instance().add_job(fq_fn_name, trigger='cron',
+                                                     args=[cls_instance], id=fq_fn_name,
+                                                     replace_existing=True, **config)
             if action == 'route':
                 for route_config in config:
                     bottle.route(**route_config)(fn)
@@ -174,6 +192,34 @@ class Machine:
         else:
             return regex.pattern
 
+    @staticmethod
+    def _metrics_view():
+        bottle.response.content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        return get_metrics().render()
+
+    def _profile_view(self):
+        expected = "Bearer {}".format(self._settings['PROFILING_TOKEN']).encode()
+        provided = bottle.request.get_header('Authorization', '').encode()
+        if not hmac.compare_digest(provided, expected):
+            bottle.abort(401, "Not authorized")
+        try:
+            seconds = float(bottle.request.query.get('seconds', 10))
+        except ValueError:
+            bottle.abort(400, "seconds should be a number")
+        seconds = min(max(seconds, 0), float(self._settings.get('PROFILING_MAX_SECONDS', 60)))
+        output_format = bottle.request.query.get('format', 'collapsed')
+        if output_format not in ('collapsed', 'stats'):
+            bottle.abort(400, "format should be either collapsed or stats")
+        if not self._profile_lock.acquire(blocking=False):
+            bottle.abort(409, "A profile is already running")
+        try:
+            profiler = SamplingProfiler(labels=handler_labels(self._plugin_actions))
+            profile = profiler.profile(seconds)
+        finally:
+            self._profile_lock.release()
+        bottle.response.content_type = 'text/plain; charset=utf-8'
+        return profile.collapsed() if output_format == 'collapsed' else profile.stats()
+
     def _keepalive(self):
         while True:
             time.sleep(self._settings['KEEP_ALIVE'])
@@ -187,6 +233,10 @@ class Machine:
             Scheduler.get_instance().start()
             show_valid("Scheduler started")
             if not self._settings['DISABLE_HTTP']:
+                if get_metrics() is not None:
+                    bottle.route('/metrics')(self._metrics_view)
+                if self._settings.get('PROFILING_TOKEN'):
+                    bottle.route('/profile')(self._profile_view)
                 self._bottle_thread = Thread(
                     target=bottle.run,
                     kwargs=dict(
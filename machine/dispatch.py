@@ -1,12 +1,27 @@
+import asyncio
+import inspect
 import logging
 import re
-from typing import Any, Dict, Optional, List
+import time
+from concurrent.futures import Future
+from threading import Thread
+from typing import Any, Callable, Dict, Hashable, Optional, List, Tuple
 
 from slack import RTMClient
 
 from machine.clients.singletons.slack import LowLevelSlackClient
+from machine.clients.singletons.storage import Storage
 from machine.clients.slack import SlackClient
+from machine.models import Channel
 from machine.plugins.base import Message
+from machine.utils.aio import run_coroutine
+from machine.utils.collections import LRUCache
+from machine.utils.executor import KeyedExecutor
+from machine.utils.matching import ScopedListenerIndex
+from machine.utils.metrics import get_metrics
+from machine.utils.queues import (PriorityEventQueue, PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL,
+                                  SHED_DROP_OLDEST)
+from machine.utils.watchdog import HandlerWatchdog, Timeouts
 
 logger = logging.getLogger(__name__)
 
@@ -14,10 +29,19 @@ logger = logging.getLogger(__name__)
 class EventDispatcher:
 
     def __init__(self, plugin_actions, settings=None):
+        settings = settings or {}
         self._client = LowLevelSlackClient()
+        # SlackClient has no state of its own, so all messages can share one
+        self._slack_client = SlackClient()
         self._plugin_actions = plugin_actions
+        self._listener_index = {
+            _type: ScopedListenerIndex(plugin_actions.get(_type), self._resolve_channel)
+            for _type in ('listen_to', 'respond_to')
+        }
+        # Listeners can be scoped to channel names, keep track of the names of channels
+        self._client.add_channel_handler(self._update_channel)
         alias_regex = ''
-        if settings and "ALIASES" in settings:
+        if "ALIASES" in settings:
             logger.info("Setting aliases to {}".format(settings['ALIASES']))
             alias_regex = '|(?P<alias>{})'.format(
                 '|'.join([re.escape(s) for s in settings['ALIASES'].split(',')]))
@@ -27,11 +51,145 @@ class EventDispatcher:
             ),
             re.DOTALL,
         )
+        self._default_timeouts = Timeouts(
+            soft=self._parse_timeout(settings.get('HANDLER_SOFT_TIMEOUT')),
+            hard=self._parse_timeout(settings.get('HANDLER_HARD_TIMEOUT')),
+        )
+        self._watchdog = HandlerWatchdog()
+        self._dedup_window = float(settings.get('EVENT_DEDUP_WINDOW', 300))
+        dedup_cache_size = int(settings.get('EVENT_DEDUP_CACHE_SIZE', 1000))
+        self._seen_events = None
+        if dedup_cache_size:
+            self._seen_events = LRUCache(dedup_cache_size, ttl=self._dedup_window)
+        self._shared_dedup = bool(settings.get('EVENT_DEDUP_SHARED', False))
+        # The last check against the shared storage by ordering key, see _ingest_if_not_seen
+        self._shared_dedup_checks = {}
+        self._duplicates = 0
+        self._executor = None
+        if settings.get('WORKER_POOL_SIZE'):
+            pool_size = int(settings['WORKER_POOL_SIZE'])
+            queue_size = int(settings.get('WORKER_QUEUE_SIZE', 1000))
+            logger.info("Running handlers on %d workers (max. queue size: %d)", pool_size,
+                        queue_size)
+            self._executor = KeyedExecutor(pool_size, queue_size)
+        self._ingestion_queue = None
+        if settings.get('INGESTION_QUEUE_SIZE'):
+            self._ingestion_queue = PriorityEventQueue(
+                int(settings['INGESTION_QUEUE_SIZE']),
+                policy=settings.get('INGESTION_SHED_POLICY', SHED_DROP_OLDEST),
+                sample_rate=float(settings.get('INGESTION_SAMPLE_RATE', 0.1)),
+            )
+        self._ingestion_thread = None
+        self._metrics = get_metrics()
+        if self._metrics is not None:
+            self._register_stats()
+
+    def _register_stats(self):
+        self._metrics.add_stats('machine_watchdog', "Plugin function watchdog",
+                                self._watchdog.stats)
+        self._metrics.add_stats('machine_dedup', "Duplicate message detection", self._dedup_stats)
+        if self._executor is not None:
+            self._metrics.add_stats('machine_executor', "Worker pool", self._executor.stats)
+        if self._ingestion_queue is not None:
+            self._metrics.add_stats('machine_ingestion', "Ingestion queue",
+                                    self._ingestion_queue.stats)
+
+    def _dedup_stats(self) -> Dict[str, int]:
+        return {
+            'duplicates': self._duplicates,
+            'cached': len(self._seen_events) if self._seen_events is not None else 0,
+        }
+
+    @staticmethod
+    def _parse_timeout(value) -> Optional[float]:
+        return float(value) if value is not None else None
 
     def start(self):
+        self.setup()
+        self._client.start()
+
+    def setup(self):
+        """Start the helper threads and register the event handlers, without connecting to Slack"""
+        self._watchdog.start()
+        self._start_ingestion()
         RTMClient.on(event='pong', callback=self.pong)
         RTMClient.on(event='message', callback=self.handle_message)
-        self._client.start()
+        self._client.register_handlers()
+
+    def _start_ingestion(self):
+        if self._ingestion_queue is not None and self._ingestion_thread is None:
+            self._ingestion_thread = Thread(target=self._ingest_events, name='machine-ingestion',
+                                            daemon=True)
+            self._ingestion_thread.start()
+
+    def _ingest_events(self):
+        while True:
+            fn, args = self._ingestion_queue.get()
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception("Error while dispatching event")
+
+    def _ingest(self, priority: int, fn: Callable, *args):
+        # Without ingestion queue, events are dispatched directly on the thread of the RTM client
+        if self._ingestion_queue is None:
+            fn(*args)
+        elif not self._ingestion_queue.put((fn, args), priority):
+            logger.debug("Shedding event: %s", args)
+
+    @property
+    def ingestion_queue(self) -> Optional[PriorityEventQueue]:
+        return self._ingestion_queue
+
+    def register_listener(self, _type: str, key: str, listener: Dict[str, Any]):
+        listener['timeouts'] = self._handler_timeouts(listener['function'])
+        self._plugin_actions[_type][key] = listener
+        self._listener_index[_type].add(key, listener)
+
+    def register_process_handler(self, event_type: str, fn: Callable, class_name: str):
+        labels = (class_name, fn.__name__, event_type)
+        timeouts = self._handler_timeouts(fn)
+        handlers = self._plugin_actions.setdefault('process', {}).setdefault(event_type, {})
+        handlers["{}.{}".format(class_name, fn.__name__)] = {
+            'class_name': class_name,
+            'function': fn,
+        }
+
+        def process_event(event):
+            if inspect.iscoroutinefunction(fn):
+                self._call_handler(labels, timeouts, fn, event)
+            else:
+                self._run(self._ordering_key(event), self._call_handler, labels, timeouts, fn,
+                          event)
+
+        def process_callback(**payload):
+            if self._metrics is not None:
+                self._metrics.events_received.inc(event_type)
+            self._ingest(PRIORITY_NORMAL, process_event, payload['data'])
+        RTMClient.on(event=event_type, callback=process_callback)
+
+    def _handler_timeouts(self, fn: Callable) -> Timeouts:
+        # Timeouts of the function take precedence over timeouts of the plugin class, which take
+        # precedence over the global timeouts
+        soft, hard = self._default_timeouts
+        sources = [fn]
+        if hasattr(fn, '__self__'):
+            sources.insert(0, fn.__self__.__class__)
+        for f_or_cls in sources:
+            config = getattr(f_or_cls, 'metadata', {}).get('timeout', {})
+            if config.get('soft') is not None:
+                soft = config['soft']
+            if config.get('hard') is not None:
+                hard = config['hard']
+        return Timeouts(soft=soft, hard=hard)
+
+    @property
+    def watchdog(self) -> HandlerWatchdog:
+        return self._watchdog
+
+    @property
+    def executor(self) -> Optional[KeyedExecutor]:
+        return self._executor
 
     def pong(self, **kwargs):
         logger.debug("Server Pong!")
@@ -39,21 +197,146 @@ class EventDispatcher:
     def handle_message(self, **payload):
         # Handle message listeners
         event = payload['data']
+        if self._metrics is not None:
+            self._metrics.events_received.inc('message')
         if 'user' in event and not event['user'] == self._get_bot_id():
-            respond_to_msg = self._check_bot_mention(event)
-            if respond_to_msg:
-                listeners = self._find_listeners('respond_to')
-                self._dispatch_listeners(listeners, respond_to_msg)
+            if self._is_duplicate(event):
+                logger.debug("Dropping duplicate event: %s", event)
+                return
+            if self._shared_dedup and self._seen_events is not None and 'ts' in event:
+                # Checking the storage is I/O, which must not block the event loop
+                self._ingest_if_not_seen(event)
             else:
-                listeners = self._find_listeners('listen_to')
-                self._dispatch_listeners(listeners, event)
+                self._ingest_message(event)
 
-    def _find_listeners(self, _type):
-        return list(self._plugin_actions[_type].values())
+    def _ingest_message(self, event: Dict[str, Any]):
+        respond_to_msg = self._check_bot_mention(event)
+        # Messages directed at the bot (including DMs) take priority over passive listening
+        if respond_to_msg:
+            self._ingest(PRIORITY_HIGH, self._dispatch_message, 'respond_to', respond_to_msg)
+        else:
+            self._ingest(PRIORITY_LOW, self._dispatch_message, 'listen_to', event)
+
+    def _ingest_if_not_seen(self, event: Dict[str, Any]):
+        # Events are checked concurrently, but ingested in order per channel
+        key = self._ordering_key(event)
+        future = run_coroutine(self._check_shared_dedup, self._client.loop, event,
+                               self._shared_dedup_checks.get(key))
+        self._shared_dedup_checks[key] = future
+
+        def done(_):
+            if self._shared_dedup_checks.get(key) is future:
+                del self._shared_dedup_checks[key]
+
+        future.add_done_callback(done)
+
+    async def _check_shared_dedup(self, event: Dict[str, Any], previous: Optional[Future]):
+        # Let multiple instances of the bot deduplicate against each other
+        storage_key = "machine.dispatch:seen:{}:{}:{}".format(event.get('channel'), event['ts'],
+                                                              event.get('subtype'))
+        is_new = await Storage.get_instance().set_if_not_exists_async(storage_key, b'1',
+                                                                      int(self._dedup_window))
+        if previous is not None:
+            await asyncio.wait([asyncio.wrap_future(previous)])
+        if not is_new:
+            self._duplicates += 1
+            logger.debug("Dropping duplicate event: %s", event)
+            return
+        self._ingest_message(event)
+
+    def _dispatch_message(self, _type: str, event: Dict[str, Any]):
+        listeners = self._find_listeners(_type, event)
+        if listeners:
+            self._run(self._ordering_key(event), self._dispatch_listeners, _type, listeners, event)
+
+    def _is_duplicate(self, event: Dict[str, Any]) -> bool:
+        # After reconnecting, the RTM API can deliver the same message again
+        if self._seen_events is None or 'ts' not in event:
+            return False
+        key = (event.get('channel'), event['ts'], event.get('subtype'))
+        if key in self._seen_events:
+            self._duplicates += 1
+            return True
+        self._seen_events[key] = True
+        return False
+
+    @property
+    def duplicates(self) -> int:
+        return self._duplicates
+
+    def _run(self, key: Hashable, fn: Callable, *args):
+        if self._executor:
+            if not self._executor.submit(key, fn, *args):
+                logger.warning("Worker queue is full, dropping %s for %s",
+                               getattr(fn, '__name__', fn), key)
+        else:
+            fn(*args)
+
+    def _call_handler(self, labels: Tuple[str, str, str], timeouts: Timeouts, fn: Callable, *args,
+                      **kwargs):
+        # labels: plugin class name, function name and event type of the handler
+        name = "{}.{}".format(labels[0], labels[1])
+        if inspect.iscoroutinefunction(fn):
+            # Coroutines run concurrently on the event loop of the RTM client
+            if self._metrics is not None:
+                run_coroutine(self._measure_async, self._client.loop, labels, name, timeouts, fn,
+                              *args, **kwargs)
+            else:
+                run_coroutine(self._watchdog.run_async, self._client.loop, name, timeouts, fn,
+                              *args, **kwargs)
+        elif self._metrics is not None:
+            self._measure(labels, name, timeouts, fn, *args, **kwargs)
+        else:
+            self._watchdog.run(name, timeouts, fn, *args, **kwargs)
+
+    def _measure(self, labels: Tuple[str, str, str], name: str, timeouts: Timeouts, fn: Callable,
+                 *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._watchdog.run(name, timeouts, fn, *args, **kwargs)
+        except Exception:
+            self._metrics.handler_errors.inc(*labels)
+            raise
+        finally:
+            self._metrics.handler_duration.observe(time.perf_counter() - started, *labels)
+
+    async def _measure_async(self, labels: Tuple[str, str, str], name: str, timeouts: Timeouts,
+                             fn: Callable, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await self._watchdog.run_async(name, timeouts, fn, *args, **kwargs)
+        except Exception:
+            self._metrics.handler_errors.inc(*labels)
+            raise
+        finally:
+            self._metrics.handler_duration.observe(time.perf_counter() - started, *labels)
 
     @staticmethod
-    def _gen_message(event, plugin_class_name):
-        return Message(SlackClient(), event, plugin_class_name)
+    def _ordering_key(event: Dict[str, Any]) -> Hashable:
+        # Events are handled in order per channel, and per thread within a channel
+        channel = event.get('channel')
+        if isinstance(channel, dict):
+            channel = channel.get('id')
+        return channel, event.get('thread_ts')
+
+    def _find_listeners(self, _type: str, event: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return self._listener_index[_type].candidates(event.get('text', ''), event['channel'],
+                                                      'thread_ts' in event)
+
+    def _update_channel(self, channel_id: str, channel: Optional[Channel]):
+        name = channel.name if channel is not None else None
+        for index in self._listener_index.values():
+            index.update_channel(channel_id, name)
+
+    def _resolve_channel(self, name: str) -> Optional[str]:
+        channel = self._client.find_channel_by_name(name)
+        # Only channels that have the name now, not channels that had it before
+        if channel is None or (channel.name or '').lower() != name:
+            return None
+        return channel.id
+
+    def _gen_message(self, event, plugin_class_name):
+        return Message(self._slack_client, event, plugin_class_name)
 
     def _get_bot_id(self) -> str:
         return self._client.bot_info['id']
@@ -92,10 +375,19 @@ class EventDispatcher:
                 event['text'] = m.groupdict().get('text', None)
         return event
 
-    def _dispatch_listeners(self, listeners: List[Dict[str, Any]], event: Dict[str, Any]):
+    def _dispatch_listeners(self, _type: str, listeners: List[Dict[str, Any]],
+                            event: Dict[str, Any]):
+        message = None
         for listener in listeners:
             matcher = listener['regex']
             match = matcher.search(event.get('text', ''))
             if match:
-                message = self._gen_message(event, listener['class_name'])
-                listener['function'](message, **match.groupdict())
+                # One message per event, shared by all listeners that match it
+                if message is None:
+                    message = self._gen_message(event, listener['class_name'])
+                else:
+                    message = message._for_plugin(listener['class_name'])
+                fn = listener['function']
+                labels = (listener['class_name'], fn.__name__, _type)
+                timeouts = listener.get('timeouts', self._default_timeouts)
+                self._call_handler(labels, timeouts, fn, message, **match.groupdict())
@@ -1,9 +1,10 @@
 from dataclasses import dataclass
 from typing import List, Dict, Any, Optional
 
-from dacite import from_dict
+from machine.models.construct import build_from_dict, slotted
 
 
+@slotted
 @dataclass(frozen=True)
 class PurposeTopic:
     value: str
@@ -11,6 +12,7 @@ class PurposeTopic:
     last_set: int
 
 
+@slotted
 @dataclass(frozen=True)
 class Channel:
     """
@@ -47,4 +49,10 @@ class Channel:
 
     @staticmethod
     def from_api_response(user_reponse: Dict[str, Any]) -> 'Channel':
-        return from_dict(data_class=Channel, data=user_reponse)
+        return _channel_from_dict(user_reponse)
+
+
+_purpose_topic_from_dict = build_from_dict(PurposeTopic, interned=('creator',))
+_channel_from_dict = build_from_dict(Channel, nested={'topic': _purpose_topic_from_dict,
+                                                      'purpose': _purpose_topic_from_dict},
+                                     interned=('creator',))
@@ -0,0 +1,121 @@
+"""Fast construction of model objects from Slack API responses
+
+Slack Machine builds a model object for every user and channel in the workspace at startup. Going
+through a generic, type checking converter for every one of them is slow in large workspaces, so
+the models get a constructor that is generated for their fields instead.
+"""
+import dataclasses
+import sys
+from typing import Any, Callable, Dict, Iterable, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+def _is_optional(field: dataclasses.Field) -> bool:
+    return type(None) in getattr(field.type, '__args__', ())
+
+
+def _getstate(self):
+    return [getattr(self, f.name) for f in dataclasses.fields(self)]
+
+
+def _setstate(self, state):
+    if isinstance(state, tuple):
+        # (__dict__, slots) of objects pickled by the default protocol
+        instance_dict, slots = state
+        state = dict(instance_dict or {}, **(slots or {}))
+    if isinstance(state, dict):
+        # Objects pickled before the class had slots, their fields are in the __dict__. Fields
+        # that were added since get their default, or None
+        for f in dataclasses.fields(self):
+            if f.name in state:
+                value = state[f.name]
+            elif f.default is not dataclasses.MISSING:
+                value = f.default
+            elif f.default_factory is not dataclasses.MISSING:
+                value = f.default_factory()
+            else:
+                value = None
+            object.__setattr__(self, f.name, value)
+        return
+    for f, value in zip(dataclasses.fields(self), state):
+        object.__setattr__(self, f.name, value)
+
+
+def slotted(cls: T) -> T:
+    """Turn a (frozen) dataclass into one with ``__slots__``, so instances don't need a ``__dict__``
+
+    Use as a decorator, on top of ``@dataclass``.
+
+    :param cls: the dataclass
+    :return: a copy of the dataclass, with slots for its fields
+    """
+    names = tuple(f.name for f in dataclasses.fields(cls))
+    cls_dict = dict(cls.__dict__)
+    cls_dict['__slots__'] = names
+    for name in names:
+        # Default values are kept by the generated __init__, they would conflict with the slots
+        cls_dict.pop(name, None)
+    cls_dict.pop('__dict__', None)
+    cls_dict.pop('__weakref__', None)
+    # Frozen dataclasses can't set attributes the regular way, which pickle relies on
+    cls_dict['__getstate__'] = _getstate
+    cls_dict['__setstate__'] = _setstate
+    return type(cls)(cls.__name__, cls.__bases__, cls_dict)
+
+
+def build_from_dict(cls: Any, nested: Optional[Dict[str, Callable[[Dict[str, Any]], Any]]] = None,
+                    interned: Iterable[str] = (), dropped: Iterable[str] = ()) \
+        -> Callable[[Dict[str, Any]], Any]:
+    """Generate a function that creates a dataclass from a dictionary, like an API response
+
+    Keys that are not fields are ignored. Fields that are ``Optional`` or have a default can be
+    missing from the dictionary, others raise ``KeyError`` when missing. Values are not type
+    checked.
+
+    :param cls: the dataclass
+    :param nested: functions that create the values of fields from nested dictionaries, by field
+        name. They are not called for values that are ``None``
+    :param interned: names of fields whose string values are interned, for values that many
+        objects share (like team ids)
+    :param dropped: names of (optional) fields that are always set to ``None``
+    :return: function that takes the dictionary and returns a new instance of the dataclass
+    """
+    nested = nested or {}
+    interned = set(interned)
+    dropped = set(dropped)
+    namespace = {'_cls': cls, '_intern': sys.intern}
+    lines = ['def from_dict(data):', '    get = data.get']
+    args = []
+    for f in dataclasses.fields(cls):
+        if not f.init:
+            continue
+        var = '_v_{}'.format(f.name)
+        if f.name in dropped:
+            args.append('None')
+            continue
+        has_default = f.default is not dataclasses.MISSING
+        if has_default:
+            namespace['_dflt_{}'.format(f.name)] = f.default
+            value = 'get({!r}, _dflt_{})'.format(f.name, f.name)
+        elif _is_optional(f) or f.default_factory is not dataclasses.MISSING:
+            value = 'get({!r})'.format(f.name)
+        else:
+            value = 'data[{!r}]'.format(f.name)
+        if f.name not in nested and f.name not in interned:
+            args.append(value)
+            continue
+        lines.append('    {} = {}'.format(var, value))
+        if f.name in nested:
+            namespace['_nested_{}'.format(f.name)] = nested[f.name]
+            lines.append('    if {} is not None:'.format(var))
+            lines.append('        {0} = _nested_{1}({0})'.format(var, f.name))
+        if f.name in interned:
+            lines.append('    if {}.__class__ is str:'.format(var))
+            lines.append('        {0} = _intern({0})'.format(var))
+        args.append(var)
+    lines.append('    return _cls({})'.format(', '.join(args)))
+    exec('\n'.join(lines), namespace)
+    from_dict = namespace['from_dict']
+    from_dict.__qualname__ = '{}.from_dict'.format(cls.__name__)
+    return from_dict
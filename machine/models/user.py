@@ -1,9 +1,10 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from typing import Optional, Dict, Any
 
-from dacite import from_dict
+from machine.models.construct import build_from_dict, slotted
 
 
+@slotted
 @dataclass(frozen=True)
 class Profile:
     avatar_hash: str
@@ -25,6 +26,7 @@ class Profile:
     image_original: Optional[str] = None
 
 
+@slotted
 @dataclass(frozen=True)
 class User:
     """
@@ -54,7 +56,29 @@ class User:
 
     @staticmethod
     def from_api_response(user_reponse: Dict[str, Any]) -> 'User':
-        return from_dict(data_class=User, data=user_reponse)  # pragma: no cover
+        return _user_from_dict(user_reponse)
 
     def fmt_mention(self) -> str:
         return "<@{}>".format(self.id)
+
+
+# Values that many users share are interned, so they are only kept in memory once
+_PROFILE_IMAGE_FIELDS = tuple(f.name for f in fields(Profile) if f.name.startswith('image_'))
+_profile_from_dict = build_from_dict(Profile, interned=('team', 'status_emoji'))
+_profile_without_images_from_dict = build_from_dict(Profile, interned=('team', 'status_emoji'),
+                                                    dropped=_PROFILE_IMAGE_FIELDS)
+_USER_INTERNED = ('team_id', 'color', 'tz', 'tz_label', 'locale')
+_USER_FROM_DICT = build_from_dict(User, nested={'profile': _profile_from_dict},
+                                  interned=_USER_INTERNED)
+_USER_WITHOUT_IMAGES_FROM_DICT = build_from_dict(
+    User, nested={'profile': _profile_without_images_from_dict}, interned=_USER_INTERNED)
+_user_from_dict = _USER_FROM_DICT
+
+
+def keep_profile_images(keep: bool):
+    """Set whether users that are created from now on keep the URLs of their profile images
+
+    :param keep: ``False`` to set the ``image_*`` fields of profiles to ``None``, to save memory
+    """
+    global _user_from_dict
+    _user_from_dict = _USER_FROM_DICT if keep else _USER_WITHOUT_IMAGES_FROM_DICT
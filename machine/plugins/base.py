@@ -5,6 +5,7 @@ from blinker import signal
 from slack.web.classes.attachments import Attachment
 from slack.web.classes.blocks import Block
 
+from machine.clients.singletons.http import HTTPClient, PooledSession
 from machine.clients.slack import SlackClient
 from machine.models import Channel
 from machine.models import User
@@ -49,6 +50,9 @@ class MachineBasePlugin:
     def users(self) -> Dict[str, User]:
         """Dictionary of all users in the Slack workspace
 
+        When ``LAZY_USER_CACHE`` is enabled, users are loaded when they are looked up, and only
+        the users that were used recently are in the dictionary.
+
         :return: a dictionary of all users in the Slack workspace, where the key is the user id and
             the value is a :py:class:`~machine.models.user.User` object
         """
@@ -60,7 +64,9 @@ class MachineBasePlugin:
 
         This is a list of all channels in the Slack workspace that the bot is aware of. This
         includes all public channels, all private channels the bot is a member of and all DM
-        channels the bot is a member of.
+        channels the bot is a member of. When ``LAZY_CHANNEL_CACHE`` is enabled, channels are
+        loaded when they are looked up, and only the channels that were used recently are in the
+        list.
 
         :return: a list of all channels in the Slack workspace, where each channel is a
             :py:class:`~machine.models.channel.Channel` object
@@ -68,11 +74,88 @@ class MachineBasePlugin:
         return self._client.channels
 
     def find_channel_by_name(self, channel_name: str) -> Optional[Channel]:
-        if channel_name.startswith('#'):
-            channel_name = channel_name[1:]
-        for c in self.channels.values():
-            if channel_name.lower() == c.name_normalized.lower():
-                return c
+        """Find a channel by its name
+
+        Names are compared case-insensitively, and can start with a ``#``. Channels can also be
+        found by a name they had before they were renamed.
+
+        :param channel_name: the name of the channel
+        :return: the :py:class:`~machine.models.channel.Channel`, or ``None`` if there is no
+            channel with that name
+        """
+        return self._client.find_channel_by_name(channel_name)
+
+    def find_user_by_email(self, email: str) -> Optional[User]:
+        """Find a user by email address
+
+        Email addresses are compared case-insensitively. The bot needs the ``users:read.email``
+        scope to see the email addresses of users.
+
+        :param email: the email address of the user
+        :return: the :py:class:`~machine.models.user.User`, or ``None`` if there is no user with
+            that email address
+        """
+        return self._client.find_user_by_email(email)
+
+    def find_user_by_name(self, name: str) -> Optional[User]:
+        """Find a user by name
+
+        The name can be a username (which can start with an ``@``), a display name or a real
+        name, and is compared case-insensitively. Usernames are unique, but display names and
+        real names are not: a user whose username matches takes precedence over one whose display
+        name matches, which takes precedence over one whose real name matches. Use
+        :py:meth:`find_users_by_name` to get all of them.
+
+        :param name: the name of the user
+        :return: the :py:class:`~machine.models.user.User`, or ``None`` if there is no user with
+            that name
+        """
+        return self._client.find_user_by_name(name)
+
+    def find_users_by_name(self, name: str) -> List[User]:
+        """Find all users with a name
+
+        :param name: the username, display name or real name of the users
+        :return: list of :py:class:`~machine.models.user.User` objects, in the order of
+            :py:meth:`find_user_by_name`
+        """
+        return self._client.find_users_by_name(name)
+
+    def search_users(self, query: str, limit: int = 10) -> List[User]:
+        """Search for users by (part of) their name
+
+        Useful to resolve names that people type in commands (like ``page ali``) to users. Every
+        word of the query is matched against the words in the username, display name and real
+        name of users, allowing for incomplete words and typos. Deactivated users are not found.
+
+        :param query: the name to search for, compared case-insensitively
+        :param limit: the maximum number of users to return
+        :return: list of :py:class:`~machine.models.user.User` objects, best match first
+        """
+        return self._client.search_users(query, limit)
+
+    def channel_members(self, channel: Union[Channel, str]) -> List[str]:
+        """Get the members of a channel
+
+        With ``CHANNEL_MEMBERSHIP_INDEX`` enabled, the members of channels the bot is a member of
+        are looked up without calling the Slack API.
+
+        :param channel: the :py:class:`~machine.models.channel.Channel` or its id
+        :return: the ids of the members of the channel
+        """
+        return self._client.channel_members(channel)
+
+    def user_channels(self, user: Union[User, str]) -> List[str]:
+        """Get the channels a user is a member of
+
+        With ``CHANNEL_MEMBERSHIP_INDEX`` enabled, only the channels the bot is a member of are
+        returned, without calling the Slack API. Otherwise, all channels the user is a member of
+        are fetched from Slack.
+
+        :param user: the :py:class:`~machine.models.user.User` or their id
+        :return: the ids of the channels
+        """
+        return self._client.user_channels(user)
 
     @property
     def bot_info(self) -> Dict[str, str]:
@@ -85,6 +168,18 @@ class MachineBasePlugin:
         """
         return self._client.bot_info
 
+    @property
+    def http(self) -> PooledSession:
+        """HTTP session to make requests to other services with
+
+        A :py:class:`requests.Session` that is shared by all plugins and keeps connections alive,
+        so subsequent requests to the same host are faster. It uses the ``HTTP_PROXY`` and
+        ``HTTPS_PROXY`` settings, and requests time out after ``HTTP_TIMEOUT`` seconds by default.
+
+        :return: the shared HTTP session
+        """
+        return HTTPClient.get_instance().session
+
     def at(self, user: User) -> str:
         """Create a mention of the provided user
 
@@ -164,6 +259,37 @@ class MachineBasePlugin:
                                     blocks=blocks, thread_ts=thread_ts,
                                     ephemeral_user=ephemeral_user, **kwargs)
 
+    async def say_async(self, channel: Union[Channel, str], text: str,
+                        attachments: Union[List[Attachment], List[Dict[str, Any]], None] = None,
+                        blocks: Union[List[Block], List[Dict[str, Any]], None] = None,
+                        thread_ts: Optional[str] = None,
+                        ephemeral_user: Union[User, str, None] = None, **kwargs):
+        """Send a message to a channel, asynchronously
+
+        This is the asynchronous version of
+        :py:meth:`~machine.plugins.base.MachineBasePlugin.say`. It behaves the same, but has to
+        be awaited, which makes it suitable for use in ``async`` plugin functions.
+
+        :param channel: :py:class:`~machine.models.channel.Channel` object or id of channel to send
+            message to. Can be public or private (group) channel, or DM channel.
+        :param text: message text
+        :param attachments: optional attachments (see `attachments`_)
+        :param blocks: optional blocks (see `blocks`_)
+        :param thread_ts: optional timestamp of thread, to send a message in that thread
+        :param ephemeral_user: optional user name or id if the message needs to visible
+            to a specific user only
+        :return: Dictionary deserialized from `chat.postMessage`_ request, or `chat.postEphemeral`_
+            if `ephemeral_user` is True.
+
+        .. _attachments: https://api.slack.com/docs/message-attachments
+        .. _blocks: https://api.slack.com/reference/block-kit/blocks
+        .. _chat.postMessage: https://api.slack.com/methods/chat.postMessage
+        .. _chat.postEphemeral: https://api.slack.com/methods/chat.postEphemeral
+        """
+        return await self._client.send_async(channel, text=text, attachments=attachments,
+                                             blocks=blocks, thread_ts=thread_ts,
+                                             ephemeral_user=ephemeral_user, **kwargs)
+
     def react(self, channel: Union[Channel, str], ts: str, emoji: str):
         """React to a message in a channel
 
@@ -180,6 +306,23 @@ class MachineBasePlugin:
         """
         return self._client.react(channel, ts, emoji)
 
+    async def react_async(self, channel: Union[Channel, str], ts: str, emoji: str):
+        """React to a message in a channel, asynchronously
+
+        This is the asynchronous version of
+        :py:meth:`~machine.plugins.base.MachineBasePlugin.react`. It behaves the same, but has to
+        be awaited, which makes it suitable for use in ``async`` plugin functions.
+
+        :param channel: :py:class:`~machine.models.channel.Channel` object or id of channel to send
+            message to. Can be public or private (group) channel, or DM channel.
+        :param ts: timestamp of the message to react to
+        :param emoji: what emoji to react with (should be a string, like 'angel', 'thumbsup', etc.)
+        :return: Dictionary deserialized from `reactions.add`_ request.
+
+        .. _reactions.add: https://api.slack.com/methods/reactions.add
+        """
+        return await self._client.react_async(channel, ts, emoji)
+
     def send_dm(self, user: Union[User, str], text: str,
                 attachments: Union[List[Attachment], List[Dict[str, Any]], None] = None,
                 blocks: Union[List[Block], List[Dict[str, Any]], None] = None, **kwargs):
@@ -206,6 +349,29 @@ class MachineBasePlugin:
         """
         return self._client.send_dm(user, text, attachments=attachments, blocks=blocks, **kwargs)
 
+    async def send_dm_async(self, user: Union[User, str], text: str,
+                            attachments: Union[List[Attachment], List[Dict[str, Any]], None] = None,
+                            blocks: Union[List[Block], List[Dict[str, Any]], None] = None,
+                            **kwargs):
+        """Send a Direct Message, asynchronously
+
+        This is the asynchronous version of
+        :py:meth:`~machine.plugins.base.MachineBasePlugin.send_dm`. It behaves the same, but has
+        to be awaited, which makes it suitable for use in ``async`` plugin functions.
+
+        :param user: :py:class:`~machine.models.user.User` object or id of user to send DM to.
+        :param text: message text
+        :param attachments: optional attachments (see `attachments`_)
+        :param blocks: optional blocks (see `blocks`_)
+        :return: Dictionary deserialized from `chat.postMessage`_ request.
+
+        .. _attachments: https://api.slack.com/docs/message-attachments
+        .. _blocks: https://api.slack.com/reference/block-kit/blocks
+        .. _chat.postMessage: https://api.slack.com/methods/chat.postMessage
+        """
+        return await self._client.send_dm_async(user, text, attachments=attachments,
+                                                blocks=blocks, **kwargs)
+
     def send_dm_scheduled(self, when: datetime, user: Union[User, str], text: str,
                           attachments: Union[List[Attachment], List[Dict[str, Any]], None] = None,
                           blocks: Union[List[Block], List[Dict[str, Any]], None] = None, **kwargs):
@@ -252,11 +418,27 @@ class Message:
     The ``Message`` class also contains convenience methods for replying to the message in the
     right channel, replying to the sender, etc.
     """
+    __slots__ = ('_client', '_msg_event', '_fq_plugin_name', '_sender', '_channel')
 
     def __init__(self, client: SlackClient, msg_event: Dict[str, Any], plugin_class_name: str):
         self._client = client
         self._msg_event = msg_event
         self._fq_plugin_name = plugin_class_name
+        self._sender = None
+        self._channel = None
+
+    def _for_plugin(self, plugin_class_name: str) -> 'Message':
+        # The same message is passed to every plugin function that matches it, only the plugin
+        # name differs. Copying the slots is cheaper than building a new message
+        if plugin_class_name == self._fq_plugin_name:
+            return self
+        message = Message.__new__(Message)
+        message._client = self._client
+        message._msg_event = self._msg_event
+        message._fq_plugin_name = plugin_class_name
+        message._sender = self._sender
+        message._channel = self._channel
+        return message
 
     @property
     def sender(self) -> User:
@@ -264,7 +446,11 @@ class Message:
 
         :return: the User the message was sent by
         """
-        return self._client.users[self._msg_event['user']]
+        if self._sender is None:
+            user_id = self._msg_event['user']
+            # The user cache can still be loading when the first messages come in
+            self._sender = self._client.users.get(user_id) or self._client.fetch_user(user_id)
+        return self._sender
 
     @property
     def channel(self) -> Channel:
@@ -272,7 +458,35 @@ class Message:
 
         :return: the Channel the message was sent to
         """
-        return self._client.channels[self._msg_event['channel']]
+        if self._channel is None:
+            channel_id = self._msg_event['channel']
+            self._channel = self._client.channels.get(channel_id) or \
+                self._client.fetch_channel(channel_id)
+        return self._channel
+
+    async def sender_async(self) -> User:
+        """The sender of the message, asynchronously
+
+        This is the asynchronous version of :py:attr:`sender`, which doesn't block the event loop
+        when the sender has to be fetched from Slack.
+
+        :return: the User the message was sent by
+        """
+        if self._sender is None:
+            self._sender = await self._client.fetch_user_async(self._msg_event['user'])
+        return self._sender
+
+    async def channel_async(self) -> Channel:
+        """The channel the message was sent to, asynchronously
+
+        This is the asynchronous version of :py:attr:`channel`, which doesn't block the event loop
+        when the channel has to be fetched from Slack.
+
+        :return: the Channel the message was sent to
+        """
+        if self._channel is None:
+            self._channel = await self._client.fetch_channel_async(self._msg_event['channel'])
+        return self._channel
 
     @property
     def is_dm(self) -> bool:
@@ -296,7 +510,8 @@ class Message:
 
         .. _mention: https://api.slack.com/docs/message-formatting#linking_to_channels_and_users
         """
-        return self.sender.fmt_mention()
+        # Mentions only need the id of the sender, there's no need to look the sender up
+        return "<@{}>".format(self._msg_event['user'])
 
     def say(self, text: str,
             attachments: Union[List[Attachment], List[Dict[str, Any]], None] = None,
@@ -379,6 +594,45 @@ class Message:
                                     ephemeral_user=ephemeral_user,
                                     **kwargs)
 
+    async def say_async(self, text: str,
+                        attachments: Union[List[Attachment], List[Dict[str, Any]], None] = None,
+                        blocks: Union[List[Block], List[Dict[str, Any]], None] = None,
+                        thread_ts: Optional[str] = None, ephemeral: bool = False, **kwargs):
+        """Send a new message to the channel the original message was received in, asynchronously
+
+        This is the asynchronous version of :py:meth:`~machine.plugins.base.Message.say`.
+        It behaves the same, but has to be awaited, which makes it suitable for use in ``async``
+        plugin functions.
+
+        :param text: message text
+        :param attachments: optional attachments (see `attachments`_)
+        :param blocks: optional blocks (see `blocks`_)
+        :param thread_ts: optional timestamp of thread, to send a message in that thread
+        :param ephemeral: ``True/False`` wether to send the message as an ephemeral message, only
+            visible to the sender of the original message
+        :return: Dictionary deserialized from `chat.postMessage`_ request, or `chat.postEphemeral`_
+            if `ephemeral` is True.
+
+        .. _attachments: https://api.slack.com/docs/message-attachments
+        .. _blocks: https://api.slack.com/reference/block-kit/blocks
+        .. _chat.postMessage: https://api.slack.com/methods/chat.postMessage
+        .. _chat.postEphemeral: https://api.slack.com/methods/chat.postEphemeral
+        """
+        if ephemeral:
+            ephemeral_user = self._msg_event['user']
+        else:
+            ephemeral_user = None
+
+        return await self._client.send_async(
+            self._msg_event['channel'],
+            text=text,
+            attachments=attachments,
+            blocks=blocks,
+            thread_ts=thread_ts,
+            ephemeral_user=ephemeral_user,
+            **kwargs
+        )
+
     def reply(self, text,
               attachments: Union[List[Attachment], List[Dict[str, Any]], None] = None,
               blocks: Union[List[Block], List[Dict[str, Any]], None] = None,
@@ -450,6 +704,38 @@ class Message:
             return self.say_scheduled(when, text, attachments=attachments, blocks=blocks,
                                       ephemeral=ephemeral, **kwargs)
 
+    async def reply_async(self, text,
+                          attachments: Union[List[Attachment], List[Dict[str, Any]], None] = None,
+                          blocks: Union[List[Block], List[Dict[str, Any]], None] = None,
+                          in_thread: bool = False, ephemeral: bool = False, **kwargs):
+        """Reply to the sender of the original message, asynchronously
+
+        This is the asynchronous version of :py:meth:`~machine.plugins.base.Message.reply`.
+        It behaves the same, but has to be awaited, which makes it suitable for use in ``async``
+        plugin functions.
+
+        :param text: message text
+        :param attachments: optional attachments (see `attachments`_)
+        :param blocks: optional blocks (see `blocks`_)
+        :param in_thread: ``True/False`` wether to reply to the original message in-thread
+        :param ephemeral: ``True/False`` wether to send the message as an ephemeral message, only
+            visible to the sender of the original message
+        :return: Dictionary deserialized from `chat.postMessage`_ request, or `chat.postEphemeral`_
+            if `ephemeral` is True.
+
+        .. _attachments: https://api.slack.com/docs/message-attachments
+        .. _blocks: https://api.slack.com/reference/block-kit/blocks
+        .. _chat.postMessage: https://api.slack.com/methods/chat.postMessage
+        .. _chat.postEphemeral: https://api.slack.com/methods/chat.postEphemeral
+        """
+        if in_thread and not ephemeral:
+            return await self.say_async(text, attachments=attachments, blocks=blocks,
+                                        thread_ts=self.ts, **kwargs)
+        else:
+            text = self._create_reply(text)
+            return await self.say_async(text, attachments=attachments, blocks=blocks,
+                                        ephemeral=ephemeral, **kwargs)
+
     def reply_dm(self, text: str,
                  attachments: Union[List[Attachment], List[Dict[str, Any]], None] = None,
                  blocks: Union[List[Block], List[Dict[str, Any]], None] = None, **kwargs):
@@ -496,6 +782,28 @@ class Message:
         self._client.send_dm_scheduled(when, self.sender.id, text=text, attachments=attachments,
                                        blocks=blocks, **kwargs)
 
+    async def reply_dm_async(
+            self, text: str,
+            attachments: Union[List[Attachment], List[Dict[str, Any]], None] = None,
+            blocks: Union[List[Block], List[Dict[str, Any]], None] = None, **kwargs):
+        """Reply to the sender of the original message with a DM, asynchronously
+
+        This is the asynchronous version of :py:meth:`~machine.plugins.base.Message.reply_dm`.
+        It behaves the same, but has to be awaited, which makes it suitable for use in ``async``
+        plugin functions.
+
+        :param text: message text
+        :param attachments: optional attachments (see `attachments`_)
+        :param blocks: optional blocks (see `blocks`_)
+        :return: Dictionary deserialized from `chat.postMessage`_ request.
+
+        .. _attachments: https://api.slack.com/docs/message-attachments
+        .. _blocks: https://api.slack.com/reference/block-kit/blocks
+        .. _chat.postMessage: https://api.slack.com/methods/chat.postMessage
+        """
+        return await self._client.send_dm_async(self._msg_event['user'], text,
+                                                attachments=attachments, blocks=blocks, **kwargs)
+
     def react(self, emoji: str):
         """React to the original message
 
@@ -508,6 +816,21 @@ class Message:
         """
         return self._client.react(self.channel.id, self._msg_event['ts'], emoji)
 
+    async def react_async(self, emoji: str):
+        """React to the original message, asynchronously
+
+        This is the asynchronous version of :py:meth:`~machine.plugins.base.Message.react`.
+        It behaves the same, but has to be awaited, which makes it suitable for use in ``async``
+        plugin functions.
+
+        :param emoji: what emoji to react with (should be a string, like 'angel', 'thumbsup', etc.)
+        :return: Dictionary deserialized from `reactions.add`_ request.
+
+        .. _reactions.add: https://api.slack.com/methods/reactions.add
+        """
+        return await self._client.react_async(self._msg_event['channel'], self._msg_event['ts'],
+                                              emoji)
+
     def _create_reply(self, text):
         if not self.is_dm:
             return f"{self.at_sender}: {text}"
@@ -1,5 +1,4 @@
 import random
-import requests
 import logging
 from machine.plugins.base import MachineBasePlugin
 from machine.plugins.decorators import respond_to, required_settings
@@ -47,7 +46,7 @@ class ImageSearchPlugin(MachineBasePlugin):
                 'hq': 'animated',
                 'tbs': 'itp:animated'
             })
-        r = requests.get('https://www.googleapis.com/customsearch/v1', params=query_params)
+        r = self.http.get('https://www.googleapis.com/customsearch/v1', params=query_params)
         if r.ok:
             response = r.json()
             results = [result["link"] for result in response["items"] if "items" in response]
@@ -1,4 +1,3 @@
-import requests
 from machine.plugins.base import MachineBasePlugin
 from machine.plugins.decorators import respond_to
 from machine.plugins.builtin.fun.regexes import url_regex
@@ -56,7 +55,7 @@ class MemePlugin(MachineBasePlugin):
 
     def _memegen_api_request(self, path):
         url = self._base_url + path.lower()
-        r = requests.get(url)
+        r = self.http.get(url)
         if r.ok:
             return r.status_code, r.json()
         else:
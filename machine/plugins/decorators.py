@@ -2,6 +2,8 @@ import re
 
 from blinker import signal
 
+from machine.utils.matching import ListenerScope
+
 
 def process(slack_event_type):
     """Process Slack events of a specific type
@@ -28,7 +30,30 @@ def process(slack_event_type):
     return process_decorator
 
 
-def listen_to(regex, flags=re.IGNORECASE):
+def _listener_scope(channels, dm_only, channels_only, thread_only):
+    if dm_only and (channels or channels_only):
+        raise ValueError("dm_only cannot be combined with channels or channels_only")
+    if isinstance(channels, str):
+        channels = [channels]
+    if not (channels or dm_only or channels_only or thread_only):
+        return None
+    return ListenerScope(channels=frozenset(channels or ()), dm_only=dm_only,
+                         channels_only=channels_only, thread_only=thread_only)
+
+
+def _add_listener(f, action, regex, flags, scope):
+    f.metadata = getattr(f, "metadata", {})
+    f.metadata['plugin_actions'] = f.metadata.get('plugin_actions', {})
+    config = f.metadata['plugin_actions'][action] = f.metadata['plugin_actions'].get(action, {})
+    config['regex'] = config.get('regex', [])
+    config['scope'] = config.get('scope', [None] * len(config['regex']))
+    config['regex'].append(re.compile(regex, flags))
+    config['scope'].append(scope)
+    return f
+
+
+def listen_to(regex, flags=re.IGNORECASE, channels=None, dm_only=False, channels_only=False,
+              thread_only=False):
     """Listen to messages matching a regex pattern
 
     This decorator will enable a Plugin method to listen to messages that match a regex pattern.
@@ -37,25 +62,28 @@ def listen_to(regex, flags=re.IGNORECASE):
     Named groups can be used in the regex pattern, to catch specific parts of the message. These
     groups will be passed to the method as keyword arguments when called.
 
+    The other arguments limit the conversations the method listens in. Messages in other
+    conversations are not matched against the regex pattern at all.
+
     :param regex: regex pattern to listen for
     :param flags: regex flags to apply when matching
+    :param channels: optional channel, or list of channels, to only listen in. Channels can be
+        given by id or by name (with or without ``#``, use ``#`` for names that look like an id)
+    :param dm_only: ``True/False`` wether to only listen to direct messages
+    :param channels_only: ``True/False`` wether to only listen in channels, not to direct messages
+    :param thread_only: ``True/False`` wether to only listen to messages in threads
     :return: wrapped method
     """
+    scope = _listener_scope(channels, dm_only, channels_only, thread_only)
 
     def listen_to_decorator(f):
-        f.metadata = getattr(f, "metadata", {})
-        f.metadata['plugin_actions'] = f.metadata.get('plugin_actions', {})
-        f.metadata['plugin_actions']['listen_to'] = \
-            f.metadata['plugin_actions'].get('listen_to', {})
-        f.metadata['plugin_actions']['listen_to']['regex'] = \
-            f.metadata['plugin_actions']['listen_to'].get('regex', [])
-        f.metadata['plugin_actions']['listen_to']['regex'].append(re.compile(regex, flags))
-        return f
+        return _add_listener(f, 'listen_to', regex, flags, scope)
 
     return listen_to_decorator
 
 
-def respond_to(regex, flags=re.IGNORECASE):
+def respond_to(regex, flags=re.IGNORECASE, channels=None, dm_only=False, channels_only=False,
+               thread_only=False):
     """Listen to messages mentioning the bot and matching a regex pattern
 
     This decorator will enable a Plugin method to listen to messages that are directed to the bot
@@ -66,20 +94,22 @@ def respond_to(regex, flags=re.IGNORECASE):
     parts of the message. These groups will be passed to the method as keyword arguments when
     called.
 
+    The other arguments limit the conversations the method listens in, like for
+    :py:func:`listen_to`.
+
     :param regex: regex pattern to listen for
     :param flags: regex flags to apply when matching
+    :param channels: optional channel, or list of channels, to only listen in. Channels can be
+        given by id or by name (with or without ``#``, use ``#`` for names that look like an id)
+    :param dm_only: ``True/False`` wether to only listen to direct messages
+    :param channels_only: ``True/False`` wether to only listen in channels, not to direct messages
+    :param thread_only: ``True/False`` wether to only listen to messages in threads
     :return: wrapped method
     """
+    scope = _listener_scope(channels, dm_only, channels_only, thread_only)
 
     def respond_to_decorator(f):
-        f.metadata = getattr(f, "metadata", {})
-        f.metadata['plugin_actions'] = f.metadata.get('plugin_actions', {})
-        f.metadata['plugin_actions']['respond_to'] = \
-            f.metadata['plugin_actions'].get('respond_to', {})
-        f.metadata['plugin_actions']['respond_to']['regex'] = \
-            f.metadata['plugin_actions']['respond_to'].get('regex', [])
-        f.metadata['plugin_actions']['respond_to']['regex'].append(re.compile(regex, flags))
-        return f
+        return _add_listener(f, 'respond_to', regex, flags, scope)
 
     return respond_to_decorator
 
@@ -155,6 +185,28 @@ def required_settings(settings):
     return required_settings_decorator
 
 
+def timeout(soft=None, hard=None):
+    """Specify time budgets for a plugin or plugin method
+
+    Plugin functions that handle messages or events and run longer than the ``soft`` timeout are
+    reported in the logs. Plugin functions that run longer than the ``hard`` timeout are reported
+    as well, and are cancelled if they are ``async`` functions. Regular functions cannot be
+    cancelled. When applied to a plugin class, the timeouts apply to all its functions, unless a
+    function specifies its own timeouts. Timeouts that are not specified default to the
+    ``HANDLER_SOFT_TIMEOUT`` and ``HANDLER_HARD_TIMEOUT`` settings.
+
+    :param soft: soft timeout in seconds
+    :param hard: hard timeout in seconds
+    """
+
+    def timeout_decorator(f_or_cls):
+        f_or_cls.metadata = getattr(f_or_cls, "metadata", {})
+        f_or_cls.metadata['timeout'] = {'soft': soft, 'hard': hard}
+        return f_or_cls
+
+    return timeout_decorator
+
+
 def route(path, **kwargs):
     """Define a http route that should trigger the function
 
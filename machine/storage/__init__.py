@@ -1,7 +1,49 @@
+import inspect
+import time
+from functools import wraps
+
 import dill
 
 from machine.clients.singletons.storage import Storage
 from machine.utils import sizeof_fmt
+from machine.utils.metrics import get_metrics
+
+
+def _measured(operation):
+    """Record the duration and errors of a storage operation, when metrics are enabled"""
+    def decorator(f):
+        if inspect.iscoroutinefunction(f):
+            @wraps(f)
+            async def wrapper(self, *args, **kwargs):
+                metrics = get_metrics()
+                if metrics is None:
+                    return await f(self, *args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return await f(self, *args, **kwargs)
+                except Exception:
+                    metrics.storage_errors.inc(self._fq_plugin_name, operation)
+                    raise
+                finally:
+                    metrics.storage_duration.observe(time.perf_counter() - started,
+                                                     self._fq_plugin_name, operation)
+        else:
+            @wraps(f)
+            def wrapper(self, *args, **kwargs):
+                metrics = get_metrics()
+                if metrics is None:
+                    return f(self, *args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return f(self, *args, **kwargs)
+                except Exception:
+                    metrics.storage_errors.inc(self._fq_plugin_name, operation)
+                    raise
+                finally:
+                    metrics.storage_duration.observe(time.perf_counter() - started,
+                                                     self._fq_plugin_name, operation)
+        return wrapper
+    return decorator
 
 
 class PluginStorage:
@@ -12,6 +54,9 @@ class PluginStorage:
     the storage backend, and deserialized upon retrieval. Serialization is done by `dill`_, so
     pretty much any Python object can be stored and retrieved.
 
+    Every method that interacts with the storage backend has an asynchronous counterpart, with
+    the same name and an ``_async`` suffix, to be awaited in ``async`` plugin functions.
+
     .. _Dill: https://pypi.python.org/pypi/dill
     """
     def __init__(self, fq_plugin_name):
@@ -23,6 +68,7 @@ class PluginStorage:
     def _namespace_key(self, key, shared):
         return key if shared else self._gen_unique_key(key)
 
+    @_measured('set')
     def set(self, key, value, expires=None, shared=False):
         """Store or update a value by key
 
@@ -36,6 +82,7 @@ class PluginStorage:
         pickled_value = dill.dumps(value)
         Storage.get_instance().set(namespaced_key, pickled_value, expires)
 
+    @_measured('get')
     def get(self, key, shared=False):
         """Retrieve data by key
 
@@ -50,6 +97,7 @@ class PluginStorage:
         else:
             return None
 
+    @_measured('has')
     def has(self, key, shared=False):
         """Check if the key exists in storage
 
@@ -66,6 +114,7 @@ class PluginStorage:
         namespaced_key = self._namespace_key(key, shared)
         return Storage.get_instance().has(namespaced_key)
 
+    @_measured('delete')
     def delete(self, key, shared=False):
         """Remove a key and its data from storage
 
@@ -76,6 +125,35 @@ class PluginStorage:
         namespaced_key = self._namespace_key(key, shared)
         Storage.get_instance().delete(namespaced_key)
 
+    @_measured('set')
+    async def set_async(self, key, value, expires=None, shared=False):
+        """Asynchronous version of :py:meth:`set`"""
+        namespaced_key = self._namespace_key(key, shared)
+        pickled_value = dill.dumps(value)
+        await Storage.get_instance().set_async(namespaced_key, pickled_value, expires)
+
+    @_measured('get')
+    async def get_async(self, key, shared=False):
+        """Asynchronous version of :py:meth:`get`"""
+        namespaced_key = self._namespace_key(key, shared)
+        value = await Storage.get_instance().get_async(namespaced_key)
+        if value:
+            return dill.loads(value)
+        else:
+            return None
+
+    @_measured('has')
+    async def has_async(self, key, shared=False):
+        """Asynchronous version of :py:meth:`has`"""
+        namespaced_key = self._namespace_key(key, shared)
+        return await Storage.get_instance().has_async(namespaced_key)
+
+    @_measured('delete')
+    async def delete_async(self, key, shared=False):
+        """Asynchronous version of :py:meth:`delete`"""
+        namespaced_key = self._namespace_key(key, shared)
+        await Storage.get_instance().delete_async(namespaced_key)
+
     def get_storage_size(self):
         """Calculate the total size of the storage
 
@@ -1,3 +1,6 @@
+import asyncio
+
+
 class MachineBaseStorage:
     """Base class for storage backends
 
@@ -7,6 +10,11 @@ class MachineBaseStorage:
 
     - Serialization/Deserialization of data
     - Namespacing of keys (so data stored by different plugins doesn't clash)
+
+    The asynchronous counterparts of ``get``, ``set``, ``delete``, ``has`` and
+    ``set_if_not_exists`` are used by async plugins and by Slack Machine itself. By default, they
+    run the synchronous methods in the default executor of the event loop, so the event loop isn't
+    blocked by I/O. Backends with native async support can override them.
     """
     def __init__(self, settings):
         self.settings = settings
@@ -45,9 +53,47 @@ class MachineBaseStorage:
         """
         raise NotImplementedError
 
+    def set_if_not_exists(self, key, value, expires=None):
+        """Store data by key, but only if the key doesn't exist yet
+
+        The default implementation is not atomic. Backends that are shared by multiple Slack
+        Machine instances should override it with an atomic implementation.
+
+        :param key: the key under which to store the data
+        :param value: data as (byte)string
+        :param expires: optional expiration time in seconds, after which the data should not be
+            returned any more.
+        :return: ``True`` if the data was stored, ``False`` if the key already existed
+        """
+        if self.has(key):
+            return False
+        self.set(key, value, expires)
+        return True
+
     def size(self):
         """Calculate the total size of the storage
 
         :return: total size of storage in bytes (integer)
         """
         raise NotImplementedError
+
+    async def get_async(self, key):
+        """Asynchronous version of :py:meth:`get`"""
+        return await asyncio.get_event_loop().run_in_executor(None, self.get, key)
+
+    async def set_async(self, key, value, expires=None):
+        """Asynchronous version of :py:meth:`set`"""
+        await asyncio.get_event_loop().run_in_executor(None, self.set, key, value, expires)
+
+    async def delete_async(self, key):
+        """Asynchronous version of :py:meth:`delete`"""
+        await asyncio.get_event_loop().run_in_executor(None, self.delete, key)
+
+    async def has_async(self, key):
+        """Asynchronous version of :py:meth:`has`"""
+        return await asyncio.get_event_loop().run_in_executor(None, self.has, key)
+
+    async def set_if_not_exists_async(self, key, value, expires=None):
+        """Asynchronous version of :py:meth:`set_if_not_exists`"""
+        return await asyncio.get_event_loop().run_in_executor(None, self.set_if_not_exists, key,
+                                                              value, expires)
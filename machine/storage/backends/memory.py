@@ -41,5 +41,21 @@ class MemoryStorage(MachineBaseStorage):
     def delete(self, key):
         del self._storage[key]
 
+    # In-memory storage doesn't do I/O, so there's no need to offload work to an executor
+    async def get_async(self, key):
+        return self.get(key)
+
+    async def set_async(self, key, value, expires=None):
+        self.set(key, value, expires)
+
+    async def delete_async(self, key):
+        self.delete(key)
+
+    async def has_async(self, key):
+        return self.has(key)
+
+    async def set_if_not_exists_async(self, key, value, expires=None):
+        return self.set_if_not_exists(key, value, expires)
+
     def size(self):
         return sys.getsizeof(self._storage)  # pragma: no cover
@@ -23,6 +23,9 @@ class RedisStorage(MachineBaseStorage):
     def set(self, key, value, expires=None):
         self._redis.set(self._prefix(key), value, expires)
 
+    def set_if_not_exists(self, key, value, expires=None):
+        return bool(self._redis.set(self._prefix(key), value, expires, nx=True))
+
     def delete(self, key):
         self._redis.delete(self._prefix(key))
 
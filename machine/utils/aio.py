@@ -0,0 +1,31 @@
+import asyncio
+import logging
+from concurrent.futures import Future
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+def _log_exception(future: Future):
+    if not future.cancelled() and future.exception() is not None:
+        exc = future.exception()
+        logger.error("Error while running coroutine: %s", exc,
+                     exc_info=(type(exc), exc, exc.__traceback__))
+
+
+def run_coroutine(fn: Callable, loop: asyncio.AbstractEventLoop, *args, **kwargs) -> Future:
+    """Run a coroutine function on an event loop, from any thread
+
+    Exceptions raised by the coroutine are logged, so they don't get lost when nobody waits for
+    the result.
+
+    :param fn: coroutine function to call
+    :param loop: event loop to run the coroutine on
+    :param args: positional arguments for the coroutine function
+    :param kwargs: keyword arguments for the coroutine function
+    :return: future that can be used to wait for the result (from threads other than the one
+        running the event loop)
+    """
+    future = asyncio.run_coroutine_threadsafe(fn(*args, **kwargs), loop)
+    future.add_done_callback(_log_exception)
+    return future
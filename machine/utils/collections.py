@@ -1,4 +1,9 @@
+import threading
+import time
+from collections import OrderedDict
 from collections.abc import MutableMapping, Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable
 
 
 class CaseInsensitiveDict(MutableMapping):
@@ -73,3 +78,225 @@ class CaseInsensitiveDict(MutableMapping):
 
     def __repr__(self):
         return '%s(%r)' % (self.__class__.__name__, dict(self.items()))
+
+
+class LRUCache(MutableMapping):
+    """
+    A ``dict``-like object that holds at most ``maxsize`` items.
+
+    When the cache is full, setting a new key evicts the least recently used item. Getting or
+    setting a key marks it as most recently used. If ``ttl`` is provided, items expire ``ttl``
+    seconds after they were set, and are no longer returned.
+
+    This class is not thread-safe.
+    """
+
+    def __init__(self, maxsize: int, ttl: float = None):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._store = OrderedDict()
+
+    def _expired(self, expires_at):
+        return expires_at is not None and expires_at <= time.monotonic()
+
+    def __setitem__(self, key, value):
+        expires_at = time.monotonic() + self._ttl if self._ttl is not None else None
+        self._store[key] = (value, expires_at)
+        self._store.move_to_end(key)
+        while len(self._store) > self._maxsize:
+            self._store.popitem(last=False)
+
+    def __getitem__(self, key):
+        value, expires_at = self._store[key]
+        if self._expired(expires_at):
+            del self._store[key]
+            raise KeyError(key)
+        self._store.move_to_end(key)
+        return value
+
+    def __delitem__(self, key):
+        del self._store[key]
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return iter([k for k, (_, expires_at) in self._store.items()
+                     if not self._expired(expires_at)])
+
+    def __len__(self):
+        return len(self._store)
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    def __repr__(self):
+        return '%s(maxsize=%r, ttl=%r, %r)' % (self.__class__.__name__, self._maxsize, self._ttl,
+                                               dict(self.items()))
+
+
+class LoadingCache(MutableMapping):
+    """
+    A ``dict``-like object that loads missing items on first access, and holds at most
+    ``maxsize`` of them (evicting the least recently used item).
+
+    Getting a key that is not cached calls ``loader`` with the key, which should return the value
+    or raise ``KeyError`` if there is no such item. Concurrent lookups of the same key (from
+    multiple threads) share a single call to ``loader``. Iterating, ``len()`` and ``pop()`` only
+    consider the cached items. Keys can be loaded in the background with :py:meth:`prefetch`.
+
+    This class is thread-safe.
+    """
+
+    def __init__(self, loader: Callable[[Any], Any], maxsize: int, prefetch_workers: int = 4):
+        self._loader = loader
+        self._store = LRUCache(maxsize)
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._prefetch_workers = prefetch_workers
+        self._executor = None
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._prefetched = 0
+        self._not_found = 0
+
+    def _load(self, key):
+        # Returns the value, and whether this call loaded it
+        with self._lock:
+            try:
+                value = self._store[key]
+            except KeyError:
+                pass
+            else:
+                self._hits += 1
+                return value, False
+            future = self._loading.get(key)
+            if future is not None:
+                # Another thread is loading the key already, wait for it
+                self._coalesced += 1
+            else:
+                self._misses += 1
+                self._loading[key] = Future()
+        if future is not None:
+            return future.result(), False
+        future = self._loading[key]
+        try:
+            value = self._loader(key)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+                if isinstance(e, KeyError):
+                    self._not_found += 1
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._store[key] = value
+            del self._loading[key]
+        future.set_result(value)
+        return value, True
+
+    def __getitem__(self, key):
+        return self._load(key)[0]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._store[key] = value
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._store[key]
+
+    def pop(self, key, *default):
+        with self._lock:
+            try:
+                value = self._store[key]
+            except KeyError:
+                if default:
+                    return default[0]
+                raise
+            del self._store[key]
+            return value
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._store))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._store)
+
+    def is_cached(self, key) -> bool:
+        """Check if a key is cached, without loading it
+
+        :param key: the key to check
+        :return: ``True`` if the item is cached
+        """
+        with self._lock:
+            return key in self._store
+
+    def peek(self, key, default=None):
+        """Get an item if it is cached, without loading it
+
+        :param key: the key to get
+        :param default: the value to return if the item is not cached
+        :return: the item, or ``default``
+        """
+        with self._lock:
+            try:
+                value = self._store[key]
+            except KeyError:
+                return default
+            self._hits += 1
+            return value
+
+    def _prefetch(self, key):
+        try:
+            if self._load(key)[1]:
+                with self._lock:
+                    self._prefetched += 1
+        except Exception:
+            # Errors are raised again when the key is actually used
+            pass
+
+    def prefetch(self, keys: Iterable):
+        """Load keys that are not cached in the background
+
+        :param keys: the keys to load
+        """
+        with self._lock:
+            missing = {key for key in keys
+                       if key is not None and key not in self._store and key not in self._loading}
+            if missing and self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._prefetch_workers,
+                                                    thread_name_prefix='prefetch')
+        for key in missing:
+            self._executor.submit(self._prefetch, key)
+
+    def stats(self) -> Dict[str, int]:
+        """Statistics about the cache
+
+        :return: dictionary with the number of cached items, the number of lookups that were
+            served from the cache, that had to be loaded, and that waited for another lookup of
+            the same key, the number of keys loaded by :py:meth:`prefetch`, and the number of keys
+            the loader couldn't find
+        """
+        with self._lock:
+            return {
+                'size': len(self._store),
+                'maxsize': self._store.maxsize,
+                'hits': self._hits,
+                'misses': self._misses,
+                'coalesced': self._coalesced,
+                'prefetched': self._prefetched,
+                'not_found': self._not_found,
+            }
+
+    def __repr__(self):
+        return '%s(maxsize=%r, %r)' % (self.__class__.__name__, self._store.maxsize,
+                                       list(self))
@@ -0,0 +1,117 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class KeyedExecutor:
+    """Run callables on a bounded pool of worker threads, in order per key
+
+    Callables that are submitted with the same key are run one after the other, in the order they
+    were submitted. Callables with different keys run concurrently on the worker threads. To keep
+    things fair, a worker runs only one callable of a key before moving on to the next key that
+    has work waiting.
+
+    When ``max_queue_size`` callables are waiting to be run, :py:meth:`submit` rejects new
+    callables instead of letting memory grow without bound. It never blocks, because callables are
+    usually submitted from the event loop of the RTM client, which would stall as a whole.
+
+    :param max_workers: number of worker threads
+    :param max_queue_size: maximum number of callables waiting to be run, ``0`` for unbounded
+    """
+
+    def __init__(self, max_workers: int, max_queue_size: int = 0):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='machine-worker')
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._max_workers = max_workers
+        self._max_queue_size = max_queue_size
+        self._queue_depth = 0
+        self._max_queue_depth = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def submit(self, key: Hashable, fn: Callable, *args, **kwargs) -> bool:
+        """Schedule a callable to run after all callables that were submitted with the same key
+
+        :param key: ordering key, eg. the channel a message was received in
+        :param fn: callable to run
+        :param args: positional arguments for the callable
+        :param kwargs: keyword arguments for the callable
+        :return: ``False`` if the callable was rejected because the queue is full
+        """
+        item = (time.monotonic(), fn, args, kwargs)
+        with self._lock:
+            if self._max_queue_size and self._queue_depth >= self._max_queue_size:
+                self._rejected += 1
+                return False
+            self._submitted += 1
+            self._queue_depth += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queue_depth)
+            queue = self._queues.get(key)
+            if queue is not None:
+                # a worker is already processing this key, it will pick up this item as well
+                queue.append(item)
+                return True
+            self._queues[key] = deque([item])
+        self._executor.submit(self._run_next, key)
+        return True
+
+    def _run_next(self, key: Hashable):
+        with self._lock:
+            queue = self._queues[key]
+            enqueued_at, fn, args, kwargs = queue.popleft()
+            self._queue_depth -= 1
+            wait = time.monotonic() - enqueued_at
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        try:
+            fn(*args, **kwargs)
+        except Exception:
+            logger.exception("Error while running %s", getattr(fn, '__qualname__', fn))
+            failed = True
+        else:
+            failed = False
+        with self._lock:
+            self._completed += 1
+            if failed:
+                self._failed += 1
+            if not queue:
+                del self._queues[key]
+                return
+        self._executor.submit(self._run_next, key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistics about the work done by the executor
+
+        :return: dictionary with the current and maximum queue depth, the number of submitted,
+            completed, failed and rejected callables, and the average and maximum time (in seconds)
+            callables had to wait before being run
+        """
+        with self._lock:
+            started = self._submitted - self._queue_depth
+            return {
+                'max_workers': self._max_workers,
+                'max_queue_size': self._max_queue_size,
+                'queue_depth': self._queue_depth,
+                'max_queue_depth': self._max_queue_depth,
+                'active_keys': len(self._queues),
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'avg_wait': self._total_wait / started if started else 0.0,
+                'max_wait': self._max_wait,
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
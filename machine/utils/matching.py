@@ -0,0 +1,364 @@
+import itertools
+import re
+from operator import itemgetter
+from typing import (Any, Callable, Dict, FrozenSet, Hashable, List, NamedTuple, Optional, Pattern,
+                    Tuple)
+
+try:
+    from re import _parser as sre_parse  # Python >= 3.11
+    from re import _constants as sre_constants
+except ImportError:  # pragma: no cover
+    import sre_parse
+    import sre_constants
+
+LITERAL = sre_constants.LITERAL
+SUBPATTERN = sre_constants.SUBPATTERN
+MAX_REPEAT = sre_constants.MAX_REPEAT
+MIN_REPEAT = sre_constants.MIN_REPEAT
+AT = sre_constants.AT
+BRANCH = sre_constants.BRANCH
+
+
+def _is_ascii(text: str) -> bool:
+    try:
+        return text.isascii()
+    except AttributeError:  # pragma: no cover
+        # str.isascii() was added in Python 3.7
+        return all(ord(c) < 128 for c in text)
+
+
+def _requirements(data) -> List[Tuple[str, ...]]:
+    """Collect the literal strings that every match of a parsed pattern must contain
+
+    Every requirement is a tuple of alternatives: at least one of them has to be present in the
+    text for the pattern to match. Runs of literal characters yield a requirement with a single
+    alternative, alternations (``foo|bar``) can yield a requirement with multiple alternatives.
+    """
+    requirements = []
+    current = []
+
+    def flush():
+        if current:
+            requirements.append((''.join(current),))
+            current.clear()
+
+    for op, av in data:
+        if op is LITERAL:
+            current.append(chr(av))
+        elif op is AT:
+            # anchors and word boundaries are zero-width, so they don't break a run
+            continue
+        elif op is SUBPATTERN:
+            _, add_flags, del_flags, sub = av
+            if add_flags or del_flags:
+                # scoped inline flags change matching semantics of the group, don't look inside
+                flush()
+            elif all(sub_op is LITERAL for sub_op, _ in sub):
+                current.extend(chr(c) for _, c in sub)
+            else:
+                flush()
+                requirements.extend(_requirements(sub))
+        elif op is MAX_REPEAT or op is MIN_REPEAT:
+            flush()
+            low, _, sub = av
+            if low >= 1:
+                requirements.extend(_requirements(sub))
+        elif op is BRANCH:
+            flush()
+            alternatives = []
+            for branch in av[1]:
+                best = _best(_requirements(branch))
+                if best is None:
+                    break
+                alternatives.extend(best)
+            else:
+                requirements.append(tuple(sorted(set(alternatives))))
+        else:
+            flush()
+    flush()
+    return requirements
+
+
+def _best(requirements: List[Tuple[str, ...]]) -> Optional[Tuple[str, ...]]:
+    # The most selective requirement has the longest shortest alternative, and as few
+    # alternatives as possible
+    if not requirements:
+        return None
+    return max(requirements, key=lambda r: (min(len(a) for a in r), -len(r)))
+
+
+def required_literals(regex: Pattern) -> Tuple[Optional[Tuple[str, ...]], bool]:
+    """Find literal strings of which at least one is part of every possible match of a regex
+
+    The most selective set of literals is chosen. If the regex matches case insensitively, the
+    literals are lowercased and can only be used to test ASCII text: for non-ASCII text, Unicode
+    case folding can make a regex match text that does not contain the lowercased literals.
+
+    :param regex: compiled regex
+    :return: tuple of the literals (or ``None`` if no usable literals were found) and whether
+        the literals should be compared case insensitively
+    """
+    if not isinstance(regex.pattern, str):
+        return None, False
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except Exception:  # pragma: no cover
+        return None, False
+    literals = _best(_requirements(parsed))
+    if literals is None:
+        return None, False
+    if regex.flags & re.IGNORECASE:
+        if not all(_is_ascii(literal) for literal in literals):
+            return None, False
+        return tuple(sorted({literal.lower() for literal in literals})), True
+    return literals, False
+
+
+class ListenerIndex:
+    """Index of message listeners that avoids testing every regex against every message
+
+    Every listener's regex is analyzed once to find literal strings of which at least one must be
+    present in any message the regex can match. When looking up listeners for a message, only
+    listeners with a literal that occurs in the message text (and listeners for which no literals
+    could be found) are returned as candidates. Candidates are returned in the order the listeners
+    were added, so matching them in order gives exactly the same result as testing every listener.
+    """
+
+    def __init__(self, listeners: Optional[Dict[str, Dict[str, Any]]] = None):
+        self._listeners = {}
+        self._dirty = False
+        self._unindexed = []
+        self._exact = {}
+        self._folded = {}
+        if listeners:
+            for key, listener in listeners.items():
+                self.add(key, listener)
+
+    def add(self, key: str, listener: Dict[str, Any]):
+        self._listeners[key] = listener
+        self._dirty = True
+
+    def remove(self, key: str):
+        del self._listeners[key]
+        self._dirty = True
+
+    def __len__(self):
+        return len(self._listeners)
+
+    def _build(self):
+        self._unindexed = []
+        self._exact = {}
+        self._folded = {}
+        for position, listener in enumerate(self._listeners.values()):
+            literals, folded = required_literals(listener['regex'])
+            entry = (position, listener)
+            if literals is None:
+                self._unindexed.append(entry)
+                continue
+            buckets = self._folded if folded else self._exact
+            for literal in literals:
+                buckets.setdefault(literal, []).append(entry)
+        self._dirty = False
+
+    def candidates(self, text: str) -> List[Dict[str, Any]]:
+        """Find the listeners whose regex could match the provided text
+
+        :param text: text of the message
+        :return: list of candidate listeners, in the order they were added
+        """
+        if self._dirty:
+            self._build()
+        found = dict(self._unindexed)
+        for literal, entries in self._exact.items():
+            if literal in text:
+                found.update(entries)
+        if self._folded:
+            if _is_ascii(text):
+                lowered = text.lower()
+                for literal, entries in self._folded.items():
+                    if literal in lowered:
+                        found.update(entries)
+            else:
+                for entries in self._folded.values():
+                    found.update(entries)
+        return [listener for _, listener in sorted(found.items(), key=itemgetter(0))]
+
+
+_CHANNEL_ID = re.compile(r'^[CGD][A-Z0-9]{6,}$')
+
+
+def normalize_channel_name(name: str) -> str:
+    return name.lstrip('#').lower()
+
+
+class ListenerScope(NamedTuple):
+    """Conversations a listener applies to
+
+    :param channels: ids and/or names of the channels the listener applies to, all channels if
+        empty
+    :param dm_only: ``True`` if the listener only applies to direct messages
+    :param channels_only: ``True`` if the listener does not apply to direct messages
+    :param thread_only: ``True`` if the listener only applies to messages in threads
+    """
+    channels: FrozenSet[str] = frozenset()
+    dm_only: bool = False
+    channels_only: bool = False
+    thread_only: bool = False
+
+
+class ScopedListenerIndex:
+    """Index of message listeners by the conversation they apply to, and by required literals
+
+    Listeners are put in buckets by their :py:class:`ListenerScope` (stored under ``scope`` in the
+    listener, if any): listeners for any conversation, for DMs only, for channels only, and per
+    channel id. Each bucket is a :py:class:`ListenerIndex`. When looking up listeners for a
+    message, only the buckets that apply to the conversation of the message are searched, so
+    listeners scoped to other conversations are never considered.
+
+    Listeners can be scoped to channel names. Because channels can be renamed, those listeners are
+    only put in the bucket of a channel once the name of that channel is known, through
+    :py:meth:`update_channel` or the optional ``resolve_channel`` function. Only the names of
+    channels that listeners are scoped to are tracked.
+
+    Channels given with a ``#`` are always names. Channels given without one that look like an id
+    (e.g. ``C0123ABCD``, but also ``GENERAL``) are scoped both as id and as name, so the channels
+    that actually exist decide which one applies.
+
+    :param listeners: listeners to add, by key
+    :param resolve_channel: optional function that returns the id of the channel with a
+        (normalized) name, or ``None`` if no channel has that name, to find the channel of
+        listeners added after the channels are known
+    """
+
+    def __init__(self, listeners: Optional[Dict[str, Dict[str, Any]]] = None,
+                 resolve_channel: Optional[Callable[[str], Optional[str]]] = None):
+        self._buckets = {}
+        self._bucket_keys = {}
+        self._listeners = {}
+        self._positions = {}
+        self._counter = itertools.count()
+        self._resolve_channel = resolve_channel
+        # channel name -> {key: (listener, thread only)}
+        self._by_name = {}
+        # channel name -> channel id and channel id -> channel name, for the names in _by_name
+        self._channel_names = {}
+        self._channel_ids = {}
+        if listeners:
+            for key, listener in listeners.items():
+                self.add(key, listener)
+
+    def _add_to_bucket(self, bucket: Hashable, key: str, listener: Dict[str, Any]):
+        self._buckets.setdefault(bucket, ListenerIndex()).add(key, listener)
+        self._bucket_keys.setdefault(key, set()).add(bucket)
+
+    def _remove_from_bucket(self, bucket: Hashable, key: str):
+        index = self._buckets[bucket]
+        index.remove(key)
+        if not len(index):
+            del self._buckets[bucket]
+        self._bucket_keys[key].discard(bucket)
+
+    def _link(self, channel_id: str, name: str):
+        self._unlink(channel_id)
+        # Another channel could have had the name, if its rename was missed
+        other_id = self._channel_names.get(name)
+        if other_id is not None:
+            self._unlink(other_id)
+        self._channel_names[name] = channel_id
+        self._channel_ids[channel_id] = name
+        for key, (listener, thread_only) in self._by_name[name].items():
+            self._add_to_bucket(('channel', channel_id, thread_only), key, listener)
+
+    def _unlink(self, channel_id: str):
+        name = self._channel_ids.pop(channel_id, None)
+        if name is None:
+            return
+        del self._channel_names[name]
+        for key, (listener, thread_only) in self._by_name[name].items():
+            bucket = ('channel', channel_id, thread_only)
+            # Listeners can be scoped to both the id and the old name of the channel
+            if bucket in self._bucket_keys[key] and channel_id not in listener['scope'].channels:
+                self._remove_from_bucket(bucket, key)
+
+    def add(self, key: str, listener: Dict[str, Any]):
+        if key in self._listeners:
+            self.remove(key)
+        self._listeners[key] = listener
+        self._positions[id(listener)] = next(self._counter)
+        self._bucket_keys[key] = set()
+        scope = listener.get('scope') or ListenerScope()
+        if scope.channels:
+            for channel in scope.channels:
+                if not channel.startswith('#') and _CHANNEL_ID.match(channel):
+                    self._add_to_bucket(('channel', channel, scope.thread_only), key, listener)
+                self._add_by_name(normalize_channel_name(channel), key, listener,
+                                  scope.thread_only)
+        elif scope.dm_only:
+            self._add_to_bucket(('dm', scope.thread_only), key, listener)
+        elif scope.channels_only:
+            self._add_to_bucket(('channels', scope.thread_only), key, listener)
+        else:
+            self._add_to_bucket(('any', scope.thread_only), key, listener)
+
+    def _add_by_name(self, name: str, key: str, listener: Dict[str, Any], thread_only: bool):
+        self._by_name.setdefault(name, {})[key] = (listener, thread_only)
+        channel_id = self._channel_names.get(name)
+        if channel_id is not None:
+            self._add_to_bucket(('channel', channel_id, thread_only), key, listener)
+        elif self._resolve_channel is not None:
+            channel_id = self._resolve_channel(name)
+            if channel_id is not None:
+                self._link(channel_id, name)
+
+    def remove(self, key: str):
+        listener = self._listeners.pop(key)
+        del self._positions[id(listener)]
+        for bucket in list(self._bucket_keys[key]):
+            self._remove_from_bucket(bucket, key)
+        del self._bucket_keys[key]
+        for listeners in self._by_name.values():
+            listeners.pop(key, None)
+
+    def __len__(self):
+        return len(self._listeners)
+
+    def update_channel(self, channel_id: str, name: Optional[str]):
+        """Update the name of a channel, moving listeners scoped to channel names accordingly
+
+        :param channel_id: id of the channel
+        :param name: the (new) name of the channel, ``None`` if the channel was deleted
+        """
+        name = normalize_channel_name(name) if name else None
+        if name not in self._by_name:
+            # No listener is scoped to the channel by its (new) name
+            name = None
+        if self._channel_ids.get(channel_id) == name:
+            return
+        if name is None:
+            self._unlink(channel_id)
+        else:
+            self._link(channel_id, name)
+
+    def candidates(self, text: str, channel_id: str, in_thread: bool = False) \
+            -> List[Dict[str, Any]]:
+        """Find the listeners that apply to a conversation and whose regex could match the text
+
+        :param text: text of the message
+        :param channel_id: id of the conversation the message was sent in
+        :param in_thread: ``True`` if the message was sent in a thread
+        :return: list of candidate listeners, in the order they were added
+        """
+        is_dm = not (channel_id.startswith('C') or channel_id.startswith('G'))
+        scopes = (('any',), ('dm',) if is_dm else ('channels',), ('channel', channel_id))
+        thread_flags = (False, True) if in_thread else (False,)
+        indexes = []
+        for scope in scopes:
+            for thread_only in thread_flags:
+                index = self._buckets.get(scope + (thread_only,))
+                if index is not None:
+                    indexes.append(index)
+        if len(indexes) == 1:
+            return indexes[0].candidates(text)
+        found = [listener for index in indexes for listener in index.candidates(text)]
+        found.sort(key=lambda listener: self._positions[id(listener)])
+        return found
@@ -0,0 +1,191 @@
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List
+
+
+def _insert(numbers: array, number: int) -> bool:
+    i = bisect_left(numbers, number)
+    if i < len(numbers) and numbers[i] == number:
+        return False
+    numbers.insert(i, number)
+    return True
+
+
+def _delete(numbers: array, number: int) -> bool:
+    i = bisect_left(numbers, number)
+    if i < len(numbers) and numbers[i] == number:
+        del numbers[i]
+        return True
+    return False
+
+
+class MembershipIndex:
+    """Index of the members of channels, and of the channels users are a member of
+
+    To fit in memory for large workspaces, user and channel ids are interned as numbers, and the
+    members of every channel and the channels of every user are kept as sorted arrays of those
+    numbers (4 bytes per membership, in each direction).
+
+    This class is thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._numbers: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._members: Dict[int, array] = {}
+        self._channels: Dict[int, array] = {}
+
+    def _number(self, id_: str) -> int:
+        number = self._numbers.get(id_)
+        if number is None:
+            number = self._numbers[id_] = len(self._ids)
+            self._ids.append(sys.intern(id_))
+        return number
+
+    def _add(self, channel: int, user: int):
+        members = self._members.get(channel)
+        if members is None:
+            members = self._members[channel] = array('I')
+        if _insert(members, user):
+            channels = self._channels.get(user)
+            if channels is None:
+                channels = self._channels[user] = array('I')
+            _insert(channels, channel)
+
+    def _remove_channel(self, channel: int):
+        for user in self._members.pop(channel, ()):
+            channels = self._channels[user]
+            _delete(channels, channel)
+            if not channels:
+                del self._channels[user]
+
+    def _add_members(self, channel: int, user_ids: Iterable[str]):
+        # Inserting members one by one is quadratic, the array is rebuilt at once instead
+        users = {self._number(user_id) for user_id in user_ids}
+        members = self._members.get(channel)
+        if members is not None:
+            users.difference_update(members)
+        if not users:
+            return
+        self._members[channel] = array('I', sorted(users.union(members) if members else users))
+        for user in users:
+            channels = self._channels.get(user)
+            if channels is None:
+                channels = self._channels[user] = array('I')
+            _insert(channels, channel)
+
+    def add(self, channel_id: str, user_id: str):
+        """Add a member to a channel
+
+        :param channel_id: the id of the channel
+        :param user_id: the id of the user
+        """
+        with self._lock:
+            self._add(self._number(channel_id), self._number(user_id))
+
+    def add_members(self, channel_id: str, user_ids: Iterable[str]):
+        """Add members to a channel
+
+        :param channel_id: the id of the channel
+        :param user_ids: the ids of the users
+        """
+        with self._lock:
+            self._add_members(self._number(channel_id), user_ids)
+
+    def set_members(self, channel_id: str, user_ids: Iterable[str]):
+        """Replace the members of a channel
+
+        :param channel_id: the id of the channel
+        :param user_ids: the ids of the users
+        """
+        with self._lock:
+            channel = self._number(channel_id)
+            self._remove_channel(channel)
+            self._add_members(channel, user_ids)
+
+    def remove(self, channel_id: str, user_id: str):
+        """Remove a member from a channel
+
+        :param channel_id: the id of the channel
+        :param user_id: the id of the user
+        """
+        with self._lock:
+            channel = self._numbers.get(channel_id)
+            user = self._numbers.get(user_id)
+            if channel is None or user is None:
+                return
+            if _delete(self._members.get(channel, array('I')), user):
+                channels = self._channels[user]
+                _delete(channels, channel)
+                if not channels:
+                    del self._channels[user]
+
+    def remove_channel(self, channel_id: str):
+        """Remove all members of a channel
+
+        :param channel_id: the id of the channel
+        """
+        with self._lock:
+            channel = self._numbers.get(channel_id)
+            if channel is not None:
+                self._remove_channel(channel)
+
+    def has_channel(self, channel_id: str) -> bool:
+        """Check if the members of a channel are indexed
+
+        :param channel_id: the id of the channel
+        :return: ``True`` if the channel has members in the index
+        """
+        with self._lock:
+            return self._numbers.get(channel_id) in self._members
+
+    def members(self, channel_id: str) -> List[str]:
+        """Get the members of a channel
+
+        :param channel_id: the id of the channel
+        :return: the ids of the members of the channel
+        """
+        with self._lock:
+            ids = self._ids
+            return [ids[user] for user in self._members.get(self._numbers.get(channel_id), ())]
+
+    def channels(self, user_id: str) -> List[str]:
+        """Get the channels a user is a member of
+
+        :param user_id: the id of the user
+        :return: the ids of the channels
+        """
+        with self._lock:
+            ids = self._ids
+            return [ids[channel] for channel in self._channels.get(self._numbers.get(user_id), ())]
+
+    def is_member(self, channel_id: str, user_id: str) -> bool:
+        """Check if a user is a member of a channel
+
+        :param channel_id: the id of the channel
+        :param user_id: the id of the user
+        :return: ``True`` if the user is a member
+        """
+        with self._lock:
+            channel = self._numbers.get(channel_id)
+            user = self._numbers.get(user_id)
+            members = self._members.get(channel)
+            if members is None or user is None:
+                return False
+            i = bisect_left(members, user)
+            return i < len(members) and members[i] == user
+
+    def stats(self) -> Dict[str, int]:
+        """Statistics about the index
+
+        :return: dictionary with the number of channels, users and memberships in the index
+        """
+        with self._lock:
+            return {
+                'channels': len(self._members),
+                'users': len(self._channels),
+                'memberships': sum(len(members) for members in self._members.values()),
+            }
@@ -0,0 +1,233 @@
+import threading
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+                   30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = ['{}="{}"'.format(name, _escape(value)) for name, value in zip(names, values)]
+    return '{{{}}}'.format(','.join(pairs)) if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Counter that only goes up, with a value per combination of label values
+
+    :param name: name of the metric
+    :param documentation: help text of the metric
+    :param labelnames: names of the labels of the metric
+    """
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    @property
+    def family(self) -> str:
+        # Counter samples have a _total suffix, the HELP and TYPE lines have to use the same name
+        return '{}_total'.format(self.name)
+
+    def value(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return ['{}{} {}'.format(self.family, _format_labels(self.labelnames, labelvalues),
+                                 _format_value(value))
+                for labelvalues, value in values]
+
+
+class Histogram:
+    """Histogram of observed values, with a distribution per combination of label values
+
+    :param name: name of the metric
+    :param documentation: help text of the metric
+    :param labelnames: names of the labels of the metric
+    :param buckets: upper bounds of the buckets, in increasing order
+    """
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # label values -> [count per bucket (the last one is +Inf), sum]
+        self._values = {}
+
+    @property
+    def family(self) -> str:
+        return self.name
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            entry = self._values.get(labelvalues)
+            if entry is None:
+                entry = self._values[labelvalues] = [[0] * (len(self._buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, *labelvalues: str) -> int:
+        entry = self._values.get(labelvalues)
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = [(labelvalues, list(counts), total)
+                      for labelvalues, (counts, total) in self._values.items()]
+        bounds = self._buckets + (float('inf'),)
+        lines = []
+        for labelvalues, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ('le',),
+                                        labelvalues + (_format_value(bound),))
+                lines.append('{}_bucket{} {}'.format(self.name, labels, cumulative))
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append('{}_sum{} {}'.format(self.name, labels, _format_value(total)))
+            lines.append('{}_count{} {}'.format(self.name, labels, cumulative))
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics, that can be rendered in the Prometheus text format
+
+    Besides counters and histograms, the registry can expose statistics of components that keep
+    track of their own numbers: every number in the dictionary returned by a stats function is
+    exposed as a gauge.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._stats = []
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_stats(self, prefix: str, documentation: str, stats: Callable[[], Dict[str, Any]]):
+        """Expose the numbers returned by a stats function as gauges
+
+        :param prefix: prefix of the names of the gauges, the keys of the stats are appended to it
+        :param documentation: help text of the gauges
+        :param stats: function returning a dictionary of statistics
+        """
+        self._stats.append((prefix, documentation, stats))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format
+
+        :return: the metrics
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.append('# HELP {} {}'.format(metric.family, metric.documentation))
+            lines.append('# TYPE {} {}'.format(metric.family, metric.type))
+            lines.extend(metric.samples())
+        for prefix, documentation, stats in self._stats:
+            for key, value in stats().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = '{}_{}'.format(prefix, key)
+                lines.append('# HELP {} {} ({})'.format(name, documentation,
+                                                        key.replace('_', ' ')))
+                lines.append('# TYPE {} gauge'.format(name))
+                lines.append('{} {}'.format(name, _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+class MachineMetrics(MetricsRegistry):
+    """The metrics of Slack Machine"""
+
+    def __init__(self):
+        super().__init__()
+        self.events_received = self.counter(
+            'machine_events_received', "Events received from Slack", ('event_type',))
+        self.handler_duration = self.histogram(
+            'machine_handler_duration_seconds', "Time spent in plugin functions",
+            ('plugin', 'handler', 'event_type'))
+        self.handler_errors = self.counter(
+            'machine_handler_errors', "Plugin functions that raised an exception",
+            ('plugin', 'handler', 'event_type'))
+        self.slack_api_duration = self.histogram(
+            'machine_slack_api_duration_seconds', "Duration of Slack Web API calls", ('method',))
+        self.slack_api_errors = self.counter(
+            'machine_slack_api_errors', "Slack Web API calls that failed", ('method', 'error'))
+        self.slack_api_queue_wait = self.histogram(
+            'machine_slack_api_queue_wait_seconds',
+            "Time Slack Web API calls waited to stay within rate limits", ('method',))
+        self.slack_api_rate_limited = self.counter(
+            'machine_slack_api_rate_limited', "Slack Web API calls rate limited by Slack",
+            ('method',))
+        self.http_duration = self.histogram(
+            'machine_http_request_duration_seconds',
+            "Duration of HTTP requests made through the shared session", ('host',))
+        self.http_errors = self.counter(
+            'machine_http_request_errors', "HTTP requests made through the shared session that "
+            "failed", ('host', 'error'))
+        self.storage_duration = self.histogram(
+            'machine_storage_duration_seconds', "Duration of plugin storage operations",
+            ('plugin', 'operation'))
+        self.storage_errors = self.counter(
+            'machine_storage_errors', "Plugin storage operations that failed",
+            ('plugin', 'operation'))
+
+
+_metrics = None
+
+
+def enable_metrics() -> MachineMetrics:
+    """Start collecting metrics
+
+    Metrics are only collected by components that are created after metrics are enabled.
+
+    :return: the metrics
+    """
+    global _metrics
+    if _metrics is None:
+        _metrics = MachineMetrics()
+    return _metrics
+
+
+def disable_metrics():
+    global _metrics
+    _metrics = None
+
+
+def get_metrics() -> Optional[MachineMetrics]:
+    """Get the metrics, if they are enabled
+
+    :return: the metrics, or ``None`` if metrics are not enabled
+    """
+    return _metrics
@@ -0,0 +1,146 @@
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType
+from typing import Any, Dict, Optional, Tuple
+
+
+def handler_labels(plugin_actions: Dict[str, Any]) -> Dict[CodeType, str]:
+    """Map the code of the plugin functions to the names of those functions
+
+    :param plugin_actions: the registered plugin actions, as kept by
+        :py:class:`~machine.core.Machine`
+    :return: dictionary of code object to ``plugin_class.function_name``
+    """
+    listeners = list(plugin_actions.get('listen_to', {}).values())
+    listeners.extend(plugin_actions.get('respond_to', {}).values())
+    for handlers in plugin_actions.get('process', {}).values():
+        listeners.extend(handlers.values())
+    labels = {}
+    for listener in listeners:
+        fn = listener['function']
+        code = getattr(getattr(fn, '__func__', fn), '__code__', None)
+        if code is not None:
+            labels[code] = "{}.{}".format(listener['class_name'], fn.__name__)
+    return labels
+
+
+class Profile:
+    """Result of a sampling profile
+
+    Every sample is the stack of one thread at one point in time. Samples are attributed to the
+    (outermost) plugin function on the stack, if there is one.
+    """
+
+    def __init__(self, duration: float, interval: float):
+        self.duration = duration
+        self.interval = interval
+        # (thread name, plugin function or None, stack of frames) -> number of samples
+        self.stacks = Counter()
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def handlers(self) -> Counter:
+        """Number of samples per plugin function"""
+        counts = Counter()
+        for (_, handler, _), count in self.stacks.items():
+            if handler is not None:
+                counts[handler] += count
+        return counts
+
+    def collapsed(self) -> str:
+        """Render the samples as collapsed stacks, the input format of most flame graph tools
+
+        The root of every stack is the plugin function the samples are attributed to, or the
+        name of the thread if they are not attributed to a plugin function.
+
+        :return: one line per unique stack, with the frames separated by ``;`` and followed by the
+            number of samples
+        """
+        counts = Counter()
+        for (thread_name, handler, stack), count in self.stacks.items():
+            root = "[{}]".format(handler) if handler is not None else thread_name
+            counts[';'.join((root,) + stack)] += count
+        return ''.join("{} {}\n".format(stack, count) for stack, count in sorted(counts.items()))
+
+    def stats(self, limit: int = 50) -> str:
+        """Render the samples as a table of functions, similar to the output of :mod:`pstats`
+
+        :param limit: maximum number of functions to list
+        :return: the samples per plugin function, followed by the number of samples in which
+            each function was running (self) and on the stack (cumulative), sorted by the latter
+        """
+        total = self.samples or 1
+        own = Counter()
+        cumulative = Counter()
+        for (_, _, stack), count in self.stacks.items():
+            if stack:
+                own[stack[-1]] += count
+            for frame in set(stack):
+                cumulative[frame] += count
+        header = "{} samples in {:.1f}s (interval: {}s)".format(self.samples, self.duration,
+                                                                self.interval)
+        lines = [header, ""]
+        handlers = self.handlers()
+        if handlers:
+            lines.append("Samples per plugin function:")
+            for handler, count in handlers.most_common():
+                lines.append("{:>8} {:>6.1%}  {}".format(count, count / total, handler))
+            lines.append("")
+        lines.append("{:>8} {:>6} {:>8} {:>6}  {}".format('self', 'self%', 'cum', 'cum%',
+                                                          'function'))
+        for frame, count in cumulative.most_common(limit):
+            lines.append("{:>8} {:>6.1%} {:>8} {:>6.1%}  {}".format(
+                own[frame], own[frame] / total, count, count / total, frame))
+        return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler:
+    """Profiler that periodically samples the stacks of all threads
+
+    Unlike :mod:`cProfile`, it profiles all threads of a running process, and its overhead does
+    not depend on the number of function calls. Threads are sampled whether they are running or
+    waiting, so idle threads show up in the functions they are waiting in.
+
+    :param interval: number of seconds between samples
+    :param labels: names of functions to attribute samples to, by code object. See
+        :py:func:`handler_labels`
+    """
+
+    def __init__(self, interval: float = 0.005, labels: Optional[Dict[CodeType, str]] = None):
+        self._interval = interval
+        self._labels = labels or {}
+
+    def _sample(self, frame) -> Tuple[Optional[str], Tuple[str, ...]]:
+        stack = []
+        label = None
+        while frame is not None:
+            code = frame.f_code
+            stack.append("{}:{}".format(frame.f_globals.get('__name__', '?'), code.co_name))
+            # Walking from the innermost frame outwards, so the outermost plugin function wins
+            label = self._labels.get(code, label)
+            frame = frame.f_back
+        stack.reverse()
+        return label, tuple(stack)
+
+    def profile(self, duration: float) -> Profile:
+        """Sample all threads (except the calling thread) for some time
+
+        :param duration: number of seconds to sample
+        :return: the samples
+        """
+        profile = Profile(duration, self._interval)
+        own_ident = threading.get_ident()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                label, stack = self._sample(frame)
+                profile.stacks[(names.get(ident, str(ident)), label, stack)] += 1
+            time.sleep(self._interval)
+        return profile
@@ -0,0 +1,141 @@
+import random
+import threading
+from collections import deque
+from typing import Any, Dict
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+SHED_DROP_OLDEST = 'drop_oldest'
+SHED_DROP_NEWEST = 'drop_newest'
+SHED_SAMPLE = 'sample'
+SHED_POLICIES = (SHED_DROP_OLDEST, SHED_DROP_NEWEST, SHED_SAMPLE)
+
+
+class PriorityEventQueue:
+    """Bounded queue that hands out items by priority, and sheds low priority items under load
+
+    Items are handed out in order of priority, and in the order they were put in the queue within
+    the same priority. The queue never holds more than ``max_size`` items. When it is full, the
+    shedding policy decides what happens to low priority items:
+
+    - ``drop_oldest``: the oldest low priority item in the queue is dropped to make room
+    - ``drop_newest``: the incoming low priority item is dropped
+    - ``sample``: once the queue is half full, only a fraction (``sample_rate``) of incoming low
+      priority items is accepted. When the queue is full, the oldest low priority item is dropped
+
+    To make room for higher priority items when the queue is full, the oldest low priority item is
+    dropped, or the oldest :data:`PRIORITY_NORMAL` item if there are no low priority items. When
+    the queue is full of :data:`PRIORITY_HIGH` items, incoming items are shed.
+
+    :param max_size: maximum number of items in the queue
+    :param policy: shedding policy, one of ``drop_oldest``, ``drop_newest`` or ``sample``
+    :param sample_rate: fraction of low priority items to accept under load, when using the
+        ``sample`` policy
+    """
+
+    def __init__(self, max_size: int, policy: str = SHED_DROP_OLDEST, sample_rate: float = 0.1):
+        if policy not in SHED_POLICIES:
+            raise ValueError("Unknown shedding policy: {}".format(policy))
+        self._max_size = max_size
+        self._policy = policy
+        self._sample_rate = sample_rate
+        self._queues = (deque(), deque(), deque())
+        self._size = 0
+        self._not_empty = threading.Condition()
+        self._random = random.Random()
+        self._enqueued = [0, 0, 0]
+        self._dequeued = 0
+        self._max_backlog = 0
+        self._shed_oldest = 0
+        self._shed_newest = 0
+        self._shed_sampled = 0
+        self._shed_normal = 0
+        self._shed_high = 0
+
+    def _drop_oldest_low(self) -> bool:
+        if self._queues[PRIORITY_LOW]:
+            self._queues[PRIORITY_LOW].popleft()
+            self._size -= 1
+            self._shed_oldest += 1
+            return True
+        return False
+
+    def put(self, item: Any, priority: int = PRIORITY_NORMAL) -> bool:
+        """Put an item in the queue
+
+        :param item: the item
+        :param priority: one of :data:`PRIORITY_HIGH`, :data:`PRIORITY_NORMAL` or
+            :data:`PRIORITY_LOW`
+        :return: ``True`` if the item was accepted, ``False`` if it was shed
+        """
+        with self._not_empty:
+            if priority == PRIORITY_LOW:
+                if self._policy == SHED_SAMPLE and self._size >= self._max_size / 2 \
+                        and self._random.random() >= self._sample_rate:
+                    self._shed_sampled += 1
+                    return False
+                if self._size >= self._max_size:
+                    if self._policy == SHED_DROP_NEWEST or not self._drop_oldest_low():
+                        self._shed_newest += 1
+                        return False
+            elif self._size >= self._max_size and not self._drop_oldest_low():
+                if self._queues[PRIORITY_NORMAL]:
+                    self._queues[PRIORITY_NORMAL].popleft()
+                    self._size -= 1
+                    self._shed_normal += 1
+                elif priority == PRIORITY_NORMAL:
+                    self._shed_normal += 1
+                    return False
+                else:
+                    self._shed_high += 1
+                    return False
+            self._queues[priority].append(item)
+            self._size += 1
+            self._enqueued[priority] += 1
+            self._max_backlog = max(self._max_backlog, self._size)
+            self._not_empty.notify()
+            return True
+
+    def get(self, timeout: float = None) -> Any:
+        """Remove and return the item with the highest priority
+
+        :param timeout: maximum number of seconds to wait for an item, wait forever if ``None``
+        :return: the item, or ``None`` if no item became available before the timeout
+        """
+        with self._not_empty:
+            if not self._size and not self._not_empty.wait_for(lambda: self._size, timeout):
+                return None
+            for queue in self._queues:
+                if queue:
+                    self._size -= 1
+                    self._dequeued += 1
+                    return queue.popleft()
+
+    def __len__(self):
+        return self._size
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistics about the queue
+
+        :return: dictionary with the current and maximum backlog, the number of items enqueued per
+            priority, the number of items handed out, the number of low priority items shed per
+            reason, and the number of normal and high priority items shed
+        """
+        with self._not_empty:
+            return {
+                'max_size': self._max_size,
+                'policy': self._policy,
+                'backlog': self._size,
+                'max_backlog': self._max_backlog,
+                'enqueued_high': self._enqueued[PRIORITY_HIGH],
+                'enqueued_normal': self._enqueued[PRIORITY_NORMAL],
+                'enqueued_low': self._enqueued[PRIORITY_LOW],
+                'dequeued': self._dequeued,
+                'shed_oldest': self._shed_oldest,
+                'shed_newest': self._shed_newest,
+                'shed_sampled': self._shed_sampled,
+                'shed_normal': self._shed_normal,
+                'shed_high': self._shed_high,
+            }
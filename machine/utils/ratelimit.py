@@ -0,0 +1,224 @@
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from machine.utils.metrics import MachineMetrics
+
+# Rate limit tiers of the Slack Web API, in calls per minute.
+# See https://api.slack.com/docs/rate-limits
+TIER_1 = 1
+TIER_2 = 20
+TIER_3 = 50
+TIER_4 = 100
+
+# Calls per minute per workspace, by Web API method. Methods that are not listed are not paced,
+# but calls to them are still retried when Slack says they were rate limited
+DEFAULT_METHOD_RATE_LIMITS = {
+    'users.list': TIER_2,
+    'conversations.list': TIER_2,
+    'conversations.info': TIER_3,
+    'conversations.open': TIER_3,
+    'im.open': TIER_3,
+    'reactions.add': TIER_3,
+    'chat.update': TIER_3,
+    'chat.delete': TIER_3,
+    'users.info': TIER_4,
+    'conversations.members': TIER_4,
+    'users.conversations': TIER_3,
+    'chat.postEphemeral': TIER_4,
+}
+# Calls per minute per channel, by Web API method. Slack allows about one message per second per
+# channel, with short bursts
+DEFAULT_CHANNEL_RATE_LIMITS = {
+    'chat.postMessage': 60,
+}
+DEFAULT_CHANNEL_BURST = 3
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations, instead of rejecting calls when it is empty
+
+    Tokens can go negative: every reservation takes a token, and has to wait until the bucket
+    would have refilled to the point it was taken at. This paces callers in the order in which
+    they made their reservations.
+
+    :param rate: number of tokens added per second
+    :param capacity: maximum number of tokens in the bucket, ie. the size of a burst
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def reserve(self, now: float) -> float:
+        """Take a token
+
+        :param now: the current time, according to :py:func:`time.monotonic`
+        :return: number of seconds to wait before the token may be used
+        """
+        if now > self._updated:
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+        self._tokens -= 1
+        return -self._tokens / self._rate if self._tokens < 0 else 0.0
+
+
+class RateLimiter:
+    """Paces calls to the Slack Web API to stay within Slack's rate limits
+
+    Calls are paced per method for the whole workspace, and for some methods (like
+    ``chat.postMessage``) also per channel. When Slack rate limits a call anyway, all calls to
+    that method wait for the number of seconds Slack asked for (the ``Retry-After`` header).
+
+    :param method_limits: calls per minute by method, for the whole workspace. Defaults to
+        :data:`DEFAULT_METHOD_RATE_LIMITS`
+    :param channel_limits: calls per minute by method, per channel. Defaults to
+        :data:`DEFAULT_CHANNEL_RATE_LIMITS`
+    :param channel_burst: number of calls per channel that can be made at once
+    :param metrics: metrics to record the time calls have to wait in
+    """
+
+    def __init__(self, method_limits: Optional[Dict[str, float]] = None,
+                 channel_limits: Optional[Dict[str, float]] = None,
+                 channel_burst: int = DEFAULT_CHANNEL_BURST,
+                 metrics: Optional[MachineMetrics] = None):
+        self._method_limits = dict(DEFAULT_METHOD_RATE_LIMITS if method_limits is None
+                                   else method_limits)
+        self._channel_limits = dict(DEFAULT_CHANNEL_RATE_LIMITS if channel_limits is None
+                                    else channel_limits)
+        self._channel_burst = channel_burst
+        self._metrics = metrics
+        self._lock = threading.Lock()
+        self._method_buckets = {}
+        self._channel_buckets = {}
+        self._retry_at = {}
+        self._waiting = 0
+        self._max_waiting = 0
+        self._waited = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._rate_limited = 0
+        self._not_waited = 0
+
+    def _bucket(self, buckets: Dict, key: Any, per_minute: float, capacity: float) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(per_minute / 60, max(1, capacity))
+        return bucket
+
+    def _reserve(self, method: str, channel: Optional[str]) -> float:
+        now = time.monotonic()
+        delay = max(0.0, self._retry_at.get(method, now) - now)
+        per_minute = self._method_limits.get(method)
+        if per_minute:
+            bucket = self._bucket(self._method_buckets, method, per_minute, per_minute)
+            delay = max(delay, bucket.reserve(now))
+        per_minute = self._channel_limits.get(method)
+        if per_minute and channel:
+            bucket = self._bucket(self._channel_buckets, (method, channel), per_minute,
+                                  self._channel_burst)
+            delay = max(delay, bucket.reserve(now))
+        return delay
+
+    def reserve(self, method: str, channel: Optional[str] = None) -> float:
+        """Reserve a call
+
+        :param method: the Web API method
+        :param channel: the id of the channel the call is about, if any
+        :return: number of seconds to wait before making the call
+        """
+        with self._lock:
+            delay = self._reserve(method, channel)
+            if delay > 0:
+                self._waiting += 1
+                self._max_waiting = max(self._max_waiting, self._waiting)
+            return delay
+
+    def take(self, method: str, channel: Optional[str] = None) -> float:
+        """Reserve a call that is made right away, because it can't wait
+
+        The call still counts towards the rate limits, so the calls that do wait leave room for it.
+
+        :param method: the Web API method
+        :param channel: the id of the channel the call is about, if any
+        :return: number of seconds the call should have waited
+        """
+        with self._lock:
+            delay = self._reserve(method, channel)
+            if delay > 0:
+                self._not_waited += 1
+            return delay
+
+    def _waited_for(self, method: str, delay: float):
+        with self._lock:
+            self._waiting -= 1
+            self._waited += 1
+            self._wait_time += delay
+            self._max_wait = max(self._max_wait, delay)
+        if self._metrics is not None:
+            self._metrics.slack_api_queue_wait.observe(delay, method)
+
+    def wait(self, method: str, channel: Optional[str] = None) -> float:
+        """Block until a call may be made
+
+        :param method: the Web API method
+        :param channel: the id of the channel the call is about, if any
+        :return: number of seconds waited
+        """
+        delay = self.reserve(method, channel)
+        if delay > 0:
+            try:
+                time.sleep(delay)
+            finally:
+                self._waited_for(method, delay)
+        return delay
+
+    async def wait_async(self, method: str, channel: Optional[str] = None) -> float:
+        """Wait until a call may be made, without blocking the event loop
+
+        :param method: the Web API method
+        :param channel: the id of the channel the call is about, if any
+        :return: number of seconds waited
+        """
+        delay = self.reserve(method, channel)
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self._waited_for(method, delay)
+        return delay
+
+    def retry_after(self, method: str, seconds: float):
+        """Hold all calls to a method, because Slack rate limited a call to it
+
+        :param method: the Web API method
+        :param seconds: number of seconds Slack asked to wait
+        """
+        with self._lock:
+            retry_at = time.monotonic() + seconds
+            self._retry_at[method] = max(self._retry_at.get(method, retry_at), retry_at)
+            self._rate_limited += 1
+        if self._metrics is not None:
+            self._metrics.slack_api_rate_limited.inc(method)
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistics about the calls that had to wait
+
+        :return: dictionary with the current and maximum number of waiting calls, the number of
+            calls that had to wait, the total and maximum time (in seconds) they waited, the
+            number of calls that should have waited but couldn't, and the number of calls Slack
+            rate limited
+        """
+        with self._lock:
+            return {
+                'waiting': self._waiting,
+                'max_waiting': self._max_waiting,
+                'waited': self._waited,
+                'wait_seconds': round(self._wait_time, 6),
+                'max_wait_seconds': round(self._max_wait, 6),
+                'not_waited': self._not_waited,
+                'rate_limited': self._rate_limited,
+            }
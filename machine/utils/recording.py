@@ -0,0 +1,140 @@
+import gzip
+import hashlib
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# Fields of users (and their profiles) that can contain personal information
+_USER_FIELDS = ('name', 'real_name')
+_PROFILE_FIELDS = ('real_name', 'real_name_normalized', 'display_name', 'display_name_normalized',
+                   'first_name', 'last_name', 'email', 'phone', 'skype', 'title', 'status_text')
+# Fields of messages that contain content sent by users
+_CONTENT_FIELDS = ('attachments', 'blocks', 'files')
+_KEEP_TOKEN = re.compile(r'^<[@#!][^>]*>$')
+
+
+def _pseudonym(value: str) -> str:
+    return hashlib.sha1(value.encode()).hexdigest()[:10]
+
+
+def _scrub_word(word: str) -> str:
+    # Mentions of users and channels are kept, so messages mentioning the bot still do so
+    if _KEEP_TOKEN.match(word):
+        return word
+    return 'x' * len(word)
+
+
+def scrub_text(text: str) -> str:
+    """Replace the words of a text with placeholders of the same length, except mentions"""
+    return ' '.join(_scrub_word(word) for word in text.split(' '))
+
+
+def _scrub_user(user: Dict[str, Any]):
+    for field in _USER_FIELDS:
+        if user.get(field):
+            user[field] = _pseudonym(user[field])
+    profile = user.get('profile')
+    if isinstance(profile, dict):
+        for field in _PROFILE_FIELDS:
+            if profile.get(field):
+                profile[field] = _pseudonym(profile[field])
+        for field in list(profile):
+            if field.startswith('image_'):
+                del profile[field]
+
+
+def _scrub_message(message: Dict[str, Any]):
+    if isinstance(message.get('text'), str):
+        message['text'] = scrub_text(message['text'])
+    for field in _CONTENT_FIELDS:
+        message.pop(field, None)
+    for field in ('message', 'previous_message'):
+        if isinstance(message.get(field), dict):
+            _scrub_message(message[field])
+
+
+def scrub_event(event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Remove personal information and message content from an RTM event
+
+    Message texts are replaced by placeholders of the same length (keeping mentions), message
+    attachments, blocks and files are removed, and names and other personal information of users
+    are replaced by pseudonyms. Ids of users, channels and messages are kept, so the structure of
+    the event stream is preserved.
+
+    :param event_type: type of the event
+    :param data: the event
+    :return: a scrubbed copy of the event
+    """
+    data = json.loads(json.dumps(data))
+    if event_type == 'message':
+        _scrub_message(data)
+    if isinstance(data.get('user'), dict):
+        _scrub_user(data['user'])
+    if isinstance(data.get('self'), dict):
+        _scrub_user(data['self'])
+    return data
+
+
+def _open(path: str, mode: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    # Line buffered, so a recording is complete up to the last event when the bot is killed
+    return open(path, mode, encoding='utf-8', buffering=1)
+
+
+class EventRecorder:
+    """Appends RTM events to a file, one compact JSON array per line
+
+    Every line contains the time the event was received (seconds since the epoch), the type of the
+    event and the event itself: ``[1600000000.123,"message",{...}]``. Recordings are only ever
+    appended to, so recordings of multiple sessions can end up in the same file. If the path ends
+    with ``.gz``, the file is compressed.
+
+    :param path: path of the recording
+    :param scrub: ``True`` to remove personal information and message content from the events,
+        see :py:func:`scrub_event`
+    """
+
+    def __init__(self, path: str, scrub: bool = False):
+        self._file = _open(path, 'a')
+        self._scrub = scrub
+        self._lock = threading.Lock()
+        self._recorded = 0
+
+    def record(self, event_type: str, data: Optional[Dict[str, Any]]):
+        if not isinstance(data, dict):
+            # Events like "close" and "error" don't have a payload that can be replayed
+            return
+        if self._scrub:
+            data = scrub_event(event_type, data)
+        line = json.dumps([round(time.time(), 3), event_type, data], separators=(',', ':'))
+        with self._lock:
+            self._file.write(line + '\n')
+            self._recorded += 1
+
+    @property
+    def recorded(self) -> int:
+        return self._recorded
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_recording(path: str) -> Iterator[Tuple[float, str, Dict[str, Any]]]:
+    """Read the events of a recording made by :py:class:`EventRecorder`
+
+    :param path: path of the recording
+    :return: iterator of (time received, event type, event) tuples
+    """
+    with _open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                received_at, event_type, data = json.loads(line)
+                yield received_at, event_type, data
@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from slack.rtm.client import RTMClient
+from slack.web.client import WebClient
+from slack.web.slack_response import SlackResponse
+
+logger = logging.getLogger(__name__)
+
+STUB_TEAM_ID = 'T00000000'
+STUB_BOT_ID = 'U00000000'
+STUB_BOT_NAME = 'replaybot'
+
+
+def stub_user(user_id: str) -> Dict[str, Any]:
+    """Generate a minimal user, as returned by the Slack API, for a user id"""
+    name = 'user-{}'.format(user_id.lower())
+    return {
+        'id': user_id,
+        'team_id': STUB_TEAM_ID,
+        'name': name,
+        'deleted': False,
+        'real_name': name,
+        'profile': {
+            'avatar_hash': '',
+            'status_text': '',
+            'status_emoji': '',
+            'status_expiration': 0,
+            'real_name': name,
+            'display_name': name,
+            'real_name_normalized': name,
+            'display_name_normalized': name,
+            'image_24': None,
+            'image_32': None,
+            'image_48': None,
+            'image_72': None,
+            'image_192': None,
+            'image_512': None,
+            'team': STUB_TEAM_ID,
+        },
+        'is_bot': False,
+        'is_app_user': False,
+        'updated': 0,
+    }
+
+
+def stub_channel(channel_id: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Generate a minimal conversation, as returned by the Slack API, for a channel id
+
+    Ids starting with ``C`` become public channels, ``G`` private channels and others DMs.
+    """
+    is_im = channel_id[:1] not in ('C', 'G')
+    name = None if is_im else 'channel-{}'.format(channel_id.lower())
+    return {
+        'id': channel_id,
+        'name': name,
+        'is_channel': channel_id.startswith('C'),
+        'created': 0,
+        'creator': None,
+        'is_archived': False,
+        'is_general': False,
+        'name_normalized': name,
+        'is_shared': False,
+        'is_org_shared': False,
+        'is_member': True,
+        'is_private': channel_id.startswith('G'),
+        'is_mpim': False,
+        'is_group': channel_id.startswith('G'),
+        'is_im': is_im,
+        'user': user_id if is_im else None,
+        'members': None,
+        'topic': None,
+        'purpose': None,
+        'previous_names': [],
+    }
+
+
+def _conversation_type(channel: Dict[str, Any]) -> str:
+    if channel['is_im']:
+        return 'im'
+    if channel['is_mpim']:
+        return 'mpim'
+    if channel['is_private'] or channel['is_group']:
+        return 'private_channel'
+    return 'public_channel'
+
+
+class StubWebClient(WebClient):
+    """Web API client that answers API calls from a synthetic workspace, without calling Slack
+
+    Users and conversations that are requested but not known are generated on the fly. Every API
+    call takes ``latency`` seconds, to simulate the round trip to Slack.
+
+    :param users: users of the workspace, as returned by the Slack API
+    :param channels: conversations of the workspace, as returned by the Slack API
+    :param latency: number of seconds every API call takes
+    """
+
+    def __init__(self, users: Iterable[Dict[str, Any]] = (),
+                 channels: Iterable[Dict[str, Any]] = (), latency: float = 0.0, **kwargs):
+        kwargs.setdefault('token', 'xoxb-stub')
+        super().__init__(**kwargs)
+        self.users = {u['id']: u for u in users}
+        self.channels = {c['id']: c for c in channels}
+        self.latency = latency
+        self.calls = Counter()
+        self._ts = 0
+
+    def _next_ts(self) -> str:
+        self._ts += 1
+        return '{}.{:06d}'.format(int(time.time()), self._ts)
+
+    def _im_for(self, user_id: str) -> Dict[str, Any]:
+        for channel in self.channels.values():
+            if channel['is_im'] and channel['user'] == user_id:
+                return channel
+        channel = stub_channel('D{}'.format(user_id), user_id)
+        self.channels[channel['id']] = channel
+        return channel
+
+    def _respond(self, api_method: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        if api_method == 'users.list':
+            return {'ok': True, 'members': list(self.users.values()),
+                    'response_metadata': {'next_cursor': ''}}
+        if api_method == 'conversations.list':
+            types = str(args.get('types') or 'public_channel').split(',')
+            return {'ok': True, 'channels': [c for c in self.channels.values()
+                                             if _conversation_type(c) in types],
+                    'response_metadata': {'next_cursor': ''}}
+        if api_method == 'users.info':
+            return {'ok': True, 'user': self.users.setdefault(args['user'],
+                                                              stub_user(args['user']))}
+        if api_method == 'conversations.info':
+            return {'ok': True, 'channel': self.channels.setdefault(args['channel'],
+                                                                    stub_channel(args['channel']))}
+        if api_method in ('im.open', 'conversations.open'):
+            user_id = args.get('user') or str(args.get('users', '')).split(',')[0]
+            return {'ok': True, 'channel': self._im_for(user_id)}
+        if api_method in ('chat.postMessage', 'chat.postEphemeral', 'chat.update'):
+            return {'ok': True, 'channel': args.get('channel'), 'ts': self._next_ts(),
+                    'message': {'text': args.get('text')}}
+        return {'ok': True}
+
+    def _response(self, api_method: str, http_verb: str, args: Dict[str, Any]) -> SlackResponse:
+        return SlackResponse(client=self, http_verb=http_verb,
+                             api_url=self.base_url + api_method, req_args=args,
+                             data=self._respond(api_method, args), headers={},
+                             status_code=200).validate()
+
+    async def _call_async(self, api_method: str, http_verb: str, args: Dict[str, Any]):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._response(api_method, http_verb, args)
+
+    def api_call(self, api_method: str, *, http_verb: str = 'POST', files: dict = None,
+                 data: dict = None, params: dict = None, json: dict = None, **kwargs):
+        self.calls[api_method] += 1
+        args = {}
+        for part in (params, data, json):
+            if isinstance(part, dict):
+                args.update(part)
+        if self.run_async:
+            return asyncio.ensure_future(self._call_async(api_method, http_verb, args),
+                                         loop=self._event_loop)
+        if self.latency:
+            time.sleep(self.latency)
+        return self._response(api_method, http_verb, args)
+
+
+def stub_workspace(events: Iterable[Tuple[float, str, Dict[str, Any]]]) \
+        -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Generate the users and conversations that are referred to by recorded events
+
+    :param events: recorded events, see :py:func:`~machine.utils.recording.read_recording`
+    :return: tuple of the users and the conversations
+    """
+    user_ids = set()
+    channel_ids = {}
+    for _, _, data in events:
+        user = data.get('user')
+        if isinstance(user, str):
+            user_ids.add(user)
+        channel = data.get('channel')
+        if isinstance(channel, str):
+            channel_ids.setdefault(channel, user if isinstance(user, str) else None)
+    users = [stub_user(user_id) for user_id in sorted(user_ids)]
+    channels = [stub_channel(channel_id, user_id)
+                for channel_id, user_id in sorted(channel_ids.items())]
+    return users, channels
+
+
+def _summarize(latencies: List[float]) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    n = len(latencies)
+    return {
+        'events': n,
+        'mean_ms': round(sum(latencies) / n * 1e3, 3),
+        'p50_ms': round(latencies[n // 2] * 1e3, 3),
+        'p99_ms': round(latencies[min(n - 1, int(n * 0.99))] * 1e3, 3),
+        'max_ms': round(latencies[-1] * 1e3, 3),
+    }
+
+
+class EventReplayer:
+    """Feeds recorded events to the callbacks of an RTM client, as if they came from Slack
+
+    Events are replayed with the same time between them as when they were recorded, divided by
+    ``speed``. With a speed of ``0``, events are replayed as fast as they can be handled. Events
+    are handled one at a time, on the event loop of the RTM client, like the RTM client does.
+
+    :param rtm_client: the RTM client whose callbacks handle the events
+    :param speed: replay speed, relative to the speed at which the events were recorded
+    """
+
+    def __init__(self, rtm_client: RTMClient, speed: float = 1.0):
+        self._rtm_client = rtm_client
+        self._speed = speed
+        self._latencies = defaultdict(list)
+        self._errors = Counter()
+        self._lag = []
+
+    async def replay(self, events: Iterable[Tuple[float, str, Dict[str, Any]]]) -> Dict[str, Any]:
+        """Replay events
+
+        :param events: recorded events, see :py:func:`~machine.utils.recording.read_recording`
+        :return: the number of events handled per second, and the latency per event type
+        """
+        loop = asyncio.get_event_loop()
+        first_recorded = None
+        started = loop.time()
+        for received_at, event_type, data in events:
+            if first_recorded is None:
+                first_recorded = received_at
+            if self._speed:
+                due = started + (received_at - first_recorded) / self._speed
+                delay = due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    # The events are replayed slower than they were recorded
+                    self._lag.append(-delay)
+            t0 = time.perf_counter()
+            try:
+                await self._rtm_client._dispatch_event(event_type, data=data)
+            except Exception as e:
+                logger.debug("Error while handling replayed %s event: %s", event_type, e)
+                self._errors[event_type] += 1
+            self._latencies[event_type].append(time.perf_counter() - t0)
+        return self._results(loop.time() - started)
+
+    def _results(self, duration: float) -> Dict[str, Any]:
+        handled = sum(len(latencies) for latencies in self._latencies.values())
+        return {
+            'events': handled,
+            'duration_s': round(duration, 3),
+            'events_per_second': round(handled / duration, 1) if duration else None,
+            'max_lag_ms': round(max(self._lag) * 1e3, 3) if self._lag else 0.0,
+            'errors': dict(self._errors),
+            'event_types': {event_type: _summarize(latencies)
+                            for event_type, latencies in sorted(self._latencies.items())},
+        }
@@ -0,0 +1,58 @@
+import dataclasses
+import gzip
+import json
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple
+
+from machine.models import Channel, User
+
+# Bumped when the format changes, snapshots with another version are ignored
+SNAPSHOT_VERSION = 1
+
+
+class Snapshot(NamedTuple):
+    """Users and channels loaded from a snapshot, and the time the snapshot was taken"""
+    users: List[User]
+    channels: List[Channel]
+    created: float
+
+
+def _compact(value: Any) -> Any:
+    # Fields that are None are left out, the models default them to None
+    if isinstance(value, dict):
+        return {k: _compact(v) for k, v in value.items() if v is not None}
+    return value
+
+
+def dump_snapshot(users: Iterable[User], channels: Iterable[Channel]) -> bytes:
+    """Serialize users and channels to a compact snapshot
+
+    :param users: the users to include
+    :param channels: the channels to include
+    :return: the snapshot, as gzipped JSON
+    """
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'created': time.time(),
+        'users': [_compact(dataclasses.asdict(user)) for user in users],
+        'channels': [_compact(dataclasses.asdict(channel)) for channel in channels],
+    }
+    return gzip.compress(json.dumps(snapshot, separators=(',', ':')).encode('utf-8'), 6)
+
+
+def load_snapshot(data: bytes) -> Snapshot:
+    """Deserialize a snapshot created by :py:func:`dump_snapshot`
+
+    :param data: the snapshot
+    :return: the users and channels in the snapshot, and the time it was created
+    :raises ValueError: if the data is not a snapshot of the current version
+    """
+    try:
+        snapshot: Dict[str, Any] = json.loads(gzip.decompress(data).decode('utf-8'))
+    except (OSError, EOFError, UnicodeDecodeError) as e:
+        raise ValueError("Not a snapshot: {}".format(e)) from e
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+        raise ValueError("Unsupported snapshot version")
+    return Snapshot([User.from_api_response(u) for u in snapshot['users']],
+                    [Channel.from_api_response(c) for c in snapshot['channels']],
+                    snapshot['created'])
@@ -0,0 +1,202 @@
+import re
+import threading
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from machine.models import User
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def normalize_name(name: str) -> str:
+    name = name.strip()
+    if name.startswith('@'):
+        name = name[1:]
+    return name.casefold()
+
+
+_WORD_SEPARATORS = re.compile(r'[\s._\-@]+')
+
+
+def _words(name: str) -> List[str]:
+    return [word for word in _WORD_SEPARATORS.split(name) if word]
+
+
+def _trigrams(word: str, complete: bool = True) -> List[str]:
+    # Words are padded at the start, so the trigrams of a prefix of a word are trigrams of the
+    # word as well. Complete words are padded at the end too, so matching whole words rank higher
+    padded = '  ' + word + (' ' if complete else '')
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class UserIndex:
+    """Indexes of users by email address and by name, kept up to date as users are added
+
+    Users are indexed by their (normalized) email address, their username (``name``), and the
+    normalized display name and real name of their profile. Email addresses and usernames are
+    unique, display names and real names are not.
+
+    Active users can also be searched by (part of) their names with :py:meth:`search`, which
+    uses an index of the trigrams of the words in their names.
+
+    This class is thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_email = {}
+        self._by_username = {}
+        # Ids of users by name, as ordered sets (dicts with None values)
+        self._by_display_name = {}
+        self._by_real_name = {}
+        # The keys every user is indexed under, to remove them when the user changes
+        self._keys = {}
+        # Ids of users by trigram of the words in their names, and the trigrams of every user
+        self._by_trigram: Dict[str, Set[str]] = {}
+        self._trigrams: Dict[str, FrozenSet[str]] = {}
+
+    @staticmethod
+    def _keys_of(user: User) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
+        profile = user.profile
+        email = getattr(profile, 'email', None)
+        display_name = getattr(profile, 'display_name_normalized', None)
+        real_name = getattr(profile, 'real_name_normalized', None) or user.real_name
+        return (normalize_email(email) if email else None,
+                normalize_name(user.name) if user.name else None,
+                normalize_name(display_name) if display_name else None,
+                normalize_name(real_name) if real_name else None)
+
+    def _remove(self, user_id: str):
+        keys = self._keys.pop(user_id, None)
+        if keys is None:
+            return
+        email, username, display_name, real_name = keys
+        if email is not None and self._by_email.get(email) == user_id:
+            del self._by_email[email]
+        if username is not None and self._by_username.get(username) == user_id:
+            del self._by_username[username]
+        for index, name in ((self._by_display_name, display_name),
+                            (self._by_real_name, real_name)):
+            ids = index.get(name)
+            if ids is not None:
+                ids.pop(user_id, None)
+                if not ids:
+                    del index[name]
+        for trigram in self._trigrams.pop(user_id, ()):
+            ids = self._by_trigram[trigram]
+            ids.discard(user_id)
+            if not ids:
+                del self._by_trigram[trigram]
+
+    def add(self, user: User):
+        """Index a user, or re-index a user that changed
+
+        :param user: the user
+        """
+        keys = self._keys_of(user)
+        email, username, display_name, real_name = keys
+        with self._lock:
+            self._remove(user.id)
+            self._keys[user.id] = keys
+            if email is not None:
+                self._by_email[email] = user.id
+            if username is not None:
+                self._by_username[username] = user.id
+            if display_name is not None:
+                self._by_display_name.setdefault(display_name, {})[user.id] = None
+            if real_name is not None:
+                self._by_real_name.setdefault(real_name, {})[user.id] = None
+            if not user.deleted:
+                # Usernames, display names and real names usually have words in common
+                words = {word for name in (username, display_name, real_name) if name
+                         for word in _words(name)}
+                trigrams = frozenset().union(*map(_trigrams, words))
+                self._trigrams[user.id] = trigrams
+                by_trigram = self._by_trigram
+                for trigram in trigrams:
+                    ids = by_trigram.get(trigram)
+                    if ids is None:
+                        by_trigram[trigram] = {user.id}
+                    else:
+                        ids.add(user.id)
+
+    def remove(self, user_id: str):
+        """Remove a user from the indexes
+
+        :param user_id: the id of the user
+        """
+        with self._lock:
+            self._remove(user_id)
+
+    def by_email(self, email: str) -> Optional[str]:
+        """Find a user by email address
+
+        :param email: the email address, compared case-insensitively
+        :return: the id of the user, or ``None``
+        """
+        return self._by_email.get(normalize_email(email))
+
+    def by_name(self, name: str) -> List[str]:
+        """Find users by name
+
+        Users whose username matches come first, then users whose display name matches, and
+        then users whose real name matches.
+
+        :param name: the username (optionally starting with ``@``), display name or real name,
+            compared case-insensitively
+        :return: the ids of the matching users
+        """
+        name = normalize_name(name)
+        with self._lock:
+            ids: Dict[str, None] = {}
+            username_id = self._by_username.get(name)
+            if username_id is not None:
+                ids[username_id] = None
+            ids.update(self._by_display_name.get(name, {}))
+            ids.update(self._by_real_name.get(name, {}))
+            return list(ids)
+
+    def search(self, query: str, limit: int = 10, min_score: float = 0.4) -> List[str]:
+        """Find active users whose names (approximately) match a query
+
+        Every word of the query is matched against the words in the username, display name and
+        real name of users, so ``ali`` finds a user named ``Alice Smith``, and so does
+        ``smith alice``. Users are ranked by the fraction of the trigrams of the query that are in
+        their names, so names with a typo are found as well, but rank lower. Users whose username,
+        display name or real name is the query rank highest.
+
+        :param query: the (partial) name to search for, compared case-insensitively
+        :param limit: the maximum number of users to return
+        :param min_score: the minimum fraction of the trigrams of the query a user's names must
+            have, between 0 and 1
+        :return: the ids of the matching users, best match first
+        """
+        name = normalize_name(query)
+        # The last word may be incomplete while the user is still typing
+        words = _words(name)
+        query_trigrams = {trigram for i, word in enumerate(words)
+                          for trigram in _trigrams(word, complete=i < len(words) - 1)}
+        if not query_trigrams:
+            return []
+        needed = max(1, int(len(query_trigrams) * min_score + 0.999))
+        with self._lock:
+            postings = sorted((self._by_trigram.get(trigram, ()) for trigram in query_trigrams),
+                              key=len)
+            # A user that has enough of the trigrams has at least one of the rarest ones, so only
+            # those need to be scanned to find the candidates
+            candidates = set().union(*postings[:len(postings) - needed + 1])
+            scored = []
+            user_trigrams = self._trigrams
+            for user_id in candidates:
+                shared = len(query_trigrams.intersection(user_trigrams[user_id]))
+                if shared < needed:
+                    continue
+                exact = name in self._keys[user_id][1:]
+                # Among equally good matches, users with fewer other words in their names win
+                scored.append((not exact, -shared, len(user_trigrams[user_id]), user_id))
+        scored.sort()
+        return [user_id for *_, user_id in scored[:limit]]
+
+    def __len__(self):
+        return len(self._keys)
@@ -0,0 +1,151 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Timeouts(NamedTuple):
+    """Time budgets (in seconds) of a handler
+
+    A handler that runs longer than its ``soft`` timeout is reported as slow. A handler that runs
+    longer than its ``hard`` timeout is reported as timed out, and is cancelled if it is a
+    coroutine. Threads cannot be interrupted, so synchronous handlers are never cancelled.
+    """
+    soft: Optional[float] = None
+    hard: Optional[float] = None
+
+
+class HandlerWatchdog:
+    """Keeps track of running handlers and reports the ones that exceed their time budget
+
+    Handlers are reported when they finish, and - if the watchdog thread was started - also while
+    they are still running, so handlers that never finish don't go unnoticed.
+
+    :param check_interval: how often (in seconds) the watchdog thread checks running handlers
+    """
+
+    def __init__(self, check_interval: float = 1.0):
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._running = {}
+        self._ids = itertools.count()
+        self._thread = None
+        self._stopped = threading.Event()
+        self._slow = 0
+        self._timed_out = 0
+        self._cancelled = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name='machine-watchdog',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    @contextmanager
+    def track(self, name: str, timeouts: Timeouts):
+        """Track a running handler
+
+        :param name: name of the handler, used when reporting
+        :param timeouts: time budgets of the handler
+        """
+        if timeouts.soft is None and timeouts.hard is None:
+            yield
+            return
+        handler_id = next(self._ids)
+        # [name, timeouts, start time, reported as slow, reported as timed out]
+        entry = [name, timeouts, time.monotonic(), False, False]
+        with self._lock:
+            self._running[handler_id] = entry
+        try:
+            yield
+        finally:
+            with self._lock:
+                del self._running[handler_id]
+            self._check(entry, time.monotonic(), finished=True)
+
+    def _check(self, entry, now: float, finished: bool = False):
+        name, timeouts, started_at, slow_reported, timed_out_reported = entry
+        duration = now - started_at
+        state = "took" if finished else "has been running for"
+        if timeouts.hard is not None and duration > timeouts.hard and not timed_out_reported:
+            entry[4] = True
+            with self._lock:
+                self._timed_out += 1
+            logger.error("Handler %s %s %.3fs, exceeding its hard timeout of %ss", name, state,
+                         duration, timeouts.hard)
+        elif timeouts.soft is not None and duration > timeouts.soft and not slow_reported \
+                and not timed_out_reported:
+            entry[3] = True
+            with self._lock:
+                self._slow += 1
+            logger.warning("Handler %s %s %.3fs, exceeding its soft timeout of %ss", name, state,
+                           duration, timeouts.soft)
+
+    def _watch(self):
+        while not self._stopped.wait(self._check_interval):
+            now = time.monotonic()
+            with self._lock:
+                entries = list(self._running.values())
+            for entry in entries:
+                self._check(entry, now)
+
+    def run(self, name: str, timeouts: Timeouts, fn: Callable, *args, **kwargs):
+        """Call a synchronous handler and track it
+
+        :return: the return value of the handler
+        """
+        with self.track(name, timeouts):
+            return fn(*args, **kwargs)
+
+    async def run_async(self, name: str, timeouts: Timeouts, fn: Callable, *args, **kwargs):
+        """Await a coroutine function and track it, cancelling it after its hard timeout
+
+        :return: the return value of the coroutine, or ``None`` if it was cancelled
+        """
+        with self.track(name, timeouts):
+            if timeouts.hard is None:
+                return await fn(*args, **kwargs)
+            loop = asyncio.get_event_loop()
+            task = asyncio.ensure_future(fn(*args, **kwargs), loop=loop)
+            # Only a cancellation by the timer is a timeout, the handler can raise its own
+            # TimeoutError or CancelledError
+            fired = []
+
+            def cancel():
+                fired.append(True)
+                task.cancel()
+
+            timer = loop.call_later(timeouts.hard, cancel)
+            try:
+                return await task
+            except asyncio.CancelledError:
+                if not fired:
+                    raise
+                with self._lock:
+                    self._cancelled += 1
+                logger.error("Handler %s was cancelled after its hard timeout of %ss", name,
+                             timeouts.hard)
+            finally:
+                timer.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistics about the tracked handlers
+
+        :return: dictionary with the number of handlers that are running, and the number of
+            handlers that were slow, timed out or cancelled
+        """
+        with self._lock:
+            return {
+                'running': len(self._running),
+                'slow': self._slow,
+                'timed_out': self._timed_out,
+                'cancelled': self._cancelled,
+            }
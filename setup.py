@@ -99,6 +99,7 @@ setup(
     entry_points={
         'console_scripts': [
             'slack-machine = machine.bin.run:main',
+            'slack-machine-replay = machine.bin.replay:main',
         ],
     },
     packages=find_packages(),
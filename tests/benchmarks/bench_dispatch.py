@@ -0,0 +1,211 @@
+"""Measure the throughput and latency of the message dispatch path on a synthetic workspace
+
+The benchmark fills the Slack client with generated users and channels, registers generated
+plugins through ``Machine._register_plugin`` and feeds generated message events to the
+dispatcher. Results are written as JSON, so runs can be compared across releases.
+
+Run with: ``python -m tests.benchmarks.bench_dispatch [--output results.json]``
+
+Compare two runs with: ``python -m tests.benchmarks.bench_dispatch --compare old.json new.json``
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from machine.__about__ import __version__
+from machine.clients.singletons.slack import LowLevelSlackClient
+from machine.clients.slack import SlackClient
+from machine.core import Machine
+from machine.settings import import_settings
+from machine.storage import PluginStorage
+from tests.benchmarks.workspace import (BOT_ID, BOT_NAME, gen_message_events, gen_plugin_classes,
+                                        gen_workspace)
+
+
+@contextmanager
+def _stdout_to_stderr():
+    # Machine announces its progress on stdout, keep stdout clean for the results
+    sys.stdout.flush()
+    saved = os.dup(1)
+    os.dup2(2, 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+
+
+def build_machine(args):
+    # The Slack client reads its token from the settings itself, it never connects to Slack
+    os.environ.setdefault('SM_SLACK_API_TOKEN', 'xoxb-benchmark')
+    # Use the default settings, not the local_settings of whatever directory we're run from
+    settings, _ = import_settings(settings_module='tests.benchmarks.no_settings')
+    settings['PLUGINS'] = []
+    with _stdout_to_stderr():
+        machine = Machine(settings=settings)
+
+    client = LowLevelSlackClient.get_instance()
+    users, channels = gen_workspace(args.users, args.channels, args.ims, seed=args.seed)
+    client._bot_info = {'id': BOT_ID, 'name': BOT_NAME}
+    for u in users:
+        client._register_user(u)
+    for c in channels:
+        client._register_channel(c)
+
+    plugin_classes, keywords = gen_plugin_classes(args.plugins, args.handlers, seed=args.seed)
+    for name, cls in plugin_classes:
+        instance = cls(SlackClient(), settings, PluginStorage(name))
+        machine._register_plugin(name, instance)
+    return machine, users, channels, keywords
+
+
+def summarize(latencies_ns, total_ns):
+    latencies_ns = sorted(latencies_ns)
+    n = len(latencies_ns)
+    return {
+        'events': n,
+        'events_per_second': round(n / (total_ns / 1e9), 1),
+        'mean_us': round(sum(latencies_ns) / n / 1e3, 3),
+        'p50_us': round(latencies_ns[n // 2] / 1e3, 3),
+        'p99_us': round(latencies_ns[min(n - 1, int(n * 0.99))] / 1e3, 3),
+        'max_us': round(latencies_ns[-1] / 1e3, 3),
+    }
+
+
+def measure(fn, inputs):
+    latencies = []
+    clock = time.perf_counter_ns
+    started = clock()
+    for item in inputs:
+        t0 = clock()
+        fn(item)
+        latencies.append(clock() - t0)
+    return summarize(latencies, clock() - started)
+
+
+def measure_allocations(fn, inputs):
+    # Peak memory allocated while handling an event, above what was allocated before. Unlike
+    # timings, this is not affected by other processes on the machine
+    if not hasattr(tracemalloc, 'reset_peak'):
+        return None
+    allocated = 0
+    tracemalloc.start()
+    try:
+        for item in inputs:
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            fn(item)
+            _, peak = tracemalloc.get_traced_memory()
+            allocated += peak - before
+    finally:
+        tracemalloc.stop()
+    return round(allocated / len(inputs), 1)
+
+
+def run(args):
+    machine, users, channels, keywords = build_machine(args)
+    dispatcher = machine._dispatcher
+    user_ids = [u['id'] for u in users]
+    channel_ids = [c['id'] for c in channels if not c['is_im']]
+    im_ids = [c['id'] for c in channels if c['is_im']]
+    # Events are consumed (and deduplicated) by the dispatcher, so every phase gets its own copies
+    events = gen_message_events(args.warmup + args.events, user_ids, channel_ids, im_ids,
+                                keywords, seed=args.seed)
+    warmup, events = events[:args.warmup], events[args.warmup:]
+
+    def copies():
+        return [dict(e) for e in events]
+
+    for event in warmup:
+        dispatcher.handle_message(data=dict(event))
+
+    results = {
+        'handle_message': measure(lambda e: dispatcher.handle_message(data=e), copies()),
+        'check_bot_mention': measure(dispatcher._check_bot_mention, copies()),
+        'gen_message': measure(lambda e: dispatcher._gen_message(e, 'bench:Plugin'), copies()),
+    }
+    messages = [dispatcher._gen_message(e, 'bench:Plugin') for e in copies()]
+    results['message_sender_channel'] = measure(lambda m: (m.sender, m.channel), messages)
+    results['message_str'] = measure(str, messages)
+    results['handle_message']['alloc_bytes_per_event'] = measure_allocations(
+        lambda e: dispatcher.handle_message(data=e),
+        [dict(e, ts=e['ts'] + '0') for e in events])
+
+    return {
+        'benchmark': 'dispatch',
+        'version': __version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'params': {
+            'users': args.users,
+            'channels': args.channels,
+            'ims': args.ims,
+            'plugins': args.plugins,
+            'handlers_per_plugin': args.handlers,
+            'listeners': {_type: len(listeners)
+                          for _type, listeners in machine._plugin_actions.items()},
+            'events': args.events,
+            'warmup': args.warmup,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'':24} {'old ev/s':>12} {'new ev/s':>12} {'old p99µs':>10} {'new p99µs':>10}")
+    alloc = [r['results']['handle_message'].get('alloc_bytes_per_event') for r in (old, new)]
+    for name, new_result in new['results'].items():
+        old_result = old['results'].get(name)
+        if old_result is None:
+            continue
+        ratio = new_result['events_per_second'] / old_result['events_per_second']
+        print(f"{name:24} {old_result['events_per_second']:12.1f} "
+              f"{new_result['events_per_second']:12.1f} {old_result['p99_us']:10.1f} "
+              f"{new_result['p99_us']:10.1f}  {ratio:.2f}x")
+    if None not in alloc:
+        print(f"{'bytes allocated/event':24} {alloc[0]:12.1f} {alloc[1]:12.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--channels', type=int, default=200)
+    parser.add_argument('--ims', type=int, default=50)
+    parser.add_argument('--plugins', type=int, default=20)
+    parser.add_argument('--handlers', type=int, default=4, help="handlers per plugin")
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--warmup', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="write results to this file instead of stdout")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help="compare two result files")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    results = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
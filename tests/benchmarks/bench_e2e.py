@@ -0,0 +1,205 @@
+"""Measure startup time, throughput and reply latency of the full stack against a fake Slack
+
+Unlike ``bench_dispatch``, which calls the dispatcher directly, this benchmark runs a Machine
+with the real RTM and Web API clients, connected to the local fake Slack server of
+``tests.fake_slack``. Events are sent over the websocket, and some of them are answered by a
+plugin through the Web API, so the time between sending such an event and receiving the reply is
+the end-to-end latency.
+
+Run with: ``python -m tests.benchmarks.bench_e2e [--output results.json]``
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from slack.rtm.client import RTMClient
+
+from machine.__about__ import __version__
+from machine.clients.singletons.slack import LowLevelSlackClient
+from machine.clients.slack import SlackClient
+from machine.core import Machine
+from machine.plugins.base import MachineBasePlugin
+from machine.plugins.decorators import listen_to
+from machine.settings import import_settings
+from machine.storage import PluginStorage
+from tests.benchmarks.bench_dispatch import _stdout_to_stderr
+from tests.benchmarks.workspace import gen_message_events, gen_plugin_classes
+from tests.fake_slack import FakeSlackServer
+
+REPLY_PLUGIN = 'tests.benchmarks.bench_e2e:ReplyPlugin'
+
+
+class ReplyPlugin(MachineBasePlugin):
+    """Replies with the number in the message, so the fake server can match replies to events"""
+
+    @listen_to(r'^bench-reply (?P<n>\d+)$')
+    def reply(self, msg, n):
+        msg.say(n)
+
+
+def build_machine(args, server):
+    # The Slack client reads its settings itself, point it at the fake server through the env
+    os.environ.setdefault('SM_SLACK_API_TOKEN', 'xoxb-benchmark')
+    os.environ['SM_SLACK_API_BASE_URL'] = server.base_url
+    settings, _ = import_settings(settings_module='tests.benchmarks.no_settings')
+    settings['PLUGINS'] = []
+    settings['DISABLE_HTTP'] = True
+    with _stdout_to_stderr():
+        machine = Machine(settings=settings)
+    plugin_classes, keywords = gen_plugin_classes(args.plugins, args.handlers, seed=args.seed)
+    plugin_classes.append((REPLY_PLUGIN, ReplyPlugin))
+    for name, cls in plugin_classes:
+        machine._register_plugin(name, cls(SlackClient(), settings, PluginStorage(name)))
+    return machine, keywords
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def drive(args, server, client, events, connected, results):
+    # Runs in a separate thread: the Machine runs in the main thread
+    try:
+        if not connected.wait(args.timeout):
+            raise RuntimeError("The bot did not connect to the fake Slack server")
+        replies = {}
+        started = time.perf_counter()
+        if args.rate:
+            for i, event in enumerate(events):
+                delay = started + i / args.rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                if event['text'].startswith('bench-reply'):
+                    replies[event['text'].split()[1]] = time.perf_counter()
+                server.send_event(event)
+        else:
+            replies = {e['text'].split()[1]: started for e in events
+                       if e['text'].startswith('bench-reply')}
+            server.send_events(events)
+        deadline = time.monotonic() + args.timeout
+        while len(server.posted_messages) < len(replies) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        finished = max(t for t, _ in server.posted_messages) if server.posted_messages else None
+        latencies = [(t - replies[m['text']]) * 1e3 for t, m in server.posted_messages
+                     if m.get('text') in replies]
+        results['events'] = len(events)
+        results['replies'] = len(latencies)
+        results['missing_replies'] = len(replies) - len(latencies)
+        if finished is not None:
+            results['duration_s'] = round(finished - started, 3)
+            results['events_per_second'] = round(len(events) / (finished - started), 1)
+        if latencies:
+            results['reply_latency_ms'] = {
+                'mean': round(sum(latencies) / len(latencies), 3),
+                'p50': round(percentile(latencies, 0.5), 3),
+                'p99': round(percentile(latencies, 0.99), 3),
+                'max': round(max(latencies), 3),
+            }
+        # Events are handled while the users and channels are loaded, wait for that to finish
+        client.bootstrapped.wait(args.timeout)
+    finally:
+        client.loop.call_soon_threadsafe(client.rtm_client.stop)
+
+
+def run(args):
+    server = FakeSlackServer.with_workspace(args.users, args.channels, args.ims, seed=args.seed,
+                                            latency=args.latency, page_size=args.page_size)
+    server.start()
+    try:
+        machine, keywords = build_machine(args, server)
+        client = LowLevelSlackClient.get_instance()
+        user_ids = [u['id'] for u in server.users]
+        channel_ids = [c['id'] for c in server.channels if not c['is_im']]
+        im_ids = [c['id'] for c in server.channels if c['is_im']]
+        events = gen_message_events(args.events, user_ids, channel_ids, im_ids, keywords,
+                                    seed=args.seed)
+        # Every n-th event is answered, and so is the last one, which marks the end of the run
+        for i, event in enumerate(events):
+            if i % args.reply_every == 0 or i == len(events) - 1:
+                # In a channel: DMs are only handled by respond_to functions
+                event['text'] = 'bench-reply {}'.format(i)
+                event['channel'] = channel_ids[i % len(channel_ids)]
+
+        results = {}
+        connected = threading.Event()
+        start = time.perf_counter()
+
+        def on_hello(**payload):
+            # The bot is connected, the user and channel caches are loaded in the background
+            results.setdefault('startup_s', round(time.perf_counter() - start, 3))
+            connected.set()
+
+        RTMClient.on(event='hello', callback=on_hello)
+        driver = threading.Thread(target=drive,
+                                  args=(args, server, client, events, connected, results))
+        driver.start()
+        machine._dispatcher.start()
+        driver.join()
+        results['bootstrap_s'] = client.bootstrap_timings
+        results['api_calls'] = dict(server.calls)
+        results['rate_limited'] = dict(server.rate_limited)
+    finally:
+        server.stop()
+
+    return {
+        'benchmark': 'e2e',
+        'version': __version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'params': {
+            'users': args.users,
+            'channels': args.channels,
+            'ims': args.ims,
+            'plugins': args.plugins,
+            'handlers_per_plugin': args.handlers,
+            'events': args.events,
+            'reply_every': args.reply_every,
+            'rate': args.rate,
+            'latency': args.latency,
+            'page_size': args.page_size,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--channels', type=int, default=200)
+    parser.add_argument('--ims', type=int, default=50)
+    parser.add_argument('--plugins', type=int, default=20)
+    parser.add_argument('--handlers', type=int, default=4, help="handlers per plugin")
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--reply-every', type=int, default=50,
+                        help="answer every n-th event through the Web API")
+    parser.add_argument('--rate', type=float, default=0,
+                        help="events sent per second, 0 to send all events at once")
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="seconds every Web API call to the fake server takes")
+    parser.add_argument('--page-size', type=int, default=None,
+                        help="maximum page size of paginated Web API methods")
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="write results to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Compare the listener index against testing every listener regex for every message
+
+Run with: ``python -m tests.benchmarks.bench_listener_index``
+"""
+import random
+import re
+import string
+import timeit
+
+from machine.utils.matching import ListenerIndex
+
+N_LISTENERS = 300
+N_MESSAGES = 1000
+
+
+def _word(rnd, length=6):
+    return ''.join(rnd.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def gen_listeners(rnd, n):
+    templates = [
+        r'{w}',
+        r'^{w}$',
+        r'{w}(?: me)? (?P<query>.+)',
+        r'{w} (?P<a>\S+) (?P<b>.+)',
+        r'(?:{w}|{w2})',
+    ]
+    listeners = {}
+    for i in range(n):
+        pattern = templates[i % len(templates)].format(w=_word(rnd), w2=_word(rnd))
+        listeners[f"listener{i}-{pattern}"] = {'regex': re.compile(pattern, re.IGNORECASE)}
+    return listeners
+
+
+def gen_messages(rnd, n):
+    return [' '.join(_word(rnd, rnd.randint(2, 8)) for _ in range(rnd.randint(3, 20)))
+            for _ in range(n)]
+
+
+def full_scan(listeners, messages):
+    for text in messages:
+        for listener in listeners:
+            listener['regex'].search(text)
+
+
+def indexed(index, messages):
+    for text in messages:
+        for listener in index.candidates(text):
+            listener['regex'].search(text)
+
+
+def main():
+    rnd = random.Random(42)
+    listeners = gen_listeners(rnd, N_LISTENERS)
+    messages = gen_messages(rnd, N_MESSAGES)
+    index = ListenerIndex(listeners)
+    values = list(listeners.values())
+    scan_time = min(timeit.repeat(lambda: full_scan(values, messages), number=1, repeat=5))
+    index_time = min(timeit.repeat(lambda: indexed(index, messages), number=1, repeat=5))
+    print(f"{N_LISTENERS} listeners, {N_MESSAGES} messages")
+    print(f"full scan: {scan_time / N_MESSAGES * 1e6:.1f}µs/message")
+    print(f"indexed:   {index_time / N_MESSAGES * 1e6:.1f}µs/message")
+    print(f"speedup:   {scan_time / index_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Measure the time and memory it takes to build User models from Slack API responses
+
+Compares the generated constructors of the models (with and without profile images) against
+``dacite.from_dict``, which Slack Machine used before, if dacite is installed.
+
+Run with: ``python -m tests.benchmarks.bench_models [--users 10000]``
+"""
+import argparse
+import gc
+import json
+import random
+import timeit
+import tracemalloc
+
+from machine.models.user import User, keep_profile_images
+from tests.benchmarks.workspace import gen_user
+
+
+def _responses(n):
+    rnd = random.Random(42)
+    # Like responses decoded from JSON, every user has its own copy of every string
+    return json.loads(json.dumps([gen_user(rnd, i) for i in range(n)]))
+
+
+def _measure(build, n, repeat):
+    timed = _responses(n)
+    seconds = min(timeit.repeat(lambda: [build(r) for r in timed], number=1, repeat=repeat))
+    # Memory that is still used once the responses are gone, ie. what the user cache holds
+    gc.collect()
+    tracemalloc.start()
+    responses = _responses(n)
+    users = [build(r) for r in responses]
+    del responses
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del users
+    return seconds, size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    variants = [('generated', User.from_api_response)]
+    try:
+        from dacite import from_dict
+    except ImportError:
+        pass
+    else:
+        variants.insert(0, ('dacite', lambda r: from_dict(data_class=User, data=r)))
+
+    print(f"{args.users} users, per 10k users:")
+    scale = 10000 / args.users
+    for name, build in variants:
+        seconds, size = _measure(build, args.users, args.repeat)
+        print(f"{name:24s} {seconds * scale * 1e3:8.1f}ms {size * scale / 2 ** 20:8.2f}MiB")
+    keep_profile_images(False)
+    try:
+        seconds, size = _measure(User.from_api_response, args.users, args.repeat)
+    finally:
+        keep_profile_images(True)
+    print(f"{'generated, no images':24s} {seconds * scale * 1e3:8.1f}ms "
+          f"{size * scale / 2 ** 20:8.2f}MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""Measure how long it takes to index users, and to search them by (part of) their names
+
+Run with: ``python -m tests.benchmarks.bench_user_search [--users 100000]``
+"""
+import argparse
+import random
+import time
+import timeit
+
+from machine.models.user import User
+from machine.utils.user_index import UserIndex
+from tests.benchmarks.workspace import gen_user
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    rnd = random.Random(42)
+    users = [User.from_api_response(gen_user(rnd, i)) for i in range(args.users)]
+    index = UserIndex()
+    started = time.perf_counter()
+    for user in users:
+        index.add(user)
+    print(f"indexed {args.users} users in {time.perf_counter() - started:.2f}s")
+
+    names = [rnd.choice(users).real_name for _ in range(args.queries)]
+    queries = {
+        'full name': names,
+        'first word': [name.split()[0] for name in names],
+        'prefix': [name[:3] for name in names],
+        'typo': [name[:2] + name[3] + name[2] + name[4:] for name in names],
+    }
+    for kind, texts in queries.items():
+        seconds = min(timeit.repeat(lambda: [index.search(text) for text in texts],
+                                    number=1, repeat=3))
+        print(f"{kind:12s} {seconds / len(texts) * 1e6:10.1f}us per search")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""Synthetic Slack workspaces and plugins for benchmarks"""
+import random
+import string
+from typing import Any, Dict, List
+
+from machine.plugins.base import MachineBasePlugin
+from machine.plugins.decorators import listen_to, respond_to
+
+TEAM_ID = 'T0000001'
+BOT_ID = 'UBOT0001'
+BOT_NAME = 'superbot'
+
+
+def _word(rnd: random.Random, length: int = 6) -> str:
+    return ''.join(rnd.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def gen_user(rnd: random.Random, i: int) -> Dict[str, Any]:
+    name = "{}.{}".format(_word(rnd, 5), _word(rnd, 7))
+    real_name = name.replace('.', ' ').title()
+    return {
+        'id': 'U{:08d}'.format(i),
+        'team_id': TEAM_ID,
+        'name': name,
+        'deleted': False,
+        'color': '9f69e7',
+        'real_name': real_name,
+        'tz': 'Europe/Amsterdam',
+        'tz_label': 'Central European Summer Time',
+        'tz_offset': 7200,
+        'profile': {
+            'avatar_hash': _word(rnd, 12),
+            'status_text': '',
+            'status_emoji': '',
+            'status_expiration': 0,
+            'real_name': real_name,
+            'display_name': name,
+            'real_name_normalized': real_name,
+            'display_name_normalized': name,
+            'email': '{}@example.com'.format(name),
+            'image_24': 'https://avatars.example.com/{}_24.png'.format(i),
+            'image_32': 'https://avatars.example.com/{}_32.png'.format(i),
+            'image_48': 'https://avatars.example.com/{}_48.png'.format(i),
+            'image_72': 'https://avatars.example.com/{}_72.png'.format(i),
+            'image_192': 'https://avatars.example.com/{}_192.png'.format(i),
+            'image_512': 'https://avatars.example.com/{}_512.png'.format(i),
+            'team': TEAM_ID,
+        },
+        'is_admin': False,
+        'is_owner': False,
+        'is_primary_owner': False,
+        'is_restricted': False,
+        'is_ultra_restricted': False,
+        'is_bot': False,
+        'is_app_user': False,
+        'updated': 1600000000 + i,
+        'has_2fa': False,
+    }
+
+
+def gen_channel(rnd: random.Random, i: int, user_ids: List[str]) -> Dict[str, Any]:
+    name = "{}-{}".format(_word(rnd, 6), i)
+    return {
+        'id': 'C{:08d}'.format(i),
+        'name': name,
+        'is_channel': True,
+        'is_group': False,
+        'is_im': False,
+        'created': 1500000000 + i,
+        'creator': rnd.choice(user_ids),
+        'is_archived': False,
+        'is_general': i == 0,
+        'name_normalized': name,
+        'is_shared': False,
+        'is_org_shared': False,
+        'is_member': True,
+        'is_private': False,
+        'is_mpim': False,
+        'user': None,
+        'members': None,
+        'topic': {'value': '', 'creator': '', 'last_set': 0},
+        'purpose': {'value': 'Talk about {}'.format(name), 'creator': '', 'last_set': 0},
+        'previous_names': [],
+    }
+
+
+def gen_im(i: int, user_id: str) -> Dict[str, Any]:
+    return {
+        'id': 'D{:08d}'.format(i),
+        'name': None,
+        'is_channel': False,
+        'is_group': False,
+        'is_im': True,
+        'created': 1500000000 + i,
+        'creator': None,
+        'is_archived': False,
+        'is_general': None,
+        'name_normalized': None,
+        'is_shared': False,
+        'is_org_shared': False,
+        'is_member': None,
+        'is_private': None,
+        'is_mpim': None,
+        'user': user_id,
+        'members': None,
+        'topic': None,
+        'purpose': None,
+        'previous_names': None,
+    }
+
+
+def gen_workspace(n_users: int, n_channels: int, n_ims: int = 0, seed: int = 42):
+    """Generate API responses for the users and conversations of a workspace
+
+    :return: tuple of list of user responses and list of conversation responses
+    """
+    rnd = random.Random(seed)
+    users = [gen_user(rnd, i) for i in range(n_users)]
+    user_ids = [u['id'] for u in users]
+    channels = [gen_channel(rnd, i, user_ids) for i in range(n_channels)]
+    channels.extend(gen_im(i, user_ids[i % n_users]) for i in range(n_ims))
+    return users, channels
+
+
+_PATTERN_TEMPLATES = [
+    r'{w}',
+    r'^{w}$',
+    r'{w}(?: me)? (?P<query>.+)',
+    r'{w} (?P<a>\S+) (?P<b>.+)',
+    r'(?:{w}|{w2})',
+    r'^(?P<target>\S+)\+\+',
+]
+
+
+def gen_plugin_classes(n_plugins: int, handlers_per_plugin: int = 4, seed: int = 42):
+    """Generate plugin classes with listen_to and respond_to handlers that use realistic regexes
+
+    :return: tuple of list of (name, plugin class) tuples, and list of the keywords used in the
+        handler patterns
+    """
+    rnd = random.Random(seed)
+    classes = []
+    keywords = []
+    for p in range(n_plugins):
+        attrs = {'__doc__': 'Generated plugin {}'.format(p)}
+        for h in range(handlers_per_plugin):
+            keyword = _word(rnd)
+            keywords.append(keyword)
+            pattern = _PATTERN_TEMPLATES[(p + h) % len(_PATTERN_TEMPLATES)].format(
+                w=keyword, w2=_word(rnd))
+            decorator = respond_to if h % 2 else listen_to
+
+            def handler(self, msg, **kwargs):
+                self.calls += 1
+                return msg.sender, msg.text
+
+            handler.__name__ = 'handler_{}'.format(h)
+            attrs[handler.__name__] = decorator(pattern)(handler)
+        attrs['calls'] = 0
+        name = 'tests.benchmarks.generated:GeneratedPlugin{}'.format(p)
+        classes.append((name, type('GeneratedPlugin{}'.format(p), (MachineBasePlugin,), attrs)))
+    return classes, keywords
+
+
+def gen_message_events(n_events: int, user_ids: List[str], channel_ids: List[str],
+                       im_ids: List[str], keywords: List[str], seed: int = 42):
+    """Generate message events: mostly chatter, some with keywords, mentions of the bot and DMs"""
+    rnd = random.Random(seed)
+    events = []
+    for i in range(n_events):
+        words = [_word(rnd, rnd.randint(2, 8)) for _ in range(rnd.randint(3, 20))]
+        kind = rnd.random()
+        if kind < 0.3:
+            words.insert(rnd.randint(0, len(words)), rnd.choice(keywords))
+        channel = rnd.choice(channel_ids)
+        if kind < 0.1:
+            words.insert(0, '<@{}>'.format(BOT_ID))
+        elif kind < 0.15 and im_ids:
+            channel = rnd.choice(im_ids)
+        events.append({
+            'type': 'message',
+            'channel': channel,
+            'user': rnd.choice(user_ids),
+            'text': ' '.join(words),
+            'ts': '{}.{:06d}'.format(1600000000 + i, i % 1000000),
+            'team': TEAM_ID,
+        })
+    return events
@@ -0,0 +1,267 @@
+"""A local stand-in for Slack, to test and benchmark the full stack without connecting to Slack
+
+The server implements the RTM websocket stream and the Web API methods Slack Machine uses, on top
+of aiohttp (which slackclient depends on). Point the Slack clients at it with the
+``SLACK_API_BASE_URL`` setting, or the ``base_url`` argument of ``RTMClient`` and ``WebClient``.
+"""
+import asyncio
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from aiohttp import web, WSMsgType
+
+from tests.benchmarks.workspace import BOT_ID, BOT_NAME, TEAM_ID, gen_im, gen_workspace
+
+_CONVERSATION_TYPES = {
+    'public_channel': lambda c: bool(c.get('is_channel')) and not c.get('is_private'),
+    'private_channel': lambda c: bool(c.get('is_group') or c.get('is_private')),
+    'mpim': lambda c: bool(c.get('is_mpim')),
+    'im': lambda c: bool(c.get('is_im')),
+}
+
+
+class FakeSlackServer:
+    """Fake Slack server, running on its own event loop in a background thread
+
+    :param users: users of the workspace, as returned by the Slack API
+    :param channels: conversations of the workspace, as returned by the Slack API
+    :param latency: number of seconds every Web API call takes
+    :param rate_limits: maximum number of calls per second, by Web API method. Calls over the
+        limit get a ``429`` response with a ``Retry-After`` header
+    :param retry_after: value of the ``Retry-After`` header of rate limited responses
+    :param page_size: maximum number of items per page of paginated methods, regardless of the
+        ``limit`` that was asked for
+    :param clock: function returning the current time in seconds, which decides the one second
+        windows of the rate limits
+    """
+
+    def __init__(self, users: Iterable[Dict[str, Any]] = (),
+                 channels: Iterable[Dict[str, Any]] = (), latency: float = 0.0,
+                 rate_limits: Optional[Dict[str, int]] = None, retry_after: int = 1,
+                 page_size: Optional[int] = None, clock: Callable[[], float] = time.monotonic):
+        self.users = list(users)
+        self.channels = list(channels)
+        # Members of the channels, every third user is a member of each channel
+        self.members = {channel['id']: [user['id'] for j, user in enumerate(self.users)
+                                        if (j + k) % 3 == 0]
+                        for k, channel in enumerate(self.channels) if not channel.get('is_im')}
+        self.latency = latency
+        self.rate_limits = rate_limits or {}
+        self.retry_after = retry_after
+        self.page_size = page_size
+        # Web API calls, by method
+        self.calls = Counter()
+        self.rate_limited = Counter()
+        # Arguments of chat.postMessage and reactions.add calls, with the time they were received
+        self.posted_messages = []
+        self.reactions = []
+        self.connections = 0
+        self.clock = clock
+        self._windows = {}
+        self._sockets = set()
+        self._ts = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = None
+        self._runner = None
+        self._port = None
+        self._methods = {
+            'rtm.connect': self._rtm_connect,
+            'users.list': self._users_list,
+            'users.info': self._users_info,
+            'conversations.list': self._conversations_list,
+            'conversations.info': self._conversations_info,
+            'conversations.members': self._conversations_members,
+            'chat.postMessage': self._chat_post_message,
+            'reactions.add': self._reactions_add,
+            'im.open': self._im_open,
+        }
+
+    @classmethod
+    def with_workspace(cls, n_users: int, n_channels: int, n_ims: int = 0, seed: int = 42,
+                       **kwargs) -> 'FakeSlackServer':
+        """Create a server for a generated workspace of the given size"""
+        users, channels = gen_workspace(n_users, n_channels, n_ims, seed=seed)
+        return cls(users, channels, **kwargs)
+
+    @property
+    def base_url(self) -> str:
+        return 'http://127.0.0.1:{}/api/'.format(self._port)
+
+    def start(self) -> 'FakeSlackServer':
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(started,), name='fake-slack',
+                                        daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self, started: threading.Event):
+        asyncio.set_event_loop(self._loop)
+        app = web.Application()
+        app.router.add_route('*', '/api/{method}', self._api)
+        app.router.add_get('/ws', self._websocket)
+        self._runner = web.AppRunner(app, access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        self._loop.run_until_complete(site.start())
+        self._port = site._server.sockets[0].getsockname()[1]
+        started.set()
+        self._loop.run_forever()
+
+    # RTM
+
+    def send_event(self, event: Dict[str, Any]):
+        """Send an event to all connected RTM clients (can be called from any thread)"""
+        asyncio.run_coroutine_threadsafe(self._broadcast(event), self._loop).result()
+
+    def send_events(self, events: List[Dict[str, Any]]):
+        """Send events to all connected RTM clients, in one go (can be called from any thread)"""
+        async def send():
+            for event in events:
+                await self._broadcast(event)
+        asyncio.run_coroutine_threadsafe(send(), self._loop).result()
+
+    def disconnect(self):
+        """Close the connections of all RTM clients, like Slack does every now and then"""
+        async def close():
+            for ws in list(self._sockets):
+                await ws.close()
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result()
+
+    async def _broadcast(self, event: Dict[str, Any]):
+        for ws in list(self._sockets):
+            await ws.send_json(event)
+
+    async def _websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        self._sockets.add(ws)
+        try:
+            await ws.send_json({'type': 'hello'})
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                payload = message.json()
+                if payload.get('type') == 'ping':
+                    await ws.send_json({'type': 'pong', 'reply_to': payload.get('id'),
+                                        'time': int(time.time())})
+        finally:
+            self._sockets.discard(ws)
+        return ws
+
+    # Web API
+
+    async def _api(self, request):
+        method = request.match_info['method']
+        self.calls[method] += 1
+        args = dict(request.query)
+        if request.can_read_body:
+            if request.content_type == 'application/json':
+                args.update(await request.json())
+            else:
+                args.update(await request.post())
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self._is_rate_limited(method):
+            self.rate_limited[method] += 1
+            return web.json_response({'ok': False, 'error': 'ratelimited'}, status=429,
+                                     headers={'Retry-After': str(self.retry_after)})
+        handler = self._methods.get(method)
+        if handler is None:
+            return web.json_response({'ok': False, 'error': 'unknown_method'})
+        return web.json_response(handler(request, args))
+
+    def _is_rate_limited(self, method: str) -> bool:
+        limit = self.rate_limits.get(method)
+        if limit is None:
+            return False
+        second = int(self.clock())
+        window, count = self._windows.get(method, (second, 0))
+        if window != second:
+            window, count = second, 0
+        self._windows[method] = (window, count + 1)
+        return count >= limit
+
+    def _page(self, items: List[Dict[str, Any]], field: str, args: Dict[str, Any]):
+        limit = int(args.get('limit') or 100)
+        if self.page_size:
+            limit = min(limit, self.page_size)
+        start = int(args.get('cursor') or 0)
+        end = start + limit
+        return {'ok': True, field: items[start:end],
+                'response_metadata': {'next_cursor': str(end) if end < len(items) else ''}}
+
+    def _next_ts(self) -> str:
+        self._ts += 1
+        return '{}.{:06d}'.format(int(time.time()), self._ts % 1000000)
+
+    def _rtm_connect(self, request, args):
+        return {
+            'ok': True,
+            'url': 'ws://{}/ws'.format(request.host),
+            'self': {'id': BOT_ID, 'name': BOT_NAME},
+            'team': {'id': TEAM_ID, 'name': 'Fake', 'domain': 'fake'},
+        }
+
+    def _users_list(self, request, args):
+        return self._page(self.users, 'members', args)
+
+    def _users_info(self, request, args):
+        user = next((u for u in self.users if u['id'] == args.get('user')), None)
+        if user is None:
+            return {'ok': False, 'error': 'user_not_found'}
+        return {'ok': True, 'user': user}
+
+    def _conversations_info(self, request, args):
+        channel = next((c for c in self.channels if c['id'] == args.get('channel')), None)
+        if channel is None:
+            return {'ok': False, 'error': 'channel_not_found'}
+        return {'ok': True, 'channel': channel}
+
+    def _conversations_members(self, request, args):
+        members = self.members.get(args.get('channel'))
+        if members is None:
+            return {'ok': False, 'error': 'channel_not_found'}
+        return self._page(members, 'members', args)
+
+    def _conversations_list(self, request, args):
+        types = [_CONVERSATION_TYPES[t] for t in
+                 str(args.get('types') or 'public_channel').split(',') if t in
+                 _CONVERSATION_TYPES]
+        channels = [c for c in self.channels if any(matches(c) for matches in types)]
+        return self._page(channels, 'channels', args)
+
+    def _chat_post_message(self, request, args):
+        ts = self._next_ts()
+        self.posted_messages.append((time.perf_counter(), dict(args, ts=ts)))
+        return {'ok': True, 'channel': args.get('channel'), 'ts': ts,
+                'message': {'type': 'message', 'user': BOT_ID, 'text': args.get('text'),
+                            'ts': ts}}
+
+    def _reactions_add(self, request, args):
+        self.reactions.append((time.perf_counter(), args))
+        return {'ok': True}
+
+    def _im_open(self, request, args):
+        user_id = args.get('user')
+        for channel in self.channels:
+            if channel.get('is_im') and channel.get('user') == user_id:
+                return {'ok': True, 'channel': {'id': channel['id']}}
+        channel = dict(gen_im(len(self.channels), user_id), id='D{}'.format(user_id))
+        self.channels.append(channel)
+        return {'ok': True, 'channel': {'id': channel['id']}}
@@ -0,0 +1,45 @@
+import base64
+import pickle
+
+from machine.models.channel import Channel, PurposeTopic
+from tests.benchmarks.workspace import gen_im
+
+
+def test_from_api_response():
+    channel = Channel.from_api_response(dict(gen_im(1, 'U1'), topic={
+        'value': 'Topic', 'creator': 'U1', 'last_set': 1500000000}))
+    assert channel.is_im
+    assert channel.user == 'U1'
+    assert channel.topic == PurposeTopic(value='Topic', creator='U1', last_set=1500000000)
+    assert channel.purpose is None
+    assert channel.identifier == 'D00000001'
+    assert not hasattr(channel, '__dict__')
+
+
+# A channel pickled with Slack Machine 0.20, before the models had slots
+PICKLED_CHANNEL = base64.b64decode(
+    'gASViAEAAAAAAACMFm1hY2hpbmUubW9kZWxzLmNoYW5uZWyUjAdDaGFubmVslJOUKYGUfZQojAJpZJSMCUMwMDAw'
+    'MDAwMZSMBG5hbWWUjAdnZW5lcmFslIwKaXNfY2hhbm5lbJSIjAdjcmVhdGVklEoAL2hZjAdjcmVhdG9ylIwCVTGU'
+    'jAtpc19hcmNoaXZlZJSJjAppc19nZW5lcmFslIiMD25hbWVfbm9ybWFsaXplZJRoCIwJaXNfc2hhcmVklImMDWlz'
+    'X29yZ19zaGFyZWSUiYwJaXNfbWVtYmVylIiMCmlzX3ByaXZhdGWUiYwHaXNfbXBpbZSJjAhpc19ncm91cJROjAVp'
+    'c19pbZROjAR1c2VylE6MB21lbWJlcnOUTowFdG9waWOUaACMDFB1cnBvc2VUb3BpY5STlCmBlH2UKIwFdmFsdWWU'
+    'jAVUb3BpY5RoC2gMjAhsYXN0X3NldJRKAC9oWXVijAdwdXJwb3NllE6MDnByZXZpb3VzX25hbWVzlF2UjAZyYW5k'
+    'b22UYXViLg=='
+)
+
+
+def test_unpickle_from_before_slots():
+    channel = pickle.loads(PICKLED_CHANNEL)
+    assert channel.id == 'C00000001'
+    assert channel.name == 'general'
+    assert channel.topic == PurposeTopic(value='Topic', creator='U1', last_set=1500000000)
+    assert channel.previous_names == ['random']
+    assert not hasattr(channel, '__dict__')
+    assert pickle.loads(pickle.dumps(channel)) == channel
+
+
+def test_setstate_with_dict_and_slots():
+    topic = PurposeTopic.__new__(PurposeTopic)
+    topic.__setstate__((None, {'value': 'Topic', 'creator': 'U1'}))
+    # Fields missing from the state get their default, or None
+    assert topic == PurposeTopic(value='Topic', creator='U1', last_set=None)
@@ -3,7 +3,8 @@ import inspect
 import pytest
 from blinker import signal
 from machine.plugins.decorators import process, listen_to, respond_to, schedule, on, \
-    required_settings, route
+    required_settings, route, timeout
+from machine.utils.matching import ListenerScope
 
 
 @pytest.fixture(scope='module')
@@ -107,6 +108,25 @@ def route_f():
     return f
 
 
+@pytest.fixture(scope='module')
+def timeout_f():
+    @timeout(soft=1, hard=5)
+    @listen_to(r'hello', re.IGNORECASE)
+    def f(msg):
+        pass
+
+    return f
+
+
+@pytest.fixture(scope='module')
+def timeout_class():
+    @timeout(hard=10)
+    class C:
+        pass
+
+    return C
+
+
 def test_process(process_f):
     assert hasattr(process_f, 'metadata')
     assert 'plugin_actions' in process_f.metadata
@@ -194,3 +214,42 @@ def test_route(route_f):
     assert len(route_f.metadata['plugin_actions']['route']) == 1
     assert route_f.metadata['plugin_actions']['route'][0]['path'] == '/test'
     assert route_f.metadata['plugin_actions']['route'][0]['method'] == 'POST'
+
+
+def test_timeout(timeout_f):
+    assert hasattr(timeout_f, 'metadata')
+    assert timeout_f.metadata['timeout'] == {'soft': 1, 'hard': 5}
+    assert 'listen_to' in timeout_f.metadata['plugin_actions']
+
+
+def test_timeout_for_class(timeout_class):
+    assert inspect.isclass(timeout_class)
+    assert timeout_class.metadata['timeout'] == {'soft': None, 'hard': 10}
+
+
+def test_listen_to_scoped():
+    @listen_to(r'deploy', channels=['#ops', 'C0123456'], thread_only=True)
+    @listen_to(r'hello')
+    def f(msg):
+        pass
+
+    config = f.metadata['plugin_actions']['listen_to']
+    assert config['regex'] == [re.compile(r'hello', re.IGNORECASE),
+                               re.compile(r'deploy', re.IGNORECASE)]
+    assert config['scope'] == [
+        None,
+        ListenerScope(channels=frozenset(['#ops', 'C0123456']), thread_only=True),
+    ]
+
+
+def test_respond_to_scoped():
+    @respond_to(r'hello', dm_only=True)
+    def f(msg):
+        pass
+
+    assert f.metadata['plugin_actions']['respond_to']['scope'] == [ListenerScope(dm_only=True)]
+
+
+def test_invalid_scope():
+    with pytest.raises(ValueError):
+        listen_to(r'hello', channels='general', dm_only=True)
@@ -1,12 +1,20 @@
+import asyncio
 import re
+import threading
+import time
 
 import pytest
 
 from machine.clients.slack import SlackClient
 from machine.dispatch import EventDispatcher
+from machine.models import Channel
 from machine.plugins.base import Message
+from machine.plugins.decorators import timeout
 from machine.storage.backends.base import MachineBaseStorage
 from machine.utils.collections import CaseInsensitiveDict
+from machine.utils.matching import ListenerScope
+from machine.utils.metrics import disable_metrics, enable_metrics
+from machine.utils.watchdog import Timeouts
 from tests.fake_plugins import FakePlugin
 
 
@@ -148,3 +156,369 @@ def test_check_bot_mention_alias(dispatcher):
         assert event is None
     else:
         assert event is None
+
+
+@pytest.fixture
+def pooled_dispatcher(mocker, plugin_actions):
+    mocker.patch('machine.dispatch.LowLevelSlackClient', autospec=True)
+    dispatch_instance = EventDispatcher(plugin_actions, {'WORKER_POOL_SIZE': '2'})
+    mocker.patch.object(dispatch_instance, '_get_bot_id')
+    dispatch_instance._get_bot_id.return_value = '123'
+    mocker.patch.object(dispatch_instance, '_get_bot_name')
+    dispatch_instance._get_bot_name.return_value = 'superbot'
+    yield dispatch_instance
+    dispatch_instance.executor.shutdown()
+
+
+def _wait_for_completed(dispatcher, n):
+    deadline = time.monotonic() + 5
+    while dispatcher.executor.stats()['completed'] < n:
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_handle_event_with_worker_pool(pooled_dispatcher, fake_plugin):
+    msg_event = {'data': {'type': 'message', 'text': 'hi', 'channel': 'C1', 'user': 'user1'}}
+    pooled_dispatcher.handle_message(**msg_event)
+    msg_event = {'data': {'type': 'message', 'text': '<@123> hello', 'channel': 'C1',
+                          'user': 'user1'}}
+    pooled_dispatcher.handle_message(**msg_event)
+    _wait_for_completed(pooled_dispatcher, 2)
+    assert fake_plugin.listen_function.call_count == 1
+    assert fake_plugin.respond_function.call_count == 1
+    _assert_message(fake_plugin.listen_function.call_args, 'hi')
+    _assert_message(fake_plugin.respond_function.call_args, 'hello')
+
+
+def test_no_candidates_are_not_submitted(pooled_dispatcher, fake_plugin):
+    msg_event = {'data': {'type': 'message', 'text': 'bye', 'channel': 'C1', 'user': 'user1'}}
+    pooled_dispatcher.handle_message(**msg_event)
+    assert pooled_dispatcher.executor.stats()['submitted'] == 0
+
+
+def test_register_process_handler(mocker, pooled_dispatcher, fake_plugin):
+    rtm_client = mocker.patch('machine.dispatch.RTMClient')
+    pooled_dispatcher.register_process_handler('some_event', fake_plugin.process_function,
+                                               'tests.fake_plugins.FakePlugin')
+    callback = rtm_client.on.call_args[1]['callback']
+    event = {'type': 'some_event', 'channel': {'id': 'C1'}}
+    callback(data=event)
+    _wait_for_completed(pooled_dispatcher, 1)
+    fake_plugin.process_function.assert_called_once_with(event)
+
+
+def test_ordering_key():
+    assert EventDispatcher._ordering_key({'channel': 'C1'}) == ('C1', None)
+    assert EventDispatcher._ordering_key({'channel': 'C1', 'thread_ts': '1.2'}) == ('C1', '1.2')
+    assert EventDispatcher._ordering_key({'channel': {'id': 'C2'}}) == ('C2', None)
+    assert EventDispatcher._ordering_key({'type': 'team_join'}) == (None, None)
+
+
+@pytest.fixture
+def event_loop_thread():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def test_handle_event_async_listener(mocker, event_loop_thread):
+    mocker.patch('machine.dispatch.LowLevelSlackClient', autospec=True)
+    called = threading.Event()
+    received = []
+
+    async def async_listen_function(msg, **kwargs):
+        await asyncio.sleep(0)
+        received.append(msg.text)
+        called.set()
+
+    plugin_actions = {
+        'listen_to': {
+            'TestPlugin.async_listen_function-hi': {
+                'class': None,
+                'class_name': 'tests.fake_plugins.FakePlugin',
+                'function': async_listen_function,
+                'regex': re.compile('hi', re.IGNORECASE)
+            }
+        },
+        'respond_to': {}
+    }
+    dispatcher = EventDispatcher(plugin_actions)
+    dispatcher._client.loop = event_loop_thread
+    mocker.patch.object(dispatcher, '_get_bot_id').return_value = '123'
+    mocker.patch.object(dispatcher, '_get_bot_name').return_value = 'superbot'
+    msg_event = {'data': {'type': 'message', 'text': 'hi', 'channel': 'C1', 'user': 'user1'}}
+    dispatcher.handle_message(**msg_event)
+    assert called.wait(5)
+    assert received == ['hi']
+
+
+def test_handler_timeouts(mocker):
+    mocker.patch('machine.dispatch.LowLevelSlackClient', autospec=True)
+    dispatcher = EventDispatcher({'listen_to': {}, 'respond_to': {}},
+                                 {'HANDLER_SOFT_TIMEOUT': '1', 'HANDLER_HARD_TIMEOUT': '10'})
+
+    @timeout(hard=5)
+    class TimeoutPlugin:
+        @timeout(soft=2)
+        def with_timeout(self, msg):
+            pass
+
+        def without_timeout(self, msg):
+            pass
+
+    plugin = TimeoutPlugin()
+    assert dispatcher._handler_timeouts(plugin.with_timeout) == Timeouts(soft=2, hard=5)
+    assert dispatcher._handler_timeouts(plugin.without_timeout) == Timeouts(soft=1, hard=5)
+
+    def function(msg):
+        pass
+
+    assert dispatcher._handler_timeouts(function) == Timeouts(soft=1, hard=10)
+
+
+def test_duplicate_events_are_dropped(dispatcher, fake_plugin):
+    msg_event = {'data': {'type': 'message', 'text': 'hi', 'channel': 'C1', 'user': 'user1',
+                          'ts': '1000.1'}}
+    dispatcher.handle_message(**msg_event)
+    dispatcher.handle_message(**msg_event)
+    assert fake_plugin.listen_function.call_count == 1
+    assert dispatcher.duplicates == 1
+    other_channel = {'data': {'type': 'message', 'text': 'hi', 'channel': 'C2', 'user': 'user1',
+                              'ts': '1000.1'}}
+    dispatcher.handle_message(**other_channel)
+    assert fake_plugin.listen_function.call_count == 2
+
+
+def test_duplicate_events_shared(mocker, plugin_actions, fake_plugin, event_loop_thread):
+    mocker.patch('machine.dispatch.LowLevelSlackClient', autospec=True)
+    storage = mocker.patch('machine.dispatch.Storage').get_instance.return_value
+    checked = []
+
+    async def set_if_not_exists_async(key, value, expires):
+        checked.append((key, value, expires))
+        if key.endswith(':1000.2:None'):
+            await asyncio.sleep(0.1)
+        # another instance of the bot has seen the first event already
+        return not key.endswith(':1000.1:None')
+
+    storage.set_if_not_exists_async = set_if_not_exists_async
+    dispatcher = EventDispatcher(plugin_actions, {'EVENT_DEDUP_SHARED': True,
+                                                  'EVENT_DEDUP_WINDOW': '60'})
+    dispatcher._client.loop = event_loop_thread
+    mocker.patch.object(dispatcher, '_get_bot_id').return_value = '123'
+    mocker.patch.object(dispatcher, '_get_bot_name').return_value = 'superbot'
+    received = []
+    fake_plugin.listen_function.side_effect = lambda msg: received.append(msg.text)
+    for ts, text in (('1000.1', 'hi'), ('1000.2', 'hi 2'), ('1000.3', 'hi 3')):
+        dispatcher.handle_message(data={'type': 'message', 'text': text, 'channel': 'C1',
+                                        'user': 'user1', 'ts': ts})
+    deadline = time.monotonic() + 5
+    while dispatcher._shared_dedup_checks:
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+    assert checked[0] == ('machine.dispatch:seen:C1:1000.1:None', b'1', 60)
+    # The slow check of the second event doesn't let the third one overtake it
+    assert received == ['hi 2', 'hi 3']
+    assert dispatcher.duplicates == 1
+
+
+def test_dedup_disabled(mocker, plugin_actions, fake_plugin):
+    mocker.patch('machine.dispatch.LowLevelSlackClient', autospec=True)
+    dispatcher = EventDispatcher(plugin_actions, {'EVENT_DEDUP_CACHE_SIZE': 0})
+    mocker.patch.object(dispatcher, '_get_bot_id').return_value = '123'
+    mocker.patch.object(dispatcher, '_get_bot_name').return_value = 'superbot'
+    msg_event = {'data': {'type': 'message', 'text': 'hi', 'channel': 'C1', 'user': 'user1',
+                          'ts': '1000.1'}}
+    dispatcher.handle_message(**msg_event)
+    dispatcher.handle_message(**msg_event)
+    assert fake_plugin.listen_function.call_count == 2
+
+
+def test_ingestion_queue_priority(mocker, plugin_actions, fake_plugin):
+    mocker.patch('machine.dispatch.LowLevelSlackClient', autospec=True)
+    dispatcher = EventDispatcher(plugin_actions, {'INGESTION_QUEUE_SIZE': '10'})
+    mocker.patch.object(dispatcher, '_get_bot_id').return_value = '123'
+    mocker.patch.object(dispatcher, '_get_bot_name').return_value = 'superbot'
+    calls = []
+    fake_plugin.listen_function.side_effect = lambda msg: calls.append('listen')
+    fake_plugin.respond_function.side_effect = lambda msg: calls.append('respond')
+    dispatcher.handle_message(data={'type': 'message', 'text': 'hi', 'channel': 'C1',
+                                    'user': 'user1'})
+    dispatcher.handle_message(data={'type': 'message', 'text': '<@123> hello', 'channel': 'C1',
+                                    'user': 'user1'})
+    assert calls == []
+    assert len(dispatcher.ingestion_queue) == 2
+    dispatcher._start_ingestion()
+    deadline = time.monotonic() + 5
+    while len(calls) < 2:
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+    assert calls == ['respond', 'listen']
+    stats = dispatcher.ingestion_queue.stats()
+    assert stats['enqueued_high'] == 1
+    assert stats['enqueued_low'] == 1
+
+
+def test_handler_metrics(mocker, plugin_actions, fake_plugin):
+    mocker.patch('machine.dispatch.LowLevelSlackClient', autospec=True)
+    metrics = enable_metrics()
+    try:
+        dispatcher = EventDispatcher(plugin_actions, {'WORKER_POOL_SIZE': 1})
+    finally:
+        disable_metrics()
+    mocker.patch.object(dispatcher, '_get_bot_id').return_value = '123'
+    mocker.patch.object(dispatcher, '_get_bot_name').return_value = 'superbot'
+    # The executor is only needed for its metrics, handlers run right away
+    dispatcher._executor.shutdown()
+    dispatcher._executor = None
+    fake_plugin.listen_function.side_effect = ValueError("boom")
+    with pytest.raises(ValueError):
+        dispatcher.handle_message(data={'type': 'message', 'text': 'hi', 'channel': 'C1',
+                                        'user': 'user1'})
+    dispatcher.handle_message(data={'type': 'message', 'text': '<@123> hello', 'channel': 'C1',
+                                    'user': 'user1'})
+    labels = ('tests.fake_plugins.FakePlugin', 'listen_function', 'listen_to')
+    assert metrics.events_received.value('message') == 2
+    assert metrics.handler_duration.count(*labels) == 1
+    assert metrics.handler_errors.value(*labels) == 1
+    respond_labels = ('tests.fake_plugins.FakePlugin', 'respond_function', 'respond_to')
+    assert metrics.handler_duration.count(*respond_labels) == 1
+    assert metrics.handler_errors.value(*respond_labels) == 0
+    rendered = metrics.render()
+    assert 'machine_dedup_duplicates 0' in rendered
+    assert 'machine_executor_max_workers 1' in rendered
+    assert 'machine_watchdog_running 0' in rendered
+
+
+def test_message_is_shared_by_listeners(mocker, fake_plugin):
+    mocker.patch('machine.dispatch.LowLevelSlackClient', autospec=True)
+    listen_fn = getattr(fake_plugin, 'listen_function')
+    plugin_actions = {
+        'listen_to': {
+            'FakePlugin.listen_function-hi': {
+                'class': fake_plugin,
+                'class_name': 'tests.fake_plugins.FakePlugin',
+                'function': listen_fn,
+                'regex': re.compile('hi', re.IGNORECASE)
+            },
+            'OtherPlugin.listen_function-hi': {
+                'class': fake_plugin,
+                'class_name': 'tests.fake_plugins.OtherPlugin',
+                'function': listen_fn,
+                'regex': re.compile('hi', re.IGNORECASE)
+            },
+        },
+        'respond_to': {},
+    }
+    dispatcher = EventDispatcher(plugin_actions)
+    mocker.patch.object(dispatcher, '_get_bot_id').return_value = '123'
+    mocker.patch.object(dispatcher, '_get_bot_name').return_value = 'superbot'
+    users = mocker.patch.object(SlackClient, 'users', new_callable=mocker.PropertyMock)
+    users.return_value = {'user1': mocker.sentinel.user1}
+    fake_plugin.listen_function.side_effect = lambda msg: msg.sender
+    dispatcher.handle_message(data={'type': 'message', 'text': 'hi', 'channel': 'C1',
+                                    'user': 'user1'})
+    first, second = [args[0] for args, _ in fake_plugin.listen_function.call_args_list]
+    assert first._fq_plugin_name == 'tests.fake_plugins.FakePlugin'
+    assert second._fq_plugin_name == 'tests.fake_plugins.OtherPlugin'
+    assert first._msg_event is second._msg_event
+    assert first._client is second._client
+    assert first.sender is second.sender is mocker.sentinel.user1
+    # The sender was looked up once, and reused by the second listener
+    assert users.call_count == 1
+    with pytest.raises(AttributeError):
+        first.some_attribute = 'value'
+
+
+def test_message_async_doesnt_block_on_lookups(mocker, msg_client):
+    calls = []
+
+    async def record(name, *args, **kwargs):
+        calls.append((name, args, kwargs))
+
+    async def fetch_user_async(user_id):
+        return mocker.sentinel.user1
+
+    msg_client.send_async = lambda *args, **kwargs: record('send', *args, **kwargs)
+    msg_client.react_async = lambda *args, **kwargs: record('react', *args, **kwargs)
+    msg_client.fetch_user_async = fetch_user_async
+    msg = Message(msg_client, {'type': 'message', 'text': 'hi', 'channel': 'C1', 'user': 'user1',
+                               'ts': '1'}, 'tests.fake_plugins.FakePlugin')
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(msg.reply_async('hello'))
+        loop.run_until_complete(msg.react_async('wave'))
+        # Replies only need the ids of the sender and channel, which are in the event
+        assert calls == [
+            ('send', ('C1',), {'text': '<@user1>: hello', 'attachments': None, 'blocks': None,
+                               'thread_ts': None, 'ephemeral_user': None}),
+            ('react', ('C1', '1', 'wave'), {}),
+        ]
+        assert loop.run_until_complete(msg.sender_async()) is mocker.sentinel.user1
+    finally:
+        loop.close()
+    msg_client.fetch_user.assert_not_called()
+    msg_client.fetch_channel.assert_not_called()
+
+
+def test_scoped_listeners(mocker, fake_plugin):
+    mocker.patch('machine.dispatch.LowLevelSlackClient', autospec=True)
+    dispatcher = EventDispatcher({'listen_to': {}, 'respond_to': {}})
+    mocker.patch.object(dispatcher, '_get_bot_id').return_value = '123'
+    mocker.patch.object(dispatcher, '_get_bot_name').return_value = 'superbot'
+    dispatcher.register_listener('listen_to', 'FakePlugin.listen_function-hi', {
+        'class': fake_plugin,
+        'class_name': 'tests.fake_plugins.FakePlugin',
+        'function': fake_plugin.listen_function,
+        'regex': re.compile('hi', re.IGNORECASE),
+        'scope': ListenerScope(channels=frozenset(['ops']))
+    })
+    # The dispatcher learns about channel names from the Slack client
+    update_channel = dispatcher._client.add_channel_handler.call_args[0][0]
+    ops = mocker.MagicMock(spec=Channel)
+    ops.name = 'ops'
+    dispatcher.handle_message(data={'type': 'message', 'text': 'hi', 'channel': 'C1',
+                                    'user': 'user1'})
+    assert fake_plugin.listen_function.call_count == 0
+    update_channel('C1', ops)
+    dispatcher.handle_message(data={'type': 'message', 'text': 'hi', 'channel': 'C1',
+                                    'user': 'user1'})
+    dispatcher.handle_message(data={'type': 'message', 'text': 'hi', 'channel': 'C2',
+                                    'user': 'user1'})
+    assert fake_plugin.listen_function.call_count == 1
+    update_channel('C1', None)
+    dispatcher.handle_message(data={'type': 'message', 'text': 'hi', 'channel': 'C1',
+                                    'user': 'user1'})
+    assert fake_plugin.listen_function.call_count == 1
+
+
+def test_scoped_listener_added_late(mocker, fake_plugin):
+    mocker.patch('machine.dispatch.LowLevelSlackClient', autospec=True)
+    dispatcher = EventDispatcher({'listen_to': {}, 'respond_to': {}})
+    mocker.patch.object(dispatcher, '_get_bot_id').return_value = '123'
+    mocker.patch.object(dispatcher, '_get_bot_name').return_value = 'superbot'
+    # The channels are known already, the listener finds its channel through the Slack client
+    channel = mocker.MagicMock(spec=Channel)
+    channel.id = 'C1'
+    channel.name = None
+    dispatcher._client.find_channel_by_name.return_value = channel
+    listener = {
+        'class': fake_plugin,
+        'class_name': 'tests.fake_plugins.FakePlugin',
+        'function': fake_plugin.listen_function,
+        'regex': re.compile('hi', re.IGNORECASE),
+        'scope': ListenerScope(channels=frozenset(['ops']))
+    }
+    dispatcher.register_listener('listen_to', 'FakePlugin.listen_function-hi', listener)
+    dispatcher.handle_message(data={'type': 'message', 'text': 'hi', 'channel': 'C1',
+                                    'user': 'user1'})
+    assert fake_plugin.listen_function.call_count == 0
+    channel.name = 'ops'
+    dispatcher.register_listener('listen_to', 'FakePlugin.listen_function-hi', listener)
+    dispatcher.handle_message(data={'type': 'message', 'text': 'hi', 'channel': 'C1',
+                                    'user': 'user1'})
+    assert fake_plugin.listen_function.call_count == 1
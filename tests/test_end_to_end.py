@@ -0,0 +1,320 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from slack.errors import SlackApiError
+from slack.rtm.client import RTMClient
+from slack.web.client import WebClient
+
+from machine.clients.singletons.slack import LowLevelSlackClient
+from machine.dispatch import EventDispatcher
+from machine.utils import Singleton
+from machine.utils.collections import CaseInsensitiveDict
+from tests.benchmarks.workspace import BOT_ID
+from tests.fake_slack import FakeSlackServer
+
+
+@pytest.fixture
+def rtm_callbacks():
+    callbacks = RTMClient._callbacks
+    RTMClient._callbacks = type(callbacks)(list)
+    yield RTMClient._callbacks
+    RTMClient._callbacks = callbacks
+
+
+@pytest.fixture
+def server():
+    with FakeSlackServer.with_workspace(25, 10, n_ims=5, page_size=4) as server:
+        yield server
+
+
+@pytest.fixture
+def client(mocker, server, rtm_callbacks):
+    settings = CaseInsensitiveDict({'SLACK_API_TOKEN': 'xoxb-abc123',
+                                    'SLACK_API_BASE_URL': server.base_url})
+    mocker.patch('machine.clients.singletons.slack.import_settings',
+                 return_value=(settings, True))
+    Singleton._instances.pop(LowLevelSlackClient, None)
+    client = LowLevelSlackClient()
+    yield client
+    client.loop.close()
+    Singleton._instances.pop(LowLevelSlackClient, None)
+
+
+def test_connect_and_load_workspace(server, client):
+    events = []
+
+    def on_hello(**payload):
+        server.send_event({'type': 'user_typing', 'channel': 'C00000001', 'user': 'U00000001'})
+
+    async def on_typing(**payload):
+        # Events are handled while the workspace is still being loaded
+        events.append(payload['data'])
+        await asyncio.wait_for(client._bootstrap_task, 10)
+        client.rtm_client.stop()
+
+    RTMClient.on(event='hello', callback=on_hello)
+    RTMClient.on(event='user_typing', callback=on_typing)
+    client.start()
+
+    assert client.bot_info['id'] == BOT_ID
+    # All pages are fetched
+    assert len(client.users) == 25
+    assert len(client.channels) == 15
+    assert server.calls['users.list'] == 7
+    # Every conversation type is paginated separately
+    assert server.calls['conversations.list'] == 7
+    assert set(client.bootstrap_timings) == {'users', 'public_channel', 'private_channel',
+                                             'mpim', 'im', 'total'}
+    assert client.bootstrapped.is_set()
+    # DMs to users with an open DM channel don't need an im.open call
+    assert client.dm_channel_id('U00000001') == 'D00000001'
+    assert events == [{'channel': 'C00000001', 'user': 'U00000001'}]
+
+
+def test_handlers_registered_once(mocker, client, rtm_callbacks):
+    mocker.patch.object(client.rtm_client, 'start')
+    dispatcher = EventDispatcher({'listen_to': {}, 'respond_to': {}})
+    # Like Machine.run, which sets up the dispatcher and then starts the client
+    dispatcher.start()
+    client.register_handlers()
+    for event, callbacks in rtm_callbacks.items():
+        assert len(callbacks) == len(set(callbacks)), event
+    assert rtm_callbacks['open'] == [client._on_open]
+    assert rtm_callbacks['message'] == [dispatcher.handle_message]
+    dispatcher.watchdog.stop()
+
+
+def test_bootstrap_concurrently(server, client):
+    server.latency = 0.1
+    client.loop.run_until_complete(client.bootstrap())
+    assert len(client.users) == 25
+    assert len(client.channels) == 15
+    timings = client.bootstrap_timings
+    # The 7 pages of users take longest, the conversations are loaded meanwhile
+    assert timings['users'] >= 0.7
+    assert timings['total'] < timings['users'] + timings['public_channel']
+
+
+def _snapshot_client(mocker, server, snapshot_file):
+    settings = CaseInsensitiveDict({'SLACK_API_TOKEN': 'xoxb-abc123',
+                                    'SLACK_API_BASE_URL': server.base_url,
+                                    'CACHE_SNAPSHOT_FILE': snapshot_file})
+    mocker.patch('machine.clients.singletons.slack.import_settings',
+                 return_value=(settings, True))
+    Singleton._instances.pop(LowLevelSlackClient, None)
+    return LowLevelSlackClient()
+
+
+def test_warm_start(mocker, server, tmp_path):
+    snapshot_file = str(tmp_path / 'snapshot')
+    client = _snapshot_client(mocker, server, snapshot_file)
+    assert not client.load_snapshot()
+    client.loop.run_until_complete(client.bootstrap())
+    client.loop.close()
+
+    # While the bot was down, a user changed and a channel was deleted
+    changed = dict(server.users[0], updated=server.users[0]['updated'] + 1, real_name='New')
+    server.users[0] = changed
+    deleted = server.channels.pop(0)
+
+    client = _snapshot_client(mocker, server, snapshot_file)
+    handler = mocker.MagicMock()
+    client.add_channel_handler(handler)
+    assert client.load_snapshot()
+    assert len(client.users) == 25
+    assert len(client.channels) == 15
+    assert handler.call_count == 15
+    assert server.calls['users.list'] == 7
+
+    unchanged = client.users[server.users[1]['id']]
+    handler.reset_mock()
+    client.loop.run_until_complete(client.bootstrap())
+    assert client.users[changed['id']].real_name == 'New'
+    assert client.users[server.users[1]['id']] is unchanged
+    assert deleted['id'] not in client.channels
+    # Only the deleted channel changed
+    handler.assert_called_once_with(deleted['id'], None)
+    client.loop.close()
+    Singleton._instances.pop(LowLevelSlackClient, None)
+
+
+def test_snapshot_loaded_off_event_loop(mocker, server, tmp_path):
+    snapshot_file = str(tmp_path / 'snapshot')
+    client = _snapshot_client(mocker, server, snapshot_file)
+    client.loop.run_until_complete(client.bootstrap())
+    client.loop.close()
+
+    client = _snapshot_client(mocker, server, snapshot_file)
+    read_snapshot = client._read_snapshot
+    threads = []
+
+    def _read_snapshot():
+        threads.append(threading.current_thread())
+        return read_snapshot()
+
+    async def bootstrap():
+        pass
+
+    client._read_snapshot = _read_snapshot
+    client.bootstrap = bootstrap
+    client.loop.run_until_complete(client._on_open(data={'self': {'id': 'U0'}}))
+    assert threads and threads[0] is not threading.current_thread()
+    assert len(client.users) == 25
+    assert len(client.channels) == 15
+    client.loop.run_until_complete(client._bootstrap_task)
+    client.loop.close()
+    Singleton._instances.pop(LowLevelSlackClient, None)
+
+
+def test_lazy_caches(mocker, server):
+    settings = CaseInsensitiveDict({'SLACK_API_TOKEN': 'xoxb-abc123',
+                                    'SLACK_API_BASE_URL': server.base_url,
+                                    'LAZY_USER_CACHE': True, 'LAZY_CHANNEL_CACHE': True,
+                                    'USER_CACHE_SIZE': 2})
+    mocker.patch('machine.clients.singletons.slack.import_settings',
+                 return_value=(settings, True))
+    Singleton._instances.pop(LowLevelSlackClient, None)
+    client = LowLevelSlackClient()
+    handler = mocker.MagicMock()
+    client.add_channel_handler(handler)
+    try:
+        client.loop.run_until_complete(client.bootstrap())
+        assert server.calls['users.list'] == server.calls['conversations.list'] == 0
+        assert client.users['U00000003'].id == 'U00000003'
+        assert client.users.get('U404') is None
+        assert client.fetch_user('U00000003') is client.users['U00000003']
+        assert server.calls['users.info'] == 2
+
+        channel = client.channels['D00000001']
+        handler.assert_called_once_with('D00000001', channel)
+        assert client.dm_channel_id(channel.user) == 'D00000001'
+        client._on_channel_deleted(data={'channel': 'C404'})
+
+        client._prefetch(data={'type': 'message', 'user': 'U00000004', 'channel': 'C00000001'})
+        client._prefetch(data={'type': 'message', 'user': 'U00000004', 'channel': 'C00000001'})
+        deadline = time.monotonic() + 5
+        while not client.channels.is_cached('C00000001') and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert client.users.is_cached('U00000004')
+        assert client.channels.is_cached('C00000001')
+        assert server.calls['users.info'] == 3
+        # The least recently used user is evicted
+        client.users['U00000005']
+        assert list(client.users) == ['U00000004', 'U00000005']
+        assert server.calls['conversations.info'] == 2
+    finally:
+        client.loop.close()
+        Singleton._instances.pop(LowLevelSlackClient, None)
+
+
+def test_membership_index(mocker, server):
+    settings = CaseInsensitiveDict({'SLACK_API_TOKEN': 'xoxb-abc123',
+                                    'SLACK_API_BASE_URL': server.base_url,
+                                    'CHANNEL_MEMBERSHIP_INDEX': True})
+    mocker.patch('machine.clients.singletons.slack.import_settings',
+                 return_value=(settings, True))
+    Singleton._instances.pop(LowLevelSlackClient, None)
+    client = LowLevelSlackClient()
+    client._bot_info = {'id': BOT_ID}
+    try:
+        client.loop.run_until_complete(client.bootstrap())
+        # The members of every channel are paginated separately, DMs don't need calls
+        pages = sum(-(-len(members) // 4) for members in server.members.values())
+        assert server.calls['conversations.members'] == pages
+        assert client.channel_members('C00000000') == server.members['C00000000']
+        assert sorted(client.user_channels('U00000000')) == ['C00000000', 'C00000003',
+                                                             'C00000006', 'C00000009',
+                                                             'D00000000']
+        assert client.channel_members('D00000001') == [BOT_ID, 'U00000001']
+        assert 'members' in client.bootstrap_timings
+
+        client._on_member_joined_channel(data={'user': 'U00000000', 'channel': 'C00000001'})
+        client._on_member_left_channel(data={'user': 'U00000000', 'channel': 'C00000003'})
+        assert sorted(client.user_channels('U00000000')) == ['C00000000', 'C00000001',
+                                                             'C00000006', 'C00000009',
+                                                             'D00000000']
+        client._on_channel_deleted(data={'channel': 'C00000000'})
+        assert 'C00000000' not in client.user_channels('U00000000')
+        assert server.calls['conversations.members'] == pages
+
+        # When the bot joins a channel, its members are loaded
+        server.members['C00000042'] = [BOT_ID, 'U00000042']
+        client._on_member_joined_channel(data={'user': BOT_ID, 'channel': 'C00000042'})
+        client.loop.run_until_complete(asyncio.sleep(0.2))
+        assert client.channel_members('C00000042') == [BOT_ID, 'U00000042']
+        client._on_channel_left(data={'channel': 'C00000042'})
+        assert client.user_channels('U00000042') == []
+
+        # Joining results in two events, the members are loaded once
+        calls = server.calls['conversations.members']
+        joined = {'id': 'C00000042', 'name': 'joined', 'created': 1500000000, 'is_channel': True}
+        client._on_channel_joined(data={'channel': joined})
+        client._on_member_joined_channel(data={'user': BOT_ID, 'channel': 'C00000042'})
+        client.loop.run_until_complete(asyncio.sleep(0.2))
+        client._on_member_joined_channel(data={'user': BOT_ID, 'channel': 'C00000042'})
+        assert server.calls['conversations.members'] == calls + 1
+        assert client.channel_members('C00000042') == [BOT_ID, 'U00000042']
+        # With the members in the event, they replace the indexed members without loading them
+        client._on_channel_left(data={'channel': 'C00000042'})
+        client._on_member_joined_channel(data={'user': 'U00000043', 'channel': 'C00000042'})
+        client._on_channel_joined(data={'channel': dict(joined, members=[BOT_ID, 'U00000044'])})
+        client._on_member_joined_channel(data={'user': BOT_ID, 'channel': 'C00000042'})
+        client.loop.run_until_complete(asyncio.sleep(0.2))
+        assert server.calls['conversations.members'] == calls + 1
+        assert sorted(client.channel_members('C00000042')) == sorted([BOT_ID, 'U00000044'])
+    finally:
+        client.loop.close()
+        Singleton._instances.pop(LowLevelSlackClient, None)
+
+
+def test_fetch_uncached(server, client):
+    user = client.fetch_user('U00000003')
+    assert client.users == {'U00000003': user}
+    channel = client.fetch_channel('D00000001')
+    assert client.channels == {'D00000001': channel}
+    assert client.dm_channel_id(channel.user) == 'D00000001'
+    client.fetch_user('U00000003')
+    assert server.calls['users.info'] == 1
+    with pytest.raises(SlackApiError):
+        client.fetch_channel('C404')
+
+
+def test_reconnect(server, client):
+    async def on_hello(**payload):
+        if server.connections == 1:
+            server.disconnect()
+        else:
+            await asyncio.wait_for(client._bootstrap_task, 10)
+            client.rtm_client.stop()
+
+    RTMClient.on(event='hello', callback=on_hello)
+    client.start()
+    assert server.connections == 2
+    assert server.calls['rtm.connect'] == 2
+
+
+def test_rate_limit(server):
+    server.rate_limits['chat.postMessage'] = 1
+    server.retry_after = 7
+    # Both calls fall in the same one second window of the server
+    server.clock = lambda: 1000.0
+    web_client = WebClient(token='xoxb-abc123', base_url=server.base_url)
+    assert web_client.chat_postMessage(channel='C00000001', text="hi")['ts']
+    with pytest.raises(SlackApiError) as exc_info:
+        web_client.chat_postMessage(channel='C00000001', text="hi again")
+    assert exc_info.value.response.status_code == 429
+    assert exc_info.value.response.headers['Retry-After'] == '7'
+    assert server.rate_limited['chat.postMessage'] == 1
+    assert len(server.posted_messages) == 1
+    # The next window starts over
+    server.clock = lambda: 1001.0
+    assert web_client.chat_postMessage(channel='C00000001', text="hi again")['ts']
+
+
+def test_im_open(server):
+    web_client = WebClient(token='xoxb-abc123', base_url=server.base_url)
+    assert web_client.im_open(user='U00000001')['channel']['id'] == 'D00000001'
+    assert web_client.im_open(user='U00000024')['channel']['id'] == 'DU00000024'
+    assert web_client.reactions_add(name='thumbsup', channel='C00000001', timestamp='1')['ok']
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from machine.utils.executor import KeyedExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = KeyedExecutor(max_workers=4, max_queue_size=100)
+    yield executor
+    executor.shutdown()
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_order_per_key(executor):
+    results = {'a': [], 'b': []}
+
+    def work(key, i):
+        time.sleep(0.001)
+        results[key].append(i)
+
+    for i in range(20):
+        executor.submit('a', work, 'a', i)
+        executor.submit('b', work, 'b', i)
+    _wait_for(lambda: executor.stats()['completed'] == 40)
+    assert results == {'a': list(range(20)), 'b': list(range(20))}
+
+
+def test_different_keys_run_concurrently(executor):
+    barrier = threading.Barrier(2, timeout=5)
+    executor.submit('a', barrier.wait)
+    executor.submit('b', barrier.wait)
+    _wait_for(lambda: executor.stats()['completed'] == 2)
+    assert executor.stats()['failed'] == 0
+
+
+def test_failures_are_counted_and_dont_block_key(executor):
+    results = []
+
+    def fail():
+        raise ValueError("boom")
+
+    executor.submit('a', fail)
+    executor.submit('a', results.append, 1)
+    _wait_for(lambda: executor.stats()['completed'] == 2)
+    assert results == [1]
+    assert executor.stats()['failed'] == 1
+
+
+def test_stats(executor):
+    release = threading.Event()
+    executor.submit('a', release.wait)
+    executor.submit('a', release.wait)
+    executor.submit('a', release.wait)
+    _wait_for(lambda: executor.stats()['queue_depth'] == 2)
+    stats = executor.stats()
+    assert stats['active_keys'] == 1
+    assert stats['submitted'] == 3
+    assert stats['max_queue_depth'] >= 2
+    release.set()
+    _wait_for(lambda: executor.stats()['completed'] == 3)
+    stats = executor.stats()
+    assert stats['queue_depth'] == 0
+    assert stats['active_keys'] == 0
+    assert stats['max_wait'] >= stats['avg_wait'] > 0
+
+
+def test_bounded_queue_rejects_without_blocking():
+    executor = KeyedExecutor(max_workers=1, max_queue_size=1)
+    release = threading.Event()
+    assert executor.submit('a', release.wait)
+    _wait_for(lambda: executor.stats()['queue_depth'] == 0)
+    assert executor.submit('a', release.wait)
+    ticks = []
+
+    loop = asyncio.new_event_loop()
+
+    async def saturate():
+        loop.call_soon(ticks.append, 'tick')
+        # Submitting to the full executor doesn't block the event loop
+        rejected = [executor.submit('b', lambda: None) for _ in range(3)]
+        await asyncio.sleep(0)
+        return rejected
+
+    assert loop.run_until_complete(asyncio.wait_for(saturate(), 1)) == [False, False, False]
+    loop.close()
+    assert ticks == ['tick']
+    assert executor.stats()['rejected'] == 3
+    release.set()
+    _wait_for(lambda: executor.stats()['completed'] == 2)
+    assert executor.submit('a', lambda: None)
+    executor.shutdown()
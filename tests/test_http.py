@@ -0,0 +1,105 @@
+import asyncio
+import io
+
+import pytest
+
+from machine.clients.singletons.http import HTTPClient, PooledSession
+from machine.clients.singletons.slack import PooledWebClient
+from machine.plugins.base import MachineBasePlugin
+from machine.utils import Singleton
+from machine.utils.metrics import disable_metrics, enable_metrics
+from tests.fake_slack import FakeSlackServer
+
+
+@pytest.fixture
+def server():
+    with FakeSlackServer() as server:
+        yield server
+
+
+@pytest.fixture
+def http(mocker):
+    mocker.patch('machine.clients.singletons.http.import_settings',
+                 return_value=({'HTTP_POOL_SIZE': 2, 'HTTP_TIMEOUT': 5}, None))
+    Singleton._instances.pop(HTTPClient, None)
+    http = HTTPClient.get_instance()
+    yield http
+    http.close()
+    Singleton._instances.pop(HTTPClient, None)
+
+
+def test_pooled_session_reuses_connections(server):
+    metrics = enable_metrics()
+    try:
+        session = PooledSession(pool_size=2, timeout=5, metrics=metrics)
+        for _ in range(3):
+            assert session.post(server.base_url + 'reactions.add').json()['ok']
+        stats = session.stats()
+        assert stats == {'pools': 1, 'connections_opened': 1, 'requests': 3,
+                         'idle_connections': 1}
+        assert metrics.http_duration.count('127.0.0.1') == 3
+        session.close()
+    finally:
+        disable_metrics()
+
+
+def test_pooled_session_default_timeout(mocker):
+    session = PooledSession(timeout=5)
+    send = mocker.patch('requests.Session.request')
+    session.get('http://example.com/')
+    assert send.call_args[1]['timeout'] == 5
+    session.get('http://example.com/', timeout=1)
+    assert send.call_args[1]['timeout'] == 1
+
+
+def test_http_client_settings(http):
+    assert http.timeout == 5
+    assert http.session.timeout == 5
+    assert http.stats()['async_connections'] == 0
+
+
+def test_pooled_web_client(server, http):
+    client = PooledWebClient(token='xoxb-abc', base_url=server.base_url, http=http)
+    for i in range(3):
+        assert client.chat_postMessage(channel='C1', text=str(i))['ts']
+    assert client.reactions_add(name='thumbsup', channel='C1', timestamp='1')['ok']
+    assert [m['text'] for _, m in server.posted_messages] == ['0', '1', '2']
+    stats = http.stats()
+    assert stats['connections_opened'] == 1
+    assert stats['requests'] == 4
+
+
+def test_pooled_web_client_upload(mocker, http):
+    post = mocker.patch.object(http.session, 'post')
+    post.return_value.status_code = 200
+    post.return_value.text = '{"ok": true}'
+    client = PooledWebClient(token='xoxb-abc', http=http)
+    client.files_upload(file=io.BytesIO(b'data'), filename='data.txt', channels='C1')
+    kwargs = post.call_args[1]
+    assert kwargs['files']['file'][0] == 'data.txt'
+    assert kwargs['data'] == {'filename': 'data.txt', 'channels': 'C1'}
+    assert 'content-type' not in {k.lower() for k in kwargs['headers']}
+
+
+def test_pooled_async_web_client(server, http):
+    loop = asyncio.new_event_loop()
+    client = PooledWebClient(token='xoxb-abc', base_url=server.base_url, http=http,
+                             run_async=True, loop=loop)
+
+    async def post():
+        for i in range(3):
+            await client.chat_postMessage(channel='C1', text=str(i))
+        return http.aiohttp_session()
+
+    session = loop.run_until_complete(post())
+    assert len(server.posted_messages) == 3
+    assert client.session is session
+    assert http.stats()['async_idle_connections'] == 1
+    http.close()
+    assert session.closed
+    loop.close()
+
+
+def test_plugin_http(http, mocker):
+    plugin = MachineBasePlugin(mocker.MagicMock(), {}, mocker.MagicMock())
+    assert plugin.http is http.session
@@ -0,0 +1,272 @@
+import asyncio
+
+import pytest
+from slack.errors import SlackApiError
+
+from machine.clients.singletons.slack import LowLevelSlackClient, SNAPSHOT_STORAGE_KEY
+from machine.storage.backends.memory import MemoryStorage
+from machine.utils import Singleton
+from machine.utils.collections import CaseInsensitiveDict, LoadingCache
+from machine.utils.snapshot import load_snapshot
+
+
+def _channel(channel_id, name, **kwargs):
+    channel = {
+        'id': channel_id,
+        'name': name,
+        'is_channel': True,
+        'created': 1500000000,
+        'creator': 'U1',
+        'is_archived': False,
+        'is_general': False,
+        'name_normalized': name,
+        'is_shared': False,
+        'is_org_shared': False,
+        'is_member': True,
+        'is_private': False,
+        'is_mpim': False,
+        'is_group': False,
+        'is_im': False,
+        'user': None,
+        'members': None,
+        'topic': None,
+        'purpose': None,
+        'previous_names': [],
+    }
+    channel.update(kwargs)
+    return channel
+
+
+def _user(user_id, name, display_name='', real_name='', email=None, **kwargs):
+    user = {
+        'id': user_id,
+        'team_id': 'T1',
+        'name': name,
+        'deleted': False,
+        'real_name': real_name,
+        'profile': {
+            'avatar_hash': 'abc',
+            'status_text': None,
+            'status_emoji': None,
+            'status_expiration': None,
+            'real_name': real_name,
+            'display_name': display_name,
+            'real_name_normalized': real_name,
+            'display_name_normalized': display_name,
+            'email': email,
+            'image_24': None,
+            'image_32': None,
+            'image_48': None,
+            'image_72': None,
+            'image_192': None,
+            'image_512': None,
+            'team': 'T1',
+        },
+        'is_bot': False,
+        'updated': 1500000000,
+        'is_app_user': False,
+    }
+    user.update(kwargs)
+    return user
+
+
+@pytest.fixture
+def client(mocker):
+    settings = CaseInsensitiveDict({'SLACK_API_TOKEN': 'xoxb-abc123'})
+    mocker.patch('machine.clients.singletons.slack.import_settings',
+                 return_value=(settings, True))
+    Singleton._instances.pop(LowLevelSlackClient, None)
+    client = LowLevelSlackClient()
+    yield client
+    client.loop.close()
+    Singleton._instances.pop(LowLevelSlackClient, None)
+
+
+def test_channel_handlers(mocker, client):
+    handler = mocker.MagicMock()
+    client.add_channel_handler(handler)
+    channel = client._register_channel(_channel('C1', 'general'))
+    handler.assert_called_once_with('C1', channel)
+
+    handler.reset_mock()
+    client._on_channel_deleted(data={'channel': 'C1'})
+    handler.assert_called_once_with('C1', None)
+    assert 'C1' not in client.channels
+
+
+def test_dm_channel_cache(client):
+    client._register_channel(_channel('D1', None, is_channel=False, is_im=True, user='U1'))
+    assert client.dm_channel_id('U1') == 'D1'
+    assert client.dm_channel_id('U2') is None
+    client.register_dm_channel('U2', 'D2')
+    assert client.dm_channel_id('U2') == 'D2'
+    # Closing a DM doesn't change its id
+    client._on_channel_deleted(data={'channel': 'D1'})
+    assert client.dm_channel_id('U1') == 'D1'
+
+
+def test_dm_channel_cache_persisted(mocker, client):
+    storage = MemoryStorage({})
+    mocker.patch('machine.clients.singletons.slack.Storage.get_instance', return_value=storage)
+    client._persist_dm_channels = True
+    client.register_dm_channel('U1', 'D1')
+    assert storage.get('machine.slack:dm_channel:U1') == b'D1'
+    client._dm_channels.clear()
+    assert client.dm_channel_id('U1') == 'D1'
+    client._dm_channels.clear()
+    assert client.loop.run_until_complete(client.dm_channel_id_async('U1')) == 'D1'
+    client.loop.run_until_complete(client.register_dm_channel_async('U2', 'D2'))
+    assert storage.get('machine.slack:dm_channel:U2') == b'D2'
+
+
+def test_snapshot_on_change(mocker, client):
+    storage = MemoryStorage({})
+    mocker.patch('machine.clients.singletons.slack.Storage.get_instance', return_value=storage)
+    client._snapshot_storage = True
+    client._snapshot_delay = 0
+    client.bootstrapped.set()
+    client._register_channel(_channel('C1', 'general'))
+    client._register_channel(_channel('C2', 'random'))
+    client.loop.run_until_complete(asyncio.sleep(0.1))
+    snapshot = load_snapshot(storage.get(SNAPSHOT_STORAGE_KEY))
+    assert [c.id for c in snapshot.channels] == ['C1', 'C2']
+
+
+def test_find_channel_by_name(client):
+    general = client._register_channel(_channel('C1', 'General'))
+    client._register_channel(_channel('D1', None, is_channel=False, is_im=True, user='U1',
+                                      name_normalized=None))
+    assert client.find_channel_by_name('general') is general
+    assert client.find_channel_by_name('#GENERAL') is general
+    assert client.find_channel_by_name('random') is None
+
+    renamed = client._register_channel(_channel('C1', 'announcements',
+                                                previous_names=['general']))
+    assert client.find_channel_by_name('announcements') is renamed
+    assert client.find_channel_by_name('general') is renamed
+    # A channel that has the name now wins over one that had it before
+    new_general = client._register_channel(_channel('C2', 'general'))
+    assert client.find_channel_by_name('general') is new_general
+
+    client._on_channel_deleted(data={'channel': 'C2'})
+    assert client.find_channel_by_name('general') is renamed
+    client._on_channel_deleted(data={'channel': 'C1'})
+    assert client.find_channel_by_name('announcements') is None
+    assert client.find_channel_by_name('general') is None
+
+
+def test_find_user(client):
+    alice = client._register_user(_user('U1', 'alice', 'Ali', 'Alice Smith', 'Alice@example.com'))
+    bob = client._register_user(_user('U2', 'bob', 'alice', 'Bob Jones', 'bob@example.com'))
+    assert client.find_user_by_email('alice@EXAMPLE.com') is alice
+    assert client.find_user_by_email('carol@example.com') is None
+    # A username wins over a display name, which wins over a real name
+    assert client.find_user_by_name('@Alice') is alice
+    assert client.find_users_by_name('alice') == [alice, bob]
+    assert client.find_user_by_name('bob jones') is bob
+    assert client.find_user_by_name('ali') is alice
+
+    client._on_user_change(data={'user': _user('U1', 'alice2', 'Ali', 'Alice Smith',
+                                               'alice@example.org', deleted=True)})
+    assert client.find_user_by_email('alice@example.com') is None
+    assert client.find_user_by_email('alice@example.org').name == 'alice2'
+    assert client.find_users_by_name('alice') == [bob]
+    # Deactivated users are only found when no active user has the name
+    carol = client._register_user(_user('U3', 'carol', 'Ali'))
+    assert client.find_user_by_name('ali') is carol
+    assert client.find_user_by_name('alice2').id == 'U1'
+
+    client._remove_user('U2')
+    assert client.find_user_by_name('alice') is None
+    assert client.find_user_by_email('bob@example.com') is None
+
+
+def test_find_user_by_email_lazy(mocker, client):
+    client._lazy_users = True
+    lookup = mocker.patch.object(client.web_client, 'users_lookupByEmail',
+                                 return_value={'user': _user('U1', 'alice', email='a@example.com')})
+    assert client.find_user_by_email('a@example.com').id == 'U1'
+    assert client.find_user_by_email('A@example.com').id == 'U1'
+    lookup.assert_called_once_with(email='a@example.com')
+
+
+def test_channel_events(mocker, client):
+    info = mocker.patch.object(client.web_client, 'conversations_info')
+    client._bot_info = {'id': 'UBOT'}
+    client._on_channel_created(data={'channel': {'id': 'C1', 'name': 'general',
+                                                 'created': 1500000000, 'creator': 'U1'}})
+    channel = client.channels['C1']
+    assert (channel.name, channel.is_member, channel.is_archived) == ('general', False, False)
+
+    client._on_channel_rename(data={'channel': {'id': 'C1', 'name': 'announcements',
+                                                'created': 1500000000}})
+    assert client.find_channel_by_name('announcements').previous_names == ['general']
+    client._on_channel_archive(data={'channel': 'C1', 'user': 'U1'})
+    assert client.channels['C1'].is_archived
+    client._on_channel_unarchive(data={'channel': 'C1', 'user': 'U1'})
+    assert not client.channels['C1'].is_archived
+
+    client._on_member_joined_channel(data={'user': 'UBOT', 'channel': 'C1'})
+    assert client.channels['C1'].is_member
+    client._on_member_left_channel(data={'user': 'UBOT', 'channel': 'C1'})
+    assert not client.channels['C1'].is_member
+
+    client._on_channel_joined(data={'channel': _channel('G1', 'secret', is_private=True,
+                                                        is_group=True, members=['U1'])})
+    client._on_member_joined_channel(data={'user': 'U2', 'channel': 'G1'})
+    assert client.channels['G1'].members == ['U1', 'U2']
+    client._on_member_left_channel(data={'user': 'U1', 'channel': 'G1'})
+    assert client.channels['G1'].members == ['U2']
+
+    client._on_im_created(data={'user': 'U1', 'channel': {'id': 'D1', 'created': 1500000000}})
+    assert client.dm_channel_id('U1') == 'D1'
+    info.assert_not_called()
+
+
+def test_channel_events_fetch_coalesced(mocker, client):
+    client._channel_fetch_delay = 0.05
+    fetched = []
+
+    async def conversations_info(channel):
+        fetched.append(channel)
+        if channel == 'C404':
+            raise SlackApiError("not found", {'ok': False, 'error': 'channel_not_found'})
+        return {'channel': _channel(channel, 'random', is_archived=True)}
+
+    mocker.patch.object(client.async_web_client, 'conversations_info', conversations_info)
+    client._register_channel(_channel('C404', 'deleted'))
+    # Events for channels that are not cached, or without enough data, are fetched once
+    client._on_channel_archive(data={'channel': 'C2', 'user': 'U1'})
+    client._on_channel_rename(data={'channel': {'id': 'C2', 'name': 'random'}})
+    client._on_channel_created(data={'channel': {'id': 'C2', 'name': 'random'}})
+    client._on_member_joined_channel(data={'user': 'U1', 'channel': 'C404'})
+    client._fetch_channel_later('C404')
+    client.loop.run_until_complete(asyncio.sleep(0.2))
+    assert sorted(fetched) == ['C2', 'C404']
+    assert client.channels['C2'].is_archived
+    assert 'C404' not in client.channels
+
+
+def test_fetch_async_with_lazy_caches(mocker, client):
+    client._users = LoadingCache(client._load_user, 10)
+    client._channels = LoadingCache(client._load_channel, 10)
+    users_info = mocker.patch.object(client.web_client, 'users_info')
+    conversations_info = mocker.patch.object(client.web_client, 'conversations_info')
+
+    async def async_users_info(user):
+        return {'user': _user(user, 'alice')}
+
+    async def async_conversations_info(channel):
+        return {'channel': _channel(channel, 'general')}
+
+    mocker.patch.object(client.async_web_client, 'users_info', async_users_info)
+    mocker.patch.object(client.async_web_client, 'conversations_info', async_conversations_info)
+    user = client.loop.run_until_complete(client.fetch_user_async('U1'))
+    channel = client.loop.run_until_complete(client.fetch_channel_async('C1'))
+    assert (user.name, channel.name) == ('alice', 'general')
+    # Fetched with the async client, without blocking the event loop, and cached
+    users_info.assert_not_called()
+    conversations_info.assert_not_called()
+    assert client.users['U1'] is user
+    assert client.channels['C1'] is channel
+    assert client.loop.run_until_complete(client.fetch_user_async('U1')) is user
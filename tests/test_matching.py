@@ -0,0 +1,172 @@
+import re
+
+import pytest
+
+from machine.utils.matching import (ListenerIndex, ListenerScope, ScopedListenerIndex,
+                                    required_literals)
+
+
+@pytest.mark.parametrize("pattern,flags,expected", [
+    (r'hello', 0, (('hello',), False)),
+    (r'hello', re.IGNORECASE, (('hello',), True)),
+    (r'HeLLo', re.IGNORECASE, (('hello',), True)),
+    (r'^ping$', 0, (('ping',), False)),
+    (r'(?:image|img)(?: me)? (?P<query>.+)', 0, (('im',), False)),
+    (r'meme (?P<meme>\S+) (?P<top>.+);(?P<bottom>.+)', 0, (('meme ',), False)),
+    (r'(?:ab){2}x', 0, (('ab',), False)),
+    (r'a(bc)d', 0, (('abcd',), False)),
+    (r'(?i:abc)d', 0, (('d',), False)),
+    (r'x?y*', 0, (None, False)),
+    (r'.*', 0, (None, False)),
+    (r'(?:foo|bar)', 0, (('bar', 'foo'), False)),
+    (r'(?:Foo|bar)', re.IGNORECASE, (('bar', 'foo'), True)),
+    (r'(?:foo|x*)', 0, (None, False)),
+    (r'café', re.IGNORECASE, (None, False)),
+    (r'café', 0, (('café',), False)),
+])
+def test_required_literals(pattern, flags, expected):
+    assert required_literals(re.compile(pattern, flags)) == expected
+
+
+def _listener(name, pattern, flags=re.IGNORECASE):
+    return {'name': name, 'regex': re.compile(pattern, flags)}
+
+
+@pytest.fixture
+def listeners():
+    return {
+        'hi': _listener('hi', r'hi'),
+        'any': _listener('any', r'.+'),
+        'ping': _listener('ping', r'^ping$', 0),
+        'meme': _listener('meme', r'meme (?P<meme>\S+)'),
+        'alt': _listener('alt', r'(?:foo|bar)'),
+        'opt': _listener('opt', r'(?:foo|x?)'),
+    }
+
+
+def _names(candidates):
+    return [c['name'] for c in candidates]
+
+
+def test_candidates(listeners):
+    index = ListenerIndex(listeners)
+    assert _names(index.candidates('Hi there')) == ['hi', 'any', 'opt']
+    assert _names(index.candidates('ping')) == ['any', 'ping', 'opt']
+    assert _names(index.candidates('PING')) == ['any', 'opt']
+    assert _names(index.candidates('make a MEME doge')) == ['any', 'meme', 'opt']
+    assert _names(index.candidates('BAR')) == ['any', 'alt', 'opt']
+
+
+def test_candidates_non_ascii_text(listeners):
+    index = ListenerIndex(listeners)
+    # case folding of non-ASCII text can't be prefiltered, so all case insensitive listeners
+    # are candidates
+    assert _names(index.candidates('é')) == ['hi', 'any', 'meme', 'alt', 'opt']
+
+
+def test_candidates_same_result_as_full_scan(listeners):
+    index = ListenerIndex(listeners)
+    texts = ['', 'hi', 'ping', 'PiNg', 'meme doge a;b', 'foo', 'nothing', 'Chïp', 'ſhi']
+    for text in texts:
+        expected = [name for name, l in listeners.items() if l['regex'].search(text)]
+        matched = [c['name'] for c in index.candidates(text) if c['regex'].search(text)]
+        assert matched == expected
+
+
+def test_add_and_remove():
+    index = ListenerIndex()
+    assert index.candidates('hello') == []
+    index.add('hello', _listener('hello', 'hello'))
+    index.add('bye', _listener('bye', 'bye'))
+    assert len(index) == 2
+    assert _names(index.candidates('hello bye')) == ['hello', 'bye']
+    index.remove('hello')
+    assert _names(index.candidates('hello bye')) == ['bye']
+
+
+def _scoped(name, pattern, **scope):
+    listener = _listener(name, pattern)
+    listener['scope'] = ListenerScope(**scope) if scope else None
+    return listener
+
+
+@pytest.fixture
+def scoped_index():
+    return ScopedListenerIndex({
+        'all': _scoped('all', r'hi'),
+        'dm': _scoped('dm', r'hi', dm_only=True),
+        'channels': _scoped('channels', r'hi', channels_only=True),
+        'by_id': _scoped('by_id', r'hi', channels=frozenset(['C0000001'])),
+        'by_name': _scoped('by_name', r'hi', channels=frozenset(['#General'])),
+        'thread': _scoped('thread', r'hi', thread_only=True),
+        'dm_thread': _scoped('dm_thread', r'hi', dm_only=True, thread_only=True),
+    })
+
+
+def test_scoped_candidates(scoped_index):
+    assert len(scoped_index) == 7
+    assert _names(scoped_index.candidates('hi', 'D0000001')) == ['all', 'dm']
+    assert _names(scoped_index.candidates('hi', 'D0000001', in_thread=True)) == \
+        ['all', 'dm', 'thread', 'dm_thread']
+    assert _names(scoped_index.candidates('hi', 'C0000001')) == ['all', 'channels', 'by_id']
+    assert _names(scoped_index.candidates('hi', 'G0000002', in_thread=True)) == \
+        ['all', 'channels', 'thread']
+    assert _names(scoped_index.candidates('bye', 'C0000001')) == []
+
+
+def test_scoped_by_channel_name(scoped_index):
+    # The listener scoped to #general only applies once the id of #general is known
+    assert 'by_name' not in _names(scoped_index.candidates('hi', 'C0000002'))
+    scoped_index.update_channel('C0000002', 'general')
+    assert _names(scoped_index.candidates('hi', 'C0000002')) == ['all', 'channels', 'by_name']
+    # Renamed, the listener no longer applies
+    scoped_index.update_channel('C0000002', 'random')
+    assert 'by_name' not in _names(scoped_index.candidates('hi', 'C0000002'))
+    # Another channel renamed to general
+    scoped_index.update_channel('C0000003', 'general')
+    assert 'by_name' in _names(scoped_index.candidates('hi', 'C0000003'))
+    scoped_index.update_channel('C0000003', None)
+    assert 'by_name' not in _names(scoped_index.candidates('hi', 'C0000003'))
+
+
+def test_scoped_add_and_remove(scoped_index):
+    scoped_index.update_channel('C0000002', 'general')
+    scoped_index.remove('by_name')
+    scoped_index.remove('dm')
+    assert _names(scoped_index.candidates('hi', 'C0000002')) == ['all', 'channels']
+    assert _names(scoped_index.candidates('hi', 'D0000001')) == ['all']
+    scoped_index.add('late', _scoped('late', r'hi', channels=frozenset(['general'])))
+    assert _names(scoped_index.candidates('hi', 'C0000002')) == ['all', 'channels', 'late']
+
+
+def test_scoped_by_channel_name_that_looks_like_id():
+    index = ScopedListenerIndex({
+        'general': _scoped('general', r'hi', channels=frozenset(['GENERAL'])),
+        'chatops': _scoped('chatops', r'hi', channels=frozenset(['#CHATOPS'])),
+    })
+    index.update_channel('C0000002', 'general')
+    index.update_channel('C0000003', 'chatops')
+    assert _names(index.candidates('hi', 'C0000002')) == ['general']
+    assert _names(index.candidates('hi', 'C0000003')) == ['chatops']
+
+
+def test_scoped_only_tracks_scoped_names(scoped_index):
+    for i in range(100):
+        scoped_index.update_channel('C1{:06d}'.format(i), 'channel{}'.format(i))
+    scoped_index.update_channel('C0000002', 'general')
+    assert scoped_index._channel_names == {'general': 'C0000002'}
+    assert scoped_index._channel_ids == {'C0000002': 'general'}
+    # A missed rename: another channel now has the name
+    scoped_index.update_channel('C0000003', 'general')
+    assert scoped_index._channel_ids == {'C0000003': 'general'}
+    assert 'by_name' not in _names(scoped_index.candidates('hi', 'C0000002'))
+    assert 'by_name' in _names(scoped_index.candidates('hi', 'C0000003'))
+
+
+def test_scoped_resolve_channel():
+    index = ScopedListenerIndex(resolve_channel={'general': 'C0000002'}.get)
+    index.add('late', _scoped('late', r'hi', channels=frozenset(['#general'])))
+    index.add('unknown', _scoped('unknown', r'hi', channels=frozenset(['#random'])))
+    assert _names(index.candidates('hi', 'C0000002')) == ['late']
+    index.update_channel('C0000002', 'renamed')
+    assert _names(index.candidates('hi', 'C0000002')) == []
@@ -0,0 +1,48 @@
+from machine.utils.membership import MembershipIndex
+
+
+def test_membership_index():
+    index = MembershipIndex()
+    index.add_members('C1', ['U2', 'U1', 'U3'])
+    index.add_members('C2', ['U1'])
+    index.add('C2', 'U1')
+    assert sorted(index.members('C1')) == ['U1', 'U2', 'U3']
+    assert sorted(index.channels('U1')) == ['C1', 'C2']
+    assert index.is_member('C1', 'U2')
+    assert not index.is_member('C2', 'U2')
+    assert not index.is_member('C3', 'U1')
+    assert index.members('C3') == []
+    assert index.channels('U4') == []
+    assert index.stats() == {'channels': 2, 'users': 3, 'memberships': 4}
+
+    index.remove('C1', 'U2')
+    index.remove('C1', 'U4')
+    assert sorted(index.members('C1')) == ['U1', 'U3']
+    assert index.channels('U2') == []
+    index.remove_channel('C1')
+    assert not index.has_channel('C1')
+    assert index.channels('U1') == ['C2']
+    assert index.stats() == {'channels': 1, 'users': 1, 'memberships': 1}
+
+
+def test_set_members():
+    index = MembershipIndex()
+    index.add_members('C1', ['U1', 'U2'])
+    index.set_members('C1', ['U2', 'U3'])
+    assert sorted(index.members('C1')) == ['U2', 'U3']
+    assert index.channels('U1') == []
+    assert index.channels('U3') == ['C1']
+
+
+def test_add_members_keeps_members_sorted():
+    index = MembershipIndex()
+    index.add_members('C1', ['U{}'.format(i) for i in range(0, 100, 2)])
+    index.add_members('C1', ['U{}'.format(i) for i in range(99, -1, -3)])
+    index.add('C1', 'U1000')
+    members = index._members[index._numbers['C1']]
+    assert list(members) == sorted(set(members))
+    assert sorted(index.members('C1')) == sorted({'U{}'.format(i) for i in range(0, 100, 2)} |
+                                                 {'U{}'.format(i) for i in range(99, -1, -3)} |
+                                                 {'U1000'})
+    assert all(index.is_member('C1', 'U{}'.format(i)) for i in range(0, 100, 2))
+    assert index.stats()['memberships'] == len(members)
@@ -1,3 +1,4 @@
+import asyncio
 from datetime import datetime
 
 import pytest
@@ -43,3 +44,17 @@ def test_inclusion(memory_storage):
     assert memory_storage.has("key1") == True
     memory_storage.delete("key1")
     assert memory_storage.has("key1") == False
+
+
+def test_set_if_not_exists(memory_storage):
+    assert memory_storage.set_if_not_exists("key1", "value1") == True
+    assert memory_storage.set_if_not_exists("key1", "value2") == False
+    assert memory_storage.get("key1") == "value1"
+
+
+def test_set_if_not_exists_async(memory_storage):
+    loop = asyncio.new_event_loop()
+    assert loop.run_until_complete(memory_storage.set_if_not_exists_async("key1", "value1"))
+    assert not loop.run_until_complete(memory_storage.set_if_not_exists_async("key1", "value2"))
+    loop.close()
+    assert memory_storage.get("key1") == "value1"
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+from slack.errors import SlackApiError
+
+from machine.clients.singletons.slack import InstrumentedWebClient
+from machine.utils.metrics import (Counter, Histogram, MachineMetrics, MetricsRegistry,
+                                   disable_metrics, enable_metrics, get_metrics)
+
+
+@pytest.fixture
+def metrics():
+    yield enable_metrics()
+    disable_metrics()
+
+
+def test_counter():
+    counter = Counter('events', "Events", ('event_type',))
+    counter.inc('message')
+    counter.inc('message')
+    counter.inc('reaction_added', amount=3)
+    assert counter.value('message') == 2
+    assert counter.value('unknown') == 0
+    assert counter.samples() == [
+        'events_total{event_type="message"} 2',
+        'events_total{event_type="reaction_added"} 3',
+    ]
+
+
+def test_histogram():
+    histogram = Histogram('duration_seconds', "Duration", ('handler',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, 'a')
+    histogram.observe(0.1, 'a')
+    histogram.observe(0.5, 'a')
+    histogram.observe(5, 'a')
+    assert histogram.count('a') == 4
+    assert histogram.count('b') == 0
+    assert histogram.samples() == [
+        'duration_seconds_bucket{handler="a",le="0.1"} 2',
+        'duration_seconds_bucket{handler="a",le="1.0"} 3',
+        'duration_seconds_bucket{handler="a",le="+Inf"} 4',
+        'duration_seconds_sum{handler="a"} 5.65',
+        'duration_seconds_count{handler="a"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    counter = Counter('events', "Events", ('name',))
+    counter.inc('say "hi"\\\n')
+    assert counter.samples() == ['events_total{name="say \\"hi\\"\\\\\\n"} 1']
+
+
+def test_render():
+    registry = MetricsRegistry()
+    registry.counter('events', "Events received").inc()
+    registry.add_stats('queue', "Queue", lambda: {'depth': 3, 'policy': 'drop', 'full': False})
+    assert registry.render() == "\n".join([
+        '# HELP events_total Events received',
+        '# TYPE events_total counter',
+        'events_total 1',
+        '# HELP queue_depth Queue (depth)',
+        '# TYPE queue_depth gauge',
+        'queue_depth 3',
+    ]) + "\n"
+
+
+def test_enable_metrics():
+    assert get_metrics() is None
+    metrics = enable_metrics()
+    assert isinstance(metrics, MachineMetrics)
+    assert get_metrics() is metrics
+    assert enable_metrics() is metrics
+    disable_metrics()
+    assert get_metrics() is None
+
+
+def test_instrumented_web_client(mocker, metrics):
+    api_call = mocker.patch('slack.web.base_client.BaseClient.api_call')
+    client = InstrumentedWebClient(metrics, token='xoxb-abc')
+    client.chat_postMessage(channel='C1', text='hi')
+    assert metrics.slack_api_duration.count('chat.postMessage') == 1
+
+    api_call.side_effect = SlackApiError('failed', {'ok': False, 'error': 'channel_not_found'})
+    with pytest.raises(SlackApiError):
+        client.chat_postMessage(channel='C1', text='hi')
+    assert metrics.slack_api_duration.count('chat.postMessage') == 2
+    assert metrics.slack_api_errors.value('chat.postMessage', 'channel_not_found') == 1
+
+
+def test_instrumented_async_web_client(mocker, metrics):
+    loop = asyncio.new_event_loop()
+    future = loop.create_future()
+    mocker.patch('slack.web.base_client.BaseClient.api_call', return_value=future)
+    client = InstrumentedWebClient(metrics, token='xoxb-abc', run_async=True, loop=loop)
+    assert client.reactions_add(name='thumbsup', channel='C1', timestamp='1') is future
+    assert metrics.slack_api_duration.count('reactions.add') == 0
+    future.set_exception(TimeoutError())
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+    assert metrics.slack_api_duration.count('reactions.add') == 1
+    assert metrics.slack_api_errors.value('reactions.add', 'TimeoutError') == 1
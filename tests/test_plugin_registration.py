@@ -4,6 +4,7 @@ import pytest
 from machine import Machine
 from machine.plugins.decorators import required_settings
 from machine.utils.collections import CaseInsensitiveDict
+from machine.vendor import bottle
 
 
 @pytest.fixture(scope='module')
@@ -38,7 +39,7 @@ def test_load_and_register_plugins(settings):
     actions = machine._plugin_actions
 
     # Test general structure of _plugin_actions
-    assert set(actions.keys()) == {'listen_to', 'respond_to'}
+    assert set(actions.keys()) == {'listen_to', 'respond_to', 'process'}
 
     # Test registration of respond_to actions
     respond_to_key = 'tests.fake_plugins:FakePlugin.respond_function-hello'
@@ -56,6 +57,11 @@ def test_load_and_register_plugins(settings):
     assert 'regex' in actions['listen_to'][listen_to_key]
     assert actions['listen_to'][listen_to_key]['regex'] == re.compile('hi', re.IGNORECASE)
 
+    # Test registration of process actions
+    process_key = 'tests.fake_plugins:FakePlugin.process_function'
+    assert process_key in actions['process']['some_event']
+    assert 'function' in actions['process']['some_event'][process_key]
+
 
 def test_plugin_storage_fq_plugin_name(settings):
     machine = Machine(settings=settings)
@@ -78,3 +84,21 @@ def test_required_settings(settings_with_required, required_settings_class):
     missing = machine._check_missing_settings(required_settings_class)
     assert 'SETTING_1' not in missing
     assert 'SETTING_2' in missing
+
+
+def test_profile_view(settings):
+    settings['PROFILING_TOKEN'] = 'secret'
+    machine = Machine(settings=settings)
+    bottle.request.bind({'QUERY_STRING': 'seconds=0.05&format=stats'})
+    with pytest.raises(bottle.HTTPError) as exc_info:
+        machine._profile_view()
+    assert exc_info.value.status_code == 401
+
+    bottle.request.bind({'HTTP_AUTHORIZATION': 'Bearer secret',
+                         'QUERY_STRING': 'seconds=0.05&format=stats'})
+    assert 'samples in' in machine._profile_view()
+
+    bottle.request.bind({'HTTP_AUTHORIZATION': 'Bearer secret', 'QUERY_STRING': 'format=svg'})
+    with pytest.raises(bottle.HTTPError) as exc_info:
+        machine._profile_view()
+    assert exc_info.value.status_code == 400
@@ -1,7 +1,10 @@
+import asyncio
+
 import pytest
 
 from machine.storage import PluginStorage
 from machine.storage.backends.memory import MemoryStorage
+from machine.utils.metrics import disable_metrics, enable_metrics
 
 
 @pytest.fixture
@@ -52,3 +55,40 @@ def test_delete(plugin_storage, storage_backend):
     plugin_storage.delete('key1')
     assert plugin_storage.has('key1') == False
     assert expected_key not in storage_backend._storage
+
+
+def _run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_async_storage(plugin_storage, storage_backend):
+    _run(plugin_storage.set_async('key1', 'value1'))
+    assert 'tests.fake_plugin.FakePlugin:key1' in storage_backend._storage
+    assert _run(plugin_storage.has_async('key1'))
+    assert _run(plugin_storage.get_async('key1')) == 'value1'
+    _run(plugin_storage.delete_async('key1'))
+    assert not _run(plugin_storage.has_async('key1'))
+    assert _run(plugin_storage.get_async('key1')) is None
+
+
+def test_storage_metrics(plugin_storage, storage_backend, mocker):
+    metrics = enable_metrics()
+    try:
+        plugin_storage.set('key1', 'value1')
+        plugin_storage.get('key1')
+        _run(plugin_storage.get_async('key1'))
+        mocker.patch.object(storage_backend, 'delete', side_effect=KeyError('key1'))
+        with pytest.raises(KeyError):
+            plugin_storage.delete('key1')
+    finally:
+        disable_metrics()
+    plugin = 'tests.fake_plugin.FakePlugin'
+    assert metrics.storage_duration.count(plugin, 'set') == 1
+    assert metrics.storage_duration.count(plugin, 'get') == 2
+    assert metrics.storage_duration.count(plugin, 'delete') == 1
+    assert metrics.storage_errors.value(plugin, 'delete') == 1
+    assert metrics.storage_errors.value(plugin, 'get') == 0
@@ -0,0 +1,61 @@
+import threading
+
+from machine.utils.profiling import Profile, SamplingProfiler, handler_labels
+from tests.fake_plugins import FakePlugin
+
+
+def busy_handler(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_handler_labels(mocker):
+    plugin = FakePlugin(mocker.MagicMock(), {}, mocker.MagicMock())
+    plugin_actions = {
+        'listen_to': {
+            'key1': {'class_name': 'tests.fake_plugins:FakePlugin',
+                     'function': plugin.listen_function},
+        },
+        'respond_to': {},
+        'process': {
+            'some_event': {
+                'key2': {'class_name': 'tests.fake_plugins:FakePlugin',
+                         'function': plugin.process_function},
+            }
+        }
+    }
+    labels = handler_labels(plugin_actions)
+    assert labels == {
+        FakePlugin.listen_function.__code__: 'tests.fake_plugins:FakePlugin.listen_function',
+        FakePlugin.process_function.__code__: 'tests.fake_plugins:FakePlugin.process_function',
+    }
+
+
+def test_sampling_profiler():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_handler, args=(stop,), name='busy')
+    thread.start()
+    try:
+        profiler = SamplingProfiler(interval=0.001,
+                                    labels={busy_handler.__code__: 'fake:Plugin.busy'})
+        profile = profiler.profile(0.1)
+    finally:
+        stop.set()
+        thread.join()
+    assert profile.samples > 0
+    assert profile.handlers()['fake:Plugin.busy'] > 0
+    assert any(line.startswith('[fake:Plugin.busy];threading:_bootstrap;')
+               for line in profile.collapsed().splitlines())
+    assert 'tests.test_profiling:busy_handler' in profile.stats()
+
+
+def test_profile_output():
+    profile = Profile(1.0, 0.01)
+    profile.stacks[('MainThread', None, ('a:main', 'a:wait'))] = 3
+    profile.stacks[('worker', 'p:Plugin.fn', ('a:run', 'p:fn', 'b:compute'))] = 1
+    assert profile.collapsed() == "MainThread;a:main;a:wait 3\n" \
+                                  "[p:Plugin.fn];a:run;p:fn;b:compute 1\n"
+    stats = profile.stats()
+    assert stats.splitlines()[0] == "4 samples in 1.0s (interval: 0.01s)"
+    assert "       1  25.0%  p:Plugin.fn" in stats
+    assert "       3  75.0%        3  75.0%  a:wait" in stats
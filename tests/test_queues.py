@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+from machine.utils.queues import PriorityEventQueue, PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL
+
+
+def _drain(queue):
+    items = []
+    while len(queue):
+        items.append(queue.get())
+    return items
+
+
+def test_priority_order():
+    queue = PriorityEventQueue(10)
+    queue.put('low1', PRIORITY_LOW)
+    queue.put('normal1', PRIORITY_NORMAL)
+    queue.put('high1', PRIORITY_HIGH)
+    queue.put('low2', PRIORITY_LOW)
+    queue.put('high2', PRIORITY_HIGH)
+    assert _drain(queue) == ['high1', 'high2', 'normal1', 'low1', 'low2']
+
+
+def test_drop_oldest():
+    queue = PriorityEventQueue(2)
+    assert queue.put('low1', PRIORITY_LOW)
+    assert queue.put('low2', PRIORITY_LOW)
+    assert queue.put('low3', PRIORITY_LOW)
+    assert _drain(queue) == ['low2', 'low3']
+    assert queue.stats()['shed_oldest'] == 1
+
+
+def test_drop_newest():
+    queue = PriorityEventQueue(2, policy='drop_newest')
+    assert queue.put('low1', PRIORITY_LOW)
+    assert queue.put('low2', PRIORITY_LOW)
+    assert not queue.put('low3', PRIORITY_LOW)
+    assert _drain(queue) == ['low1', 'low2']
+    assert queue.stats()['shed_newest'] == 1
+
+
+def test_high_priority_makes_room():
+    queue = PriorityEventQueue(2, policy='drop_newest')
+    queue.put('low1', PRIORITY_LOW)
+    queue.put('high1', PRIORITY_HIGH)
+    assert queue.put('high2', PRIORITY_HIGH)
+    assert not queue.put('high3', PRIORITY_HIGH)
+    assert not queue.put('low2', PRIORITY_LOW)
+    assert _drain(queue) == ['high1', 'high2']
+    stats = queue.stats()
+    assert stats['shed_oldest'] == 1
+    assert stats['shed_newest'] == 1
+    assert stats['shed_high'] == 1
+    assert stats['max_backlog'] == 2
+
+
+def test_normal_priority_is_bounded():
+    queue = PriorityEventQueue(3)
+    for i in range(10):
+        assert queue.put('normal{}'.format(i), PRIORITY_NORMAL)
+    assert len(queue) == 3
+    assert queue.put('high', PRIORITY_HIGH)
+    assert _drain(queue) == ['high', 'normal8', 'normal9']
+    stats = queue.stats()
+    assert stats['shed_normal'] == 8
+    assert stats['max_backlog'] == 3
+
+
+def test_sample():
+    queue = PriorityEventQueue(100, policy='sample', sample_rate=0.0)
+    for i in range(100):
+        queue.put(i, PRIORITY_LOW)
+    # once the queue is half full, no low priority items are accepted with a sample rate of 0
+    assert len(queue) == 50
+    assert queue.stats()['shed_sampled'] == 50
+    assert queue.put('normal', PRIORITY_NORMAL)
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        PriorityEventQueue(10, policy='yolo')
+
+
+def test_get_blocks_until_item_available():
+    queue = PriorityEventQueue(10)
+    assert queue.get(timeout=0.01) is None
+    result = []
+    t = threading.Thread(target=lambda: result.append(queue.get(timeout=5)))
+    t.start()
+    queue.put('item')
+    t.join()
+    assert result == ['item']
+    assert queue.stats()['dequeued'] == 1
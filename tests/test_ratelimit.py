@@ -0,0 +1,140 @@
+import asyncio
+import time
+
+import pytest
+from slack.errors import SlackApiError
+from slack.web.slack_response import SlackResponse
+
+from machine.clients.singletons.slack import RateLimitedWebClient, _retry_after
+from machine.utils.metrics import disable_metrics, enable_metrics
+from machine.utils.ratelimit import RateLimiter, TokenBucket
+from tests.fake_slack import FakeSlackServer
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2, capacity=2)
+    now = 100.0
+    bucket._updated = now
+    assert bucket.reserve(now) == 0
+    assert bucket.reserve(now) == 0
+    # Reservations on an empty bucket queue up behind each other
+    assert bucket.reserve(now) == pytest.approx(0.5)
+    assert bucket.reserve(now) == pytest.approx(1.0)
+    assert bucket.reserve(now + 1.25) == pytest.approx(0.25)
+
+
+def test_rate_limiter_paces_per_method_and_channel():
+    limiter = RateLimiter(method_limits={'reactions.add': 60},
+                          channel_limits={'chat.postMessage': 60}, channel_burst=1)
+    assert limiter.reserve('reactions.add', 'C1') == 0
+    assert limiter.reserve('chat.postMessage', 'C1') == 0
+    assert limiter.reserve('chat.postMessage', 'C2') == 0
+    assert limiter.reserve('chat.postMessage', 'C1') == pytest.approx(1, abs=0.01)
+    # Methods without limits are not paced
+    assert limiter.reserve('users.info') == 0
+    assert limiter.stats()['waiting'] == 1
+
+
+def test_rate_limiter_retry_after():
+    metrics = enable_metrics()
+    try:
+        limiter = RateLimiter(method_limits={}, channel_limits={}, metrics=metrics)
+        limiter.retry_after('chat.postMessage', 0.05)
+        assert limiter.reserve('chat.postMessage', 'C1') == pytest.approx(0.05, abs=0.01)
+        assert limiter.reserve('reactions.add') == 0
+        limiter._waited_for('chat.postMessage', 0.05)
+        assert limiter.wait('chat.postMessage', 'C1') > 0
+        stats = limiter.stats()
+        assert stats['waiting'] == 0
+        assert stats['waited'] == 2
+        assert stats['rate_limited'] == 1
+        assert metrics.slack_api_rate_limited.value('chat.postMessage') == 1
+        assert metrics.slack_api_queue_wait.count('chat.postMessage') == 2
+    finally:
+        disable_metrics()
+
+
+def test_rate_limited_web_client_retries():
+    with FakeSlackServer(rate_limits={'chat.postMessage': 1}, retry_after=1) as server:
+        limiter = RateLimiter(method_limits={}, channel_limits={})
+        client = RateLimitedWebClient(token='xoxb-abc', base_url=server.base_url,
+                                      rate_limiter=limiter)
+        client.chat_postMessage(channel='C1', text="first")
+        assert client.chat_postMessage(channel='C1', text="second")['ts']
+        assert server.rate_limited['chat.postMessage'] == 1
+        assert len(server.posted_messages) == 2
+        assert limiter.stats()['rate_limited'] == 1
+
+        server.rate_limits['chat.postMessage'] = 0
+        client = RateLimitedWebClient(token='xoxb-abc', base_url=server.base_url,
+                                      rate_limiter=limiter, max_retries=0)
+        with pytest.raises(SlackApiError):
+            client.chat_postMessage(channel='C1', text="third")
+
+
+@pytest.mark.parametrize('headers, expected', [
+    ({'Retry-After': '5'}, 5.0),
+    ({'retry-after': '5'}, 5.0),
+    ({}, 1.0),
+    ({'Retry-After': 'soon'}, 1.0),
+])
+def test_retry_after(headers, expected):
+    response = SlackResponse(client=None, http_verb='POST', api_url='', req_args={},
+                             data={'ok': False, 'error': 'ratelimited'}, headers=headers,
+                             status_code=429)
+    assert _retry_after(SlackApiError("ratelimited", response)) == expected
+
+
+def test_rate_limited_web_client_doesnt_wait_on_event_loop():
+    with FakeSlackServer(rate_limits={'chat.postMessage': 1}, retry_after=5,
+                         clock=lambda: 1000.0) as server:
+        limiter = RateLimiter(method_limits={}, channel_limits={})
+        client = RateLimitedWebClient(token='xoxb-abc', base_url=server.base_url,
+                                      rate_limiter=limiter)
+
+        async def post_twice():
+            client.chat_postMessage(channel='C1', text="first")
+            start = time.monotonic()
+            with pytest.raises(SlackApiError):
+                client.chat_postMessage(channel='C1', text="second")
+            return time.monotonic() - start
+
+        # Sync calls on the event loop are not retried, that would block the loop
+        loop = asyncio.new_event_loop()
+        assert loop.run_until_complete(post_twice()) < 1
+        loop.close()
+        assert len(server.posted_messages) == 1
+        # Calls that can wait are held until Slack allows them again
+        assert limiter.reserve('chat.postMessage') > 4
+
+
+def test_rate_limiter_counts_calls_that_dont_wait():
+    limiter = RateLimiter(method_limits={'reactions.add': 60}, channel_limits={})
+    limiter._method_buckets['reactions.add'] = TokenBucket(rate=1, capacity=1)
+    assert limiter.take('reactions.add') == 0
+    assert limiter.take('reactions.add') > 0
+    # Calls that wait are paced behind the calls that didn't
+    assert limiter.reserve('reactions.add') > 1
+    assert limiter.stats()['not_waited'] == 1
+
+
+def test_rate_limited_async_web_client():
+    loop = asyncio.new_event_loop()
+    with FakeSlackServer() as server:
+        limiter = RateLimiter(method_limits={'reactions.add': 600}, channel_limits={})
+        limiter._method_buckets['reactions.add'] = TokenBucket(rate=10, capacity=1)
+        client = RateLimitedWebClient(token='xoxb-abc', base_url=server.base_url,
+                                      rate_limiter=limiter, run_async=True, loop=loop)
+
+        async def react():
+            return await asyncio.gather(*[
+                client.reactions_add(name='thumbsup', channel='C1', timestamp=str(i))
+                for i in range(3)])
+
+        started = loop.time()
+        responses = loop.run_until_complete(react())
+        assert all(response['ok'] for response in responses)
+        # The second and third call waited 0.1 and 0.2 seconds
+        assert loop.time() - started >= 0.2
+        assert limiter.stats()['waited'] == 2
+    loop.close()
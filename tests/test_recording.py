@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+from slack.rtm.client import RTMClient
+
+from machine.clients.singletons.slack import RecordingRTMClient
+from machine.utils.recording import EventRecorder, read_recording, scrub_event, scrub_text
+from machine.utils.replay import EventReplayer, StubWebClient, stub_workspace
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def rtm_callbacks():
+    callbacks = RTMClient._callbacks
+    RTMClient._callbacks = type(callbacks)(list)
+    yield RTMClient._callbacks
+    RTMClient._callbacks = callbacks
+
+
+def test_scrub_text():
+    assert scrub_text("<@U123> deploy the thing to <#C1|prod>") == \
+        "<@U123> xxxxxx xxx xxxxx xx <#C1|prod>"
+
+
+def test_scrub_event():
+    event = {
+        'user': 'U1',
+        'channel': 'C1',
+        'text': "secret stuff",
+        'attachments': [{'text': "more secrets"}],
+        'previous_message': {'text': "old secret", 'files': [{'id': 'F1'}]},
+    }
+    scrubbed = scrub_event('message', event)
+    assert scrubbed == {
+        'user': 'U1',
+        'channel': 'C1',
+        'text': "xxxxxx xxxxx",
+        'previous_message': {'text': "xxx xxxxxx"},
+    }
+    # The original event is not modified
+    assert event['text'] == "secret stuff"
+
+    user_event = {'user': {'id': 'U1', 'name': 'john',
+                           'profile': {'email': 'john@example.com', 'image_24': 'http://img'}}}
+    scrubbed = scrub_event('user_change', user_event)
+    assert scrubbed['user']['id'] == 'U1'
+    assert scrubbed['user']['name'] not in ('', 'john')
+    assert scrubbed['user']['profile'] == {'email': scrubbed['user']['profile']['email']}
+    assert 'john' not in scrubbed['user']['profile']['email']
+
+
+@pytest.mark.parametrize('file_name', ['events.jsonl', 'events.jsonl.gz'])
+def test_record_and_read(tmp_path, file_name):
+    path = str(tmp_path / file_name)
+    recorder = EventRecorder(path)
+    recorder.record('message', {'text': "hi", 'channel': 'C1'})
+    recorder.record('close', None)
+    recorder.record('reaction_added', {'reaction': 'thumbsup'})
+    assert recorder.recorded == 2
+    recorder.close()
+
+    # Recordings are appended to
+    recorder = EventRecorder(path, scrub=True)
+    recorder.record('message', {'text': "bye", 'channel': 'C1'})
+    recorder.close()
+
+    events = list(read_recording(path))
+    assert [(event_type, data) for _, event_type, data in events] == [
+        ('message', {'text': "hi", 'channel': 'C1'}),
+        ('reaction_added', {'reaction': 'thumbsup'}),
+        ('message', {'text': "xxx", 'channel': 'C1'}),
+    ]
+    assert events[0][0] <= events[1][0] <= events[2][0]
+
+
+def test_recording_rtm_client(tmp_path, loop, rtm_callbacks):
+    path = str(tmp_path / 'events.jsonl')
+    recorder = EventRecorder(path)
+    received = []
+    RTMClient.on(event='message', callback=lambda **payload: received.append(payload['data']))
+    client = RecordingRTMClient(recorder, token='xoxb-abc', loop=loop)
+    loop.run_until_complete(client._dispatch_event('message', data={'text': "hi"}))
+    recorder.close()
+    assert received == [{'text': "hi"}]
+    assert [data for _, _, data in read_recording(path)] == [{'text': "hi"}]
+
+
+def test_stub_web_client(loop):
+    users, channels = stub_workspace([
+        (0.0, 'message', {'user': 'U1', 'channel': 'C1', 'text': "hi"}),
+        (0.1, 'message', {'user': 'U2', 'channel': 'D2', 'text': "hi"}),
+        (0.2, 'reaction_added', {'user': 'U1', 'item': {'channel': 'C1'}}),
+    ])
+    assert [u['id'] for u in users] == ['U1', 'U2']
+    assert [(c['id'], c['is_im'], c['user']) for c in channels] == \
+        [('C1', False, None), ('D2', True, 'U2')]
+
+    client = StubWebClient(users, channels)
+    assert [u['id'] for u in client.users_list()['members']] == ['U1', 'U2']
+    assert client.im_open(user='U2')['channel']['id'] == 'D2'
+    assert client.chat_postMessage(channel='C1', text="hi")['ts']
+    assert client.users_info(user='U3')['user']['id'] == 'U3'
+    assert client.calls == {'users.list': 1, 'im.open': 1, 'chat.postMessage': 1,
+                            'users.info': 1}
+
+    async_client = StubWebClient(users, channels, latency=0.01, run_async=True, loop=loop)
+    response = loop.run_until_complete(async_client.reactions_add(name='thumbsup',
+                                                                  channel='C1', timestamp='1'))
+    assert response['ok']
+
+
+def test_replay(loop, rtm_callbacks):
+    received = []
+
+    def on_message(**payload):
+        if payload['data']['text'] == 'fail':
+            raise ValueError()
+        received.append(payload['data']['text'])
+
+    RTMClient.on(event='message', callback=on_message)
+    client = RTMClient(token='xoxb-abc', loop=loop)
+    events = [
+        (100.0, 'message', {'text': 'first'}),
+        (100.05, 'message', {'text': 'fail'}),
+        (100.1, 'message', {'text': 'second'}),
+    ]
+    replayer = EventReplayer(client, speed=2)
+    started = loop.time()
+    results = loop.run_until_complete(replayer.replay(events))
+    assert loop.time() - started >= 0.05
+    assert received == ['first', 'second']
+    assert results['events'] == 3
+    assert results['errors'] == {'message': 1}
+    assert results['event_types']['message']['events'] == 3
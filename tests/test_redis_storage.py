@@ -1,3 +1,4 @@
+import asyncio
 from unittest.mock import MagicMock
 
 import pytest
@@ -27,6 +28,14 @@ def test_set(redis_storage, redis_client):
     redis_client.set.assert_called_with('SM:key2', 'value2', 42)
 
 
+def test_set_if_not_exists(redis_storage, redis_client):
+    redis_client.set.return_value = True
+    assert redis_storage.set_if_not_exists('key1', 'value1', 42)
+    redis_client.set.assert_called_with('SM:key1', 'value1', 42, nx=True)
+    redis_client.set.return_value = None
+    assert not redis_storage.set_if_not_exists('key1', 'value1', 42)
+
+
 def test_get(redis_storage, redis_client):
     redis_storage.get('key1')
     redis_client.get.assert_called_with('SM:key1')
@@ -45,3 +54,18 @@ def test_delete(redis_storage, redis_client):
 def test_size(redis_storage, redis_client):
     redis_storage.size()
     redis_client.info.assert_called_with('memory')
+
+
+def test_async_methods_use_sync_implementation(redis_storage, redis_client):
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(redis_storage.set_async('key1', 'value1', 42))
+        redis_client.set.assert_called_with('SM:key1', 'value1', 42)
+        loop.run_until_complete(redis_storage.get_async('key1'))
+        redis_client.get.assert_called_with('SM:key1')
+        loop.run_until_complete(redis_storage.has_async('key1'))
+        redis_client.exists.assert_called_with('SM:key1')
+        loop.run_until_complete(redis_storage.delete_async('key1'))
+        redis_client.delete.assert_called_with('SM:key1')
+    finally:
+        loop.close()
@@ -1,8 +1,10 @@
+import asyncio
+
 import pytest
 
 from machine.models.user import User, Profile
 from machine.models.channel import Channel
-from machine.clients.slack import id_for_channel, id_for_user
+from machine.clients.slack import SlackClient, id_for_channel, id_for_user
 
 
 @pytest.fixture
@@ -27,3 +29,69 @@ def test_id_for_user(user):
 def test_id_for_channel(channel):
     assert id_for_channel(channel) == 'c1'
     assert id_for_channel('c2') == 'c2'
+
+
+@pytest.fixture
+def low_level_client(mocker):
+    llc = mocker.patch('machine.clients.slack.LowLevelSlackClient').get_instance.return_value
+
+    async def fake_api_call(**kwargs):
+        return kwargs
+
+    async def fake_im_open(**kwargs):
+        return {'channel': {'id': 'D1'}}
+
+    async def fake_dm_channel_id(user_id):
+        return None
+
+    async def fake_register_dm_channel(user_id, channel_id):
+        pass
+
+    llc.async_web_client.chat_postMessage.side_effect = fake_api_call
+    llc.async_web_client.chat_postEphemeral.side_effect = fake_api_call
+    llc.async_web_client.reactions_add.side_effect = fake_api_call
+    llc.async_web_client.im_open.side_effect = fake_im_open
+    llc.dm_channel_id_async.side_effect = fake_dm_channel_id
+    llc.register_dm_channel_async.side_effect = fake_register_dm_channel
+    return llc
+
+
+def _run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_send_async(low_level_client, channel):
+    result = _run(SlackClient().send_async(channel, 'hello'))
+    assert result == {'channel': 'c1', 'text': 'hello'}
+    result = _run(SlackClient().send_async('c2', 'hello', ephemeral_user='u1'))
+    assert result == {'channel': 'c2', 'user': 'u1', 'text': 'hello'}
+    low_level_client.web_client.chat_postMessage.assert_not_called()
+
+
+def test_react_async(low_level_client):
+    result = _run(SlackClient().react_async('c1', '1234.5', 'thumbsup'))
+    assert result == {'name': 'thumbsup', 'channel': 'c1', 'timestamp': '1234.5'}
+
+
+def test_send_dm_async(low_level_client, user):
+    result = _run(SlackClient().send_dm_async(user, 'hello'))
+    low_level_client.async_web_client.im_open.assert_called_once_with(user='1')
+    assert result == {'channel': 'D1', 'text': 'hello', 'as_user': True}
+    low_level_client.register_dm_channel_async.assert_called_once_with('1', 'D1')
+
+
+def test_send_dm_cached(low_level_client, user):
+    low_level_client.dm_channel_id.return_value = 'D2'
+    SlackClient().send_dm(user, 'hello')
+    low_level_client.web_client.im_open.assert_not_called()
+    low_level_client.web_client.chat_postMessage.assert_called_once_with(
+        channel='D2', text='hello', as_user=True)
+
+    low_level_client.dm_channel_id.return_value = None
+    low_level_client.web_client.im_open.return_value = {'channel': {'id': 'D3'}}
+    assert SlackClient().open_im('2') == 'D3'
+    low_level_client.register_dm_channel.assert_called_once_with('2', 'D3')
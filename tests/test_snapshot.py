@@ -0,0 +1,24 @@
+import gzip
+
+import pytest
+
+from machine.models import Channel, User
+from machine.utils.snapshot import dump_snapshot, load_snapshot
+from tests.benchmarks.workspace import gen_workspace
+
+
+def test_snapshot_roundtrip():
+    users, channels = gen_workspace(20, 5, n_ims=2)
+    users = [User.from_api_response(u) for u in users]
+    channels = [Channel.from_api_response(c) for c in channels]
+    snapshot = load_snapshot(dump_snapshot(users, channels))
+    assert snapshot.users == users
+    assert snapshot.channels == channels
+    assert snapshot.created > 0
+
+
+def test_snapshot_invalid():
+    with pytest.raises(ValueError):
+        load_snapshot(b'not a snapshot')
+    with pytest.raises(ValueError):
+        load_snapshot(gzip.compress(b'{"version": 0}'))
@@ -1,6 +1,11 @@
+import random
+from dataclasses import FrozenInstanceError
+
+import dill
 import pytest
 
-from machine.models.user import User, Profile
+from machine.models.user import User, Profile, keep_profile_images
+from tests.benchmarks.workspace import gen_user
 
 
 @pytest.fixture
@@ -14,3 +19,34 @@ def test_fmt_mention(user):
     expected = '<@1>'
     result = user.fmt_mention()
     assert result == expected
+
+
+def test_from_api_response():
+    response = gen_user(random.Random(42), 1)
+    response['unknown_field'] = 'ignored'
+    user = User.from_api_response(response)
+    assert user.id == 'U00000001'
+    assert user.locale is None
+    assert user.profile.image_24 == response['profile']['image_24']
+    other = User.from_api_response(gen_user(random.Random(43), 2))
+    assert user.tz_label is other.tz_label
+    assert user.profile.team is other.profile.team
+    # Slotted, so users don't carry a __dict__ around
+    assert not hasattr(user, '__dict__')
+    with pytest.raises(FrozenInstanceError):
+        user.name = 'other'
+    assert dill.loads(dill.dumps(user)) == user
+    del response['name']
+    with pytest.raises(KeyError):
+        User.from_api_response(response)
+
+
+def test_drop_profile_images():
+    keep_profile_images(False)
+    try:
+        user = User.from_api_response(gen_user(random.Random(42), 1))
+    finally:
+        keep_profile_images(True)
+    assert user.profile.image_24 is None
+    assert user.profile.image_original is None
+    assert user.profile.email == '{}@example.com'.format(user.name)
@@ -0,0 +1,82 @@
+from machine.models import User
+from machine.utils.user_index import UserIndex
+
+
+def _user(user_id, name, display_name='', real_name='', deleted=False):
+    return User.from_api_response({
+        'id': user_id,
+        'team_id': 'T1',
+        'name': name,
+        'deleted': deleted,
+        'profile': {
+            'avatar_hash': 'abc',
+            'status_text': None,
+            'status_emoji': None,
+            'status_expiration': None,
+            'real_name': real_name,
+            'display_name': display_name,
+            'real_name_normalized': real_name,
+            'display_name_normalized': display_name,
+            'image_24': None,
+            'image_32': None,
+            'image_48': None,
+            'image_72': None,
+            'image_192': None,
+            'image_512': None,
+            'team': 'T1',
+        },
+        'is_bot': False,
+        'updated': 1500000000,
+        'is_app_user': False,
+    })
+
+
+def _index(*users):
+    index = UserIndex()
+    for user in users:
+        index.add(user)
+    return index
+
+
+def test_search_prefix():
+    index = _index(_user('U1', 'alice.smith', 'Alice', 'Alice Smith'),
+                   _user('U2', 'bob', 'Bobby', 'Bob Alison'),
+                   _user('U3', 'carol', '', 'Carol Jones'))
+    assert index.search('ali') == ['U1', 'U2']
+    assert index.search('smi') == ['U1']
+    assert index.search('@Bob') == ['U2']
+    assert index.search('jones carol') == ['U3']
+    assert index.search('dave') == []
+    assert index.search('') == []
+
+
+def test_search_ranking():
+    index = _index(_user('U1', 'alexander', '', 'Alexander Great'),
+                   _user('U2', 'alex', '', 'Alex'),
+                   _user('U3', 'al', '', 'Al Bundy'))
+    # Exact names first, then the users with the most matching trigrams
+    assert index.search('alex') == ['U2', 'U1', 'U3']
+    assert index.search('al') == ['U3', 'U2', 'U1']
+    assert index.search('al', limit=1) == ['U3']
+
+
+def test_search_typos():
+    index = _index(_user('U1', 'alice', '', 'Alice Smith'),
+                   _user('U2', 'bob', '', 'Bob Jones'))
+    assert index.search('alcie') == ['U1']
+    assert index.search('smiht') == ['U1']
+    assert index.search('alcie', min_score=0.8) == []
+
+
+def test_search_updates():
+    index = _index(_user('U1', 'alice', '', 'Alice Smith'))
+    index.add(_user('U1', 'alice', '', 'Alice Jones'))
+    assert index.search('smith') == []
+    assert index.search('jones') == ['U1']
+    # Deactivated users are not found
+    index.add(_user('U1', 'alice', '', 'Alice Jones', deleted=True))
+    assert index.search('alice') == []
+    index.add(_user('U2', 'bob'))
+    index.remove('U2')
+    assert index.search('bob') == []
+    assert index._by_trigram == {}
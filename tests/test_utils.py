@@ -1,4 +1,7 @@
-from machine.utils.collections import CaseInsensitiveDict
+import threading
+import time
+
+from machine.utils.collections import CaseInsensitiveDict, LoadingCache, LRUCache
 from machine.utils import sizeof_fmt
 from tests.singletons import FakeSingleton
 
@@ -22,3 +25,77 @@ def test_size_fmt():
     assert sizeof_fmt(kb_size) == '1.1KB'
     gb_size = 168963795964
     assert sizeof_fmt(gb_size) == '157.4GB'
+
+
+def test_LRUCache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache['a'] == 1
+    cache['c'] = 3
+    assert 'b' not in cache
+    assert list(cache) == ['a', 'c']
+    assert len(cache) == 2
+
+
+def test_LRUCache_ttl(mocker):
+    mocked_time = mocker.patch('machine.utils.collections.time')
+    mocked_time.monotonic.return_value = 100
+    cache = LRUCache(maxsize=10, ttl=5)
+    cache['a'] = 1
+    mocked_time.monotonic.return_value = 104
+    assert cache['a'] == 1
+    mocked_time.monotonic.return_value = 105
+    assert 'a' not in cache
+    assert len(cache) == 0
+
+
+def test_LoadingCache_loads_on_first_access():
+    loaded = []
+
+    def loader(key):
+        loaded.append(key)
+        if key == 'missing':
+            raise KeyError(key)
+        return key.upper()
+
+    cache = LoadingCache(loader, maxsize=2)
+    assert cache['a'] == 'A'
+    assert cache['a'] == 'A'
+    assert cache.get('missing') is None
+    assert 'b' in cache
+    assert cache['c'] == 'C'
+    # Iterating only returns cached items, and doesn't load anything
+    assert list(cache) == ['b', 'c']
+    assert loaded == ['a', 'missing', 'b', 'c']
+    assert cache.pop('a', None) is None
+    assert cache.pop('b') == 'B'
+    assert cache.stats() == {'size': 1, 'maxsize': 2, 'hits': 1, 'misses': 4, 'coalesced': 0,
+                             'prefetched': 0, 'not_found': 1}
+
+
+def test_LoadingCache_coalesces_concurrent_lookups():
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def loader(key):
+        calls.append(key)
+        started.set()
+        release.wait(5)
+        return key.upper()
+
+    cache = LoadingCache(loader, maxsize=10)
+    cache.prefetch(['a', None])
+    assert started.wait(5)
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(cache['a']))
+    waiter.start()
+    time.sleep(0.05)
+    release.set()
+    waiter.join(5)
+    assert results == ['A']
+    assert calls == ['a']
+    assert cache.stats()['coalesced'] == 1
+    assert cache.stats()['prefetched'] == 1
+    assert cache.is_cached('a')
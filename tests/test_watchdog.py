@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import pytest
+
+from machine.utils.watchdog import HandlerWatchdog, Timeouts
+
+
+@pytest.fixture
+def watchdog():
+    return HandlerWatchdog(check_interval=0.01)
+
+
+def test_fast_handler(watchdog):
+    assert watchdog.run('fast', Timeouts(soft=1, hard=2), lambda x: x * 2, 21) == 42
+    assert watchdog.stats() == {'running': 0, 'slow': 0, 'timed_out': 0, 'cancelled': 0}
+
+
+def test_slow_handler(watchdog, caplog):
+    watchdog.run('slow', Timeouts(soft=0.01), time.sleep, 0.02)
+    assert watchdog.stats()['slow'] == 1
+    assert watchdog.stats()['timed_out'] == 0
+    assert 'Handler slow took' in caplog.text
+
+
+def test_timed_out_handler(watchdog):
+    watchdog.run('too_slow', Timeouts(soft=0.005, hard=0.01), time.sleep, 0.02)
+    assert watchdog.stats()['slow'] == 0
+    assert watchdog.stats()['timed_out'] == 1
+
+
+def test_no_timeouts_not_tracked(watchdog):
+    with watchdog.track('untracked', Timeouts()):
+        assert watchdog.stats()['running'] == 0
+
+
+def test_watchdog_thread_reports_running_handler(watchdog, caplog):
+    watchdog.start()
+    try:
+        with watchdog.track('stuck', Timeouts(soft=0.01)):
+            assert watchdog.stats()['running'] == 1
+            deadline = time.monotonic() + 5
+            while watchdog.stats()['slow'] == 0:
+                assert time.monotonic() < deadline
+                time.sleep(0.005)
+            assert 'has been running for' in caplog.text
+    finally:
+        watchdog.stop()
+    # reported only once
+    assert watchdog.stats()['slow'] == 1
+
+
+def test_async_handler_cancelled(watchdog):
+    cancelled = []
+
+    async def handler():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    loop = asyncio.new_event_loop()
+    try:
+        result = loop.run_until_complete(watchdog.run_async('async', Timeouts(hard=0.01), handler))
+    finally:
+        loop.close()
+    assert result is None
+    assert cancelled == [True]
+    assert watchdog.stats()['cancelled'] == 1
+    assert watchdog.stats()['timed_out'] == 1
+
+
+def test_async_handler_result(watchdog):
+    async def handler(x):
+        return x * 2
+
+    loop = asyncio.new_event_loop()
+    try:
+        result = loop.run_until_complete(watchdog.run_async('async', Timeouts(hard=1), handler, 21))
+    finally:
+        loop.close()
+    assert result == 42
+
+
+def test_async_handler_own_timeout_error(watchdog):
+    async def handler():
+        await asyncio.wait_for(asyncio.sleep(1), 0.01)
+
+    loop = asyncio.new_event_loop()
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            loop.run_until_complete(watchdog.run_async('async', Timeouts(hard=1), handler))
+    finally:
+        loop.close()
+    assert watchdog.stats()['cancelled'] == 0